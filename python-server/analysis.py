@@ -0,0 +1,198 @@
+'''
+    Native (NumPy) versions of the Praat analyses we use on the hot path.
+
+    These return the same (X, Y) arrays as praatUtil.readPitchTier etc.,
+    without spawning Praat or round-tripping tiers through text files.
+    Parameters default to the ones in praat/scripts/*.praat.
+'''
+import io
+import wave
+import numpy
+from numpy.lib.stride_tricks import as_strided
+import wavconvert # which uses this module too; each only calls the other
+
+BLOCK = 1024 # frames analysed per vectorized step (bounds memory on long files)
+
+# Reads a WAV file into a mono float array in [-1, 1]. Plain PCM is read with
+# the wave module; float, WAVE_FORMAT_EXTENSIBLE and streamed WAVs (which it
+# can't read, or reads short) through wavconvert, as Praat reads them all.
+# < Returns (samples, sample rate), or None if it isn't a WAV we can decode.
+def readWAV(filename):
+    info = wavconvert.probe(filename)
+    if info is None or not info.readable:
+        sound = wavconvert.read(filename, info) if info is not None else None
+        return None if sound is None else (sound[0].mean(axis=1), sound[1])
+    f = wave.open(filename, 'rb')
+    try:
+        nchannels = f.getnchannels()
+        width = f.getsampwidth()
+        sr = f.getframerate()
+        data = f.readframes(f.getnframes())
+    finally:
+        f.close()
+    return (decodePCM(data, width, nchannels), sr)
+
+# Writes a float array in [-1, 1] as a 16-bit PCM WAV file: mono, or
+# one channel per column of a (frames x channels) array.
+# (filename may also be a file object.)
+def writeWAV(filename, x, sr):
+    x = numpy.asarray(x)
+    pcm = numpy.round(numpy.clip(x, -1.0, 1.0) * 32767.0).astype('<i2')
+    f = wave.open(filename, 'wb')
+    try:
+        f.setnchannels(1 if x.ndim == 1 else x.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(int(sr))
+        f.writeframes(pcm.tobytes())
+    finally:
+        f.close()
+
+# As writeWAV, but returns the WAV file's bytes instead of writing a file.
+def encodeWAV(x, sr):
+    buf = io.BytesIO()
+    writeWAV(buf, x, sr)
+    return buf.getvalue()
+
+# Converts raw little-endian PCM bytes to a mono float array in [-1, 1].
+def decodePCM(data, width, nchannels):
+    if width == 1: # 8-bit WAV is unsigned
+        x = (numpy.frombuffer(data, numpy.uint8).astype(numpy.float64) - 128.0) / 128.0
+    elif width == 3: # no 24-bit dtype; sign-extend into int32
+        b = numpy.frombuffer(data, numpy.uint8).reshape(-1, 3).astype(numpy.int32)
+        x = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8) / float(1 << 23)
+    else:
+        dtype = {2: '<i2', 4: '<i4'}[width]
+        x = numpy.frombuffer(data, dtype).astype(numpy.float64) / float(1 << (8 * width - 1))
+    if nchannels > 1:
+        x = x[:len(x) - len(x) % nchannels].reshape(-1, nchannels).mean(axis=1)
+    return x
+
+# Frame times for a short-term analysis, laid out the way Praat does it:
+# as many whole windows as fit, centred within the sound.
+def frameTimes(nsamples, sr, winlen, timestep):
+    duration = nsamples / float(sr)
+    wdur = winlen / float(sr)
+    if duration < wdur:
+        return numpy.zeros(0)
+    nframes = int(numpy.floor((duration - wdur) / timestep)) + 1
+    t1 = 0.5 * duration - 0.5 * (nframes - 1) * timestep
+    return t1 + timestep * numpy.arange(nframes)
+
+# Yields (times, frames) in blocks of at most `block` frames, where frames
+# is a (frames x winlen) array of the windows centred at each time.
+def frameBlocks(x, sr, winlen, timestep, block=BLOCK):
+    times = frameTimes(len(x), sr, winlen, timestep)
+    starts = numpy.round(times * sr - 0.5 * winlen).astype(int)
+    starts = numpy.clip(starts, 0, len(x) - winlen)
+    # Every window of x as a strided (no-copy) view; rows are gathered per block.
+    step = x.strides[0]
+    view = as_strided(x, shape=(len(x) - winlen + 1, winlen), strides=(step, step))
+    for b in range(0, len(times), block):
+        yield (times[b:b + block], view[starts[b:b + block]])
+
+# Autocorrelation pitch tracker (after Boersma 1993, as in Praat's To Pitch (ac)).
+# Each frame picks the strongest normalized autocorrelation peak in the
+# [floor, ceiling] range, with Praat's octave cost, and is voiced if that
+# is a true local maximum and beats Praat's unvoiced strength (which folds in the silence threshold).
+# < Returns (X, Y): times and F0 in Hz of voiced frames, like Down to PitchTier.
+def pitchTier(x, sr, timestep=0.001, floor=75.0, ceiling=600.0,
+              silenceThreshold=0.03, voicingThreshold=0.45, octaveCost=0.01):
+    x = numpy.asarray(x, dtype=numpy.float64)
+    winlen = int(round(3.0 / floor * sr)) # 3 periods of the pitch floor
+    minlag = max(2, int(numpy.floor(sr / float(ceiling))))
+    maxlag = min(int(numpy.ceil(sr / float(floor))), winlen // 2)
+    if len(x) < winlen or minlag >= maxlag:
+        return (numpy.zeros(0), numpy.zeros(0))
+
+    nfft = 1
+    while nfft < winlen + maxlag + 1:
+        nfft *= 2
+    window = numpy.hanning(winlen)
+    rw = numpy.fft.irfft(numpy.abs(numpy.fft.rfft(window, nfft)) ** 2)[:maxlag + 2]
+    rw /= rw[0]
+
+    lags = numpy.arange(minlag, maxlag + 1)
+    bonus = -octaveCost * numpy.log2(floor * lags / float(sr))
+    globalPeak = numpy.max(numpy.abs(x)) or 1.0
+
+    X = []
+    Y = []
+    for (times, frames) in frameBlocks(x, sr, winlen, timestep):
+        frames = frames - frames.mean(axis=1)[:, None]
+        localPeak = numpy.max(numpy.abs(frames), axis=1)
+        spec = numpy.fft.rfft(frames * window, nfft)
+        r = numpy.fft.irfft(spec.real ** 2 + spec.imag ** 2, nfft)[:, :maxlag + 2]
+        r0 = r[:, :1].copy()
+        r0[r0 == 0] = 1.0
+        r = r / r0 / rw
+
+        strength = r[:, minlag:maxlag + 1] + bonus
+        best = numpy.argmax(strength, axis=1)
+        lag = lags[best]
+        rows = numpy.arange(len(lag))
+
+        # Parabolic interpolation of the peak for sub-sample lag precision.
+        a = r[rows, lag - 1]
+        b = r[rows, lag]
+        c = r[rows, lag + 1]
+        denom = a - 2.0 * b + c
+        shift = numpy.where(denom < 0, 0.5 * (a - c) / numpy.where(denom < 0, denom, -1.0), 0.0)
+        shift = numpy.clip(shift, -0.5, 0.5)
+        peak = numpy.minimum(b - 0.25 * (a - c) * shift, 1.0)
+        f0 = sr / (lag + shift)
+
+        unvoiced = voicingThreshold + numpy.maximum(0.0,
+            2.0 - (localPeak / globalPeak) / (silenceThreshold / (1.0 + voicingThreshold)))
+        voiced = (peak + bonus[best] > unvoiced) & (b >= a) & (b >= c) & (f0 >= floor) & (f0 <= ceiling)
+        X.append(times[voiced])
+        Y.append(f0[voiced])
+
+    if not X:
+        return (numpy.zeros(0), numpy.zeros(0))
+    return (numpy.concatenate(X), numpy.concatenate(Y))
+
+# Drop-in for running extract_pitchtier.praat and reading the result back.
+# < Returns None if the file can't be read (see readWAV).
+def extractPitchTier(filename, timestep=0.001, floor=75.0, ceiling=600.0):
+    sound = readWAV(filename)
+    if sound is None:
+        return None
+    return pitchTier(sound[0], sound[1], timestep, floor, ceiling)
+
+# Intensity contour as in Praat's To Intensity: the mean-subtracted signal is
+# squared and averaged under a Gaussian window 6.4 / minPitch long, in dB re 2e-5 Pa.
+# A timestep of 0 means Praat's default of a quarter of the effective window (0.8 / minPitch).
+# < Returns (X, Y): frame times and intensities in dB, like Down to IntensityTier.
+def intensityTier(x, sr, minPitch=100.0, timestep=0.0, subtractMean=True):
+    x = numpy.asarray(x, dtype=numpy.float64)
+    if timestep <= 0:
+        timestep = 0.8 / minPitch
+    winlen = int(round(6.4 / minPitch * sr))
+    if len(x) < winlen:
+        return (numpy.zeros(0), numpy.zeros(0))
+
+    edge = numpy.exp(-12.0)
+    phase = (numpy.arange(winlen) + 0.5) / winlen - 0.5
+    window = (numpy.exp(-48.0 * phase * phase) - edge) / (1.0 - edge)
+    window /= window.sum()
+
+    X = []
+    Y = []
+    for (times, frames) in frameBlocks(x, sr, winlen, timestep):
+        if subtractMean:
+            frames = frames - frames.mean(axis=1)[:, None]
+        power = numpy.dot(frames * frames, window)
+        X.append(times)
+        Y.append(10.0 * numpy.log10(numpy.maximum(power, 1e-30) / 4e-10))
+
+    if not X:
+        return (numpy.zeros(0), numpy.zeros(0))
+    return (numpy.concatenate(X), numpy.concatenate(Y))
+
+# Drop-in for running extract_intensitytier.praat and reading the result back.
+# < Returns None if the file can't be read (see readWAV).
+def extractIntensityTier(filename, minPitch=100.0):
+    sound = readWAV(filename)
+    if sound is None:
+        return None
+    return intensityTier(sound[0], sound[1], minPitch)
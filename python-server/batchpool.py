@@ -0,0 +1,89 @@
+'''
+    Process pool for batch requests, run as a CherryPy plugin, and a zip
+    writer that streams its entries as they're added.
+
+    Synthesis is mostly CPU (analysis, PSOLA, Praat), so a batch of items
+    is spread over one process per core instead of the server's threads:
+
+        batch = ProcessPool(cherrypy.engine, initializer=setupProcess)
+        batch.subscribe()
+        ...
+        for result in batch.imap_unordered(work, items):
+            ...
+
+    The processes are forked when the engine starts, before the other
+    plugins start threads or Praat workers, so each starts from a clean copy
+    of the server module; the initializer sets up whatever per-process
+    state it needs (see main.batchProcessInit).
+'''
+import multiprocessing
+import time
+import zipfile
+from cherrypy.process.plugins import SimplePlugin
+
+class ProcessPool(SimplePlugin):
+
+    def __init__(self, bus, size=None, initializer=None):
+        SimplePlugin.__init__(self, bus)
+        self.size = multiprocessing.cpu_count() if size is None else size
+        self.initializer = initializer
+        self.pool = None
+
+    def start(self):
+        if self.size <= 0:
+            self.bus.log('Batch pool disabled; running batches in the request thread.')
+            return
+        self.pool = multiprocessing.Pool(self.size, self.initializer)
+        self.bus.log('Started ' + str(self.size) + ' batch processes.')
+    start.priority = 40 # fork before other plugins start threads or subprocesses
+
+    # Lets running items finish, so each process can clean up after itself.
+    def stop(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+            self.bus.log('Stopped batch processes.')
+
+    # Yields fn(item) for each item, in the order they finish.
+    def imap_unordered(self, fn, items):
+        if self.pool is None:
+            return (fn(item) for item in items)
+        return self.pool.imap_unordered(fn, items)
+
+# Write-only file that hands back what was written to it, for zipfile:
+# ZipFile only needs write() and tell() as long as entries go in via writestr.
+class _Spool(object):
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.offset += len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+# Streams a zip archive of (name, data) entries, yielding each entry's
+# bytes as soon as it has been added (e.g. as a CherryPy streamed body).
+# WAVs barely compress, so entries are stored rather than deflated.
+def zipStream(entries):
+    out = _Spool()
+    z = zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED)
+    for (name, data) in entries:
+        info = zipfile.ZipInfo(name, time.localtime(time.time())[:6])
+        info.external_attr = 0o644 << 16
+        z.writestr(info, data)
+        yield out.drain()
+    z.close()
+    yield out.drain()
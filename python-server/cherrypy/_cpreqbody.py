@@ -580,6 +580,10 @@ class Part(Entity):
     "text/plain".
     """
 
+    chunk_size = 1 << 16
+    """The number of bytes read from the request body at a time while
+    looking for the end of a part."""
+
     # This is the default in stdlib cgi. We may want to increase it.
     maxrambytes = 1000
     """The threshold of bytes after which point the ``Part`` will store
@@ -639,47 +643,80 @@ class Part(Entity):
         If the 'fp_out' argument is not None, it must be a file-like
         object that supports the 'write' method; all bytes read will be
         written to the fp, and that fp is returned.
+
+        The body is read in chunks of ``chunk_size`` bytes, which are scanned
+        for the next boundary line (a line break followed by the boundary);
+        everything before it is data. Bytes read past the boundary line are
+        pushed back onto self.fp for the next part.
         """
         endmarker = self.boundary + ntob("--")
-        delim = ntob("")
-        prev_lf = True
+        marker = ntob("\n") + self.boundary
+        # A boundary can straddle two chunks: hold back enough of each
+        # chunk to see it whole (CRLF + boundary).
+        holdback = len(marker) + 1
         lines = []
         seen = 0
+        # The body may open with the boundary line. A virtual line break in
+        # front of it (data[:start], which isn't part of the body) lets the
+        # same search find it.
+        data = ntob("\n")
+        start = 1
+        search = 0
+        eof = False
+        done = False
         while True:
-            line = self.fp.readline(1 << 16)
-            if not line:
+            pos = data.find(marker, search)
+            cut = None
+            if pos != -1:
+                # A candidate boundary line; it's one if the rest of the
+                # line is only whitespace (or "--" for the last one).
+                lineend = data.find(ntob("\n"), pos + len(marker))
+                if lineend != -1 or eof:
+                    if lineend == -1:
+                        lineend = len(data) - 1
+                    line = data[pos + 1:lineend + 1].strip()
+                    if line != self.boundary and line != endmarker:
+                        search = pos + 1
+                        continue
+                    # The line break before the boundary isn't data.
+                    cut = pos
+                    if cut > start and data[cut - 1:cut] == ntob("\r"):
+                        cut -= 1
+                    self.fp.unread(data[lineend + 1:])
+                    if line == endmarker:
+                        self.fp.finish()
+                    done = True
+                elif len(data) - pos > (1 << 16):
+                    search = pos + 1 # too long for a boundary line
+                    continue
+                else:
+                    cut = pos - 1 # keep the candidate (and a CR) until its line is complete
+            elif eof:
                 raise EOFError("Illegal end of multipart body.")
-            if line.startswith(ntob("--")) and prev_lf:
-                strippedline = line.strip()
-                if strippedline == self.boundary:
-                    break
-                if strippedline == endmarker:
-                    self.fp.finish()
-                    break
-
-            line = delim + line
-
-            if line.endswith(ntob("\r\n")):
-                delim = ntob("\r\n")
-                line = line[:-2]
-                prev_lf = True
-            elif line.endswith(ntob("\n")):
-                delim = ntob("\n")
-                line = line[:-1]
-                prev_lf = True
             else:
-                delim = ntob("")
-                prev_lf = False
+                cut = len(data) - holdback
+
+            if cut > start:
+                chunk = data[start:cut]
+                if fp_out is None:
+                    lines.append(chunk)
+                    seen += len(chunk)
+                    if seen > self.maxrambytes:
+                        fp_out = self.make_file()
+                        for line in lines:
+                            fp_out.write(line)
+                else:
+                    fp_out.write(chunk)
+                data = data[cut:]
+                search = max(0, search - cut)
+                start = 0
+            if done:
+                break
 
-            if fp_out is None:
-                lines.append(line)
-                seen += len(line)
-                if seen > self.maxrambytes:
-                    fp_out = self.make_file()
-                    for line in lines:
-                        fp_out.write(line)
-            else:
-                fp_out.write(line)
+            more = self.fp.read(self.chunk_size)
+            if not more:
+                eof = True
+            data += more
 
         if fp_out is None:
             result = ntob('').join(lines)
@@ -871,13 +908,19 @@ class SizedReader:
             if pos:
                 chunks.append(data[:pos])
                 remainder = data[pos:]
-                self.buffer += remainder
+                self.buffer = remainder + self.buffer
                 self.bytes_read -= len(remainder)
                 break
             else:
                 chunks.append(data)
         return ntob('').join(chunks)
 
+    def unread(self, data):
+        """Push bytes read past the end of a part back onto the body."""
+        if data:
+            self.buffer = data + self.buffer
+            self.bytes_read -= len(data)
+
     def readlines(self, sizehint=None):
         """Read lines from the request body and return them."""
         if self.length is not None:
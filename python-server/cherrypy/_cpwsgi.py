@@ -171,6 +171,10 @@ class _TrappedResponse(object):
         def next(self):
             return self.trap(self.iter_response.next)
 
+    @property
+    def file_wrapper(self):
+        return getattr(self.response, 'file_wrapper', None)
+
     def close(self):
         if hasattr(self.response, 'close'):
             self.response.close()
@@ -261,6 +265,11 @@ class AppResponse(object):
                               for k, v in outheaders]
 
             self.iter_response = iter(r.body)
+            # A body made with the server's wsgi.file_wrapper, passed on
+            # so that the server can send its file directly.
+            file_wrapper = self.environ.get(ntou('wsgi.file_wrapper'))
+            if file_wrapper is not None and isinstance(r.body, file_wrapper):
+                self.file_wrapper = r.body
             self.write = start_response(outstatus, outheaders)
         except:
             self.close()
@@ -133,3 +133,31 @@ class SafeMultipartHandlingTest(helper.CPWebCase):
         self.getPage('/flashupload', headers, "POST", body)
         self.assertBody("Upload: Submit Query, Filename: .project, "
                         "Filedata: %r" % filedata)
+
+    def test_binary_upload(self):
+        # Larger than a read chunk, with CRs, LFs and near-boundaries in it.
+        filedata = (ntob('RIFF\r\n--XY\n\r\r\n--XYZa\r\n\x00\xff') * 20000)[:300000]
+        body = (ntob(
+            '--XYZ\r\n'
+            'Content-Disposition: form-data; name="Filename"\r\n'
+            '\r\n'
+            'a.wav\r\n'
+            '--XYZ\r\n'
+            'Content-Disposition: form-data; '
+                'name="Filedata"; filename="a.wav"\r\n'
+            'Content-Type: audio/wav\r\n'
+            '\r\n')
+            + filedata +
+            ntob('\r\n'
+                 '--XYZ\r\n'
+                 'Content-Disposition: form-data; name="Upload"\r\n'
+                 '\r\n'
+                 'Submit Query\r\n'
+                 '--XYZ--\r\n'))
+        headers = [
+            ('Content-Type', 'multipart/form-data; boundary=XYZ'),
+            ('Content-Length', str(len(body))),
+        ]
+        self.getPage('/flashupload', headers, "POST", body)
+        self.assertBody("Upload: Submit Query, Filename: a.wav, "
+                        "Filedata: %r" % filedata)
@@ -0,0 +1,142 @@
+"""Tests for wsgi.file_wrapper bodies and WSGIGateway.sendfile."""
+
+import os
+import socket
+import tempfile
+import time
+
+import cherrypy
+from cherrypy._cpcompat import BytesIO, ntob
+from cherrypy import wsgiserver
+from cherrypy.test import helper
+
+data = ntob('0123456789abcdef') * 20000
+calls = []
+
+
+class SendfileTest(helper.CPWebCase):
+
+    def setup_server():
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        SendfileTest.path = path
+
+        # Record what WSGIGateway.sendfile decided, for every request.
+        sendfile = wsgiserver.WSGIGateway.sendfile
+
+        def recording_sendfile(self, wrapper):
+            sent = sendfile(self, wrapper)
+            calls.append(sent)
+            return sent
+        wsgiserver.WSGIGateway.sendfile = recording_sendfile
+        SendfileTest.sendfile = sendfile
+
+        class Root:
+
+            def file(self, length='yes', offset='0'):
+                f = open(path, 'rb')
+                f.seek(int(offset))
+                cherrypy.request.hooks.attach('on_end_request', f.close)
+                return self.wrap(f, length == 'yes', len(data) - int(offset))
+            file.exposed = True
+            file._cp_config = {'response.stream': True}
+
+            def memory(self):
+                return self.wrap(BytesIO(data), True, len(data))
+            memory.exposed = True
+
+            def wrap(self, f, length, size):
+                # Not text/*, which tools.encode would wrap in a generator.
+                cherrypy.response.headers['Content-Type'] = 'audio/wav'
+                if length:
+                    cherrypy.response.headers['Content-Length'] = size
+                wrapper = cherrypy.request.wsgi_environ['wsgi.file_wrapper']
+                return wrapper(f)
+
+        # A bare WSGI app, whose HEAD responses keep their body.
+        def wsgi_app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'audio/wav'),
+                                      ('Content-Length', str(len(data)))])
+            return environ['wsgi.file_wrapper'](open(path, 'rb'))
+
+        cherrypy.tree.mount(Root())
+        cherrypy.tree.graft(wsgi_app, '/wsgi')
+    setup_server = staticmethod(setup_server)
+
+    def teardown_class(cls):
+        super(SendfileTest, cls).teardown_class()
+        wsgiserver.WSGIGateway.sendfile = cls.sendfile
+        os.remove(cls.path)
+    teardown_class = classmethod(teardown_class)
+
+    def setUp(self):
+        del calls[:]
+
+    def assertCalls(self, expected):
+        # The server records a call after sending the body, which the
+        # client may already have read.
+        deadline = time.time() + 5
+        while len(calls) < len(expected) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(calls, expected)
+
+    def can_sendfile(self):
+        return hasattr(socket.socket, 'sendfile') and self.scheme != 'https'
+
+    def test_sendfile(self):
+        if not isinstance(cherrypy.server.httpserver, wsgiserver.HTTPServer):
+            return self.skip("skipped (not the native server) ")
+        self.getPage('/file')
+        self.assertStatus(200)
+        self.assertHeader('Content-Length', str(len(data)))
+        self.assertBody(data)
+        self.assertCalls([self.can_sendfile()])
+
+        # From where the file stands, not its start.
+        self.getPage('/file?offset=1000')
+        self.assertStatus(200)
+        self.assertBody(data[1000:])
+        self.assertCalls([self.can_sendfile()] * 2)
+
+    def test_fallback(self):
+        if not isinstance(cherrypy.server.httpserver, wsgiserver.HTTPServer):
+            return self.skip("skipped (not the native server) ")
+
+        # No Content-Length: the body is chunked, so it's iterated.
+        self.getPage('/file?length=no')
+        self.assertStatus(200)
+        self.assertNoHeader('Content-Length')
+        self.assertBody(data)
+        self.assertCalls([False])
+
+        # No file descriptor to send from.
+        self.getPage('/memory')
+        self.assertStatus(200)
+        self.assertBody(data)
+        self.assertCalls([False] * 2)
+
+        # HEAD: no body at all.
+        self.getPage('/wsgi', method='HEAD')
+        self.assertStatus(200)
+        self.assertHeader('Content-Length', str(len(data)))
+        self.assertBody('')
+        self.assertCalls([False] * 3)
+
+    def test_wsgi_app(self):
+        if not isinstance(cherrypy.server.httpserver, wsgiserver.HTTPServer):
+            return self.skip("skipped (not the native server) ")
+        self.getPage('/wsgi')
+        self.assertStatus(200)
+        self.assertBody(data)
+        self.assertCalls([self.can_sendfile()])
+
+    def test_wrapper(self):
+        # Iterating a FileWrapper (as any WSGI server may) reads it in blocks.
+        f = BytesIO(data)
+        wrapper = wsgiserver.FileWrapper(f, 65536)
+        chunks = list(wrapper)
+        self.assertEqual(ntob('').join(chunks), data)
+        self.assertEqual(len(chunks[0]), 65536)
+        wrapper.close()
+        self.assertTrue(f.closed)
@@ -74,7 +74,7 @@ __all__ = ['HTTPRequest', 'HTTPConnection', 'HTTPServer',
            'MaxSizeExceeded', 'NoSSLError', 'FatalSSLAlert',
            'WorkerThread', 'ThreadPool', 'SSLAdapter',
            'CherryPyWSGIServer',
-           'Gateway', 'WSGIGateway', 'WSGIGateway_10', 'WSGIGateway_u0',
+           'Gateway', 'FileWrapper', 'WSGIGateway', 'WSGIGateway_10', 'WSGIGateway_u0',
            'WSGIPathInfoDispatcher', 'get_ssl_adapter_class',
            'socket_errors_to_ignore']
 
@@ -2253,6 +2253,32 @@ class CherryPyWSGIServer(HTTPServer):
     numthreads = property(_get_numthreads, _set_numthreads)
 
 
+class FileWrapper(object):
+
+    """The wsgi.file_wrapper: iterates over a file in blocks.
+
+    When an application returns one (or, like CherryPy's AppResponse,
+    exposes one as its file_wrapper attribute), WSGIGateway sends the
+    file with socket.sendfile instead, where it can (see sendfile).
+    """
+
+    def __init__(self, filelike, blksize=65536):
+        self.filelike = filelike
+        self.blksize = blksize
+        if hasattr(filelike, 'close'):
+            self.close = filelike.close
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        data = self.filelike.read(self.blksize)
+        if data:
+            return data
+        raise StopIteration()
+    next = __next__
+
+
 class WSGIGateway(Gateway):
 
     """A base class to interface HTTPServer with WSGI."""
@@ -2271,6 +2297,9 @@ class WSGIGateway(Gateway):
         """Process the current request."""
         response = self.req.server.wsgi_app(self.env, self.start_response)
         try:
+            wrapper = getattr(response, 'file_wrapper', response)
+            if isinstance(wrapper, FileWrapper) and self.sendfile(wrapper):
+                return
             for chunk in response:
                 # "The start_response callable must not actually transmit
                 # the response headers. Instead, it must store them for the
@@ -2318,6 +2347,34 @@ class WSGIGateway(Gateway):
 
         return self.write
 
+    def sendfile(self, wrapper):
+        """Send the rest of a FileWrapper's file with socket.sendfile.
+
+        Only for a plain socket with a declared Content-Length (so that
+        nothing is chunked or encrypted in between) and a real file.
+        Returns False, having sent nothing, if that can't be done.
+        """
+        req = self.req
+        sock = req.conn.socket
+        rbo = self.remaining_bytes_out
+        if (not hasattr(sock, 'sendfile') or req.server.ssl_adapter is not None
+                or rbo is None or req.method == 'HEAD'):
+            return False
+        try:
+            wrapper.filelike.fileno()
+        except (AttributeError, IOError, OSError, ValueError):
+            return False
+
+        if not req.sent_headers:
+            req.sent_headers = True
+            req.send_headers()
+        req.conn.wfile.flush()
+        sent = sock.sendfile(wrapper.filelike, wrapper.filelike.tell(), rbo)
+        if hasattr(req.conn.wfile, 'bytes_written'):
+            req.conn.wfile.bytes_written += sent
+        self.remaining_bytes_out = rbo - sent
+        return True
+
     def write(self, chunk):
         """WSGI callable to write unbuffered data to the client.
 
@@ -2378,6 +2435,7 @@ class WSGIGateway_10(WSGIGateway):
             'SERVER_PROTOCOL': req.request_protocol,
             'SERVER_SOFTWARE': req.server.software,
             'wsgi.errors': sys.stderr,
+            'wsgi.file_wrapper': FileWrapper,
             'wsgi.input': req.rfile,
             'wsgi.multiprocess': False,
             'wsgi.multithread': True,
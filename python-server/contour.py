@@ -0,0 +1,124 @@
+'''
+    Batched comparison of word-level contours (pitch, intensity).
+
+    transferPitch gates each word on the RMSE between its source and target
+    contours, each resampled onto a 200-point grid (normalizeDx) and offset
+    to zero mean (mean_squared_error in main.py). Here all words are done at
+    once: every word's grid is one row of a (words x 200) array, interpolated
+    against the whole tier, so the gating decision for an utterance is a
+    handful of array operations:
+
+        rmse = contour.segmentRMSE(X, Y, bgn, end, tX, tY, tbgn, tend)
+
+    where (X, Y) and (tX, tY) are the time-sorted source and target tiers and
+    bgn, end, tbgn, tend hold every word's spans.
+
+    areaBetween is the other contour distance we use: the (signed and
+    absolute) area between two piecewise-linear curves. nearestValues looks
+    up a tier at many times at once (e.g. the TTS pitch under transferred points).
+'''
+import numpy
+
+SEGMENTS = 200 # points per resampled word, as in mean_squared_error
+
+# Index bounds [lo, hi) of the points of a time-sorted tier X in each span [bgn, end).
+def segmentBounds(X, bgn, end):
+    X = numpy.asarray(X, dtype=numpy.float64)
+    return (numpy.searchsorted(X, bgn, 'left'), numpy.searchsorted(X, end, 'left'))
+
+# Resamples the points [lo, hi) of every segment onto segs evenly spaced times
+# from its first point to just before its last, interpolating linearly as
+# normalizeDx does (the first sample is the first point's value).
+# < Returns a (segments x segs) array; rows of empty segments are NaN.
+def resampleSegments(X, Y, lo, hi, segs=SEGMENTS):
+    X = numpy.asarray(X, dtype=numpy.float64)
+    Y = numpy.asarray(Y, dtype=numpy.float64)
+    lo = numpy.asarray(lo, dtype=int)
+    hi = numpy.asarray(hi, dtype=int)
+    empty = hi <= lo
+    first = numpy.where(empty, 0, lo)
+    last = numpy.where(empty, 0, hi - 1)
+    if len(X) == 0:
+        return numpy.full((len(lo), segs), numpy.nan)
+
+    x0 = X[first][:, None]
+    grid = (numpy.arange(segs) / float(segs))[None, :] * (X[last][:, None] - x0) + x0
+
+    # The grid stays within each segment's points, so searching the whole tier
+    # finds the same neighbours as searching the segment alone.
+    j = numpy.searchsorted(X, grid, 'left')
+    j = numpy.clip(j, first[:, None] + 1, numpy.maximum(last, first + 1)[:, None])
+    j = numpy.minimum(j, len(X) - 1)
+    dist = X[j] - X[j - 1]
+    a = (X[j] - grid) / numpy.where(dist == 0, 1.0, dist)
+    y = (1.0 - a) * Y[j] + a * Y[j - 1]
+
+    # Grid points at (or before) the first point take its value.
+    y = numpy.where(grid <= x0, Y[first][:, None], y)
+    y[empty] = numpy.nan
+    return y
+
+# Root-mean-squared difference between the source and target contour of every word,
+# after resampling each to segs points and removing its mean, as
+# sqrt(mean_squared_error(...)) does. Words with no points on either side get 0.
+# < Returns an array with one RMSE per word.
+def segmentRMSE(X, Y, bgn, end, tX, tY, tbgn, tend, segs=SEGMENTS):
+    (lo, hi) = segmentBounds(X, bgn, end)
+    (tlo, thi) = segmentBounds(tX, tbgn, tend)
+    a = _padded(resampleSegments(X, Y, lo, hi, segs))
+    b = _padded(resampleSegments(tX, tY, tlo, thi, segs))
+    d = a - a.mean(axis=1)[:, None] - (b - b.mean(axis=1)[:, None])
+    rmse = numpy.sqrt(numpy.sum(d[:, :segs] ** 2, axis=1) / float(segs))
+    return numpy.where((hi > lo) & (thi > tlo), rmse, 0.0)
+
+# mapToInterval pads a resampled contour with its first and last values
+# (at 0 and 100), and mean_squared_error averages over the padded contour
+# but compares only its first segs points. Kept, so gating decisions don't change.
+def _padded(y):
+    return numpy.concatenate((y[:, :1], y, y[:, -1:]), axis=1)
+
+# Value of the point of a time-sorted tier (X, Y) nearest to each of the times t,
+# by binary search. Ties go to the earlier point, as a scan from the start would.
+def nearestValues(X, Y, t):
+    X = numpy.asarray(X, dtype=numpy.float64)
+    Y = numpy.asarray(Y, dtype=numpy.float64)
+    t = numpy.asarray(t, dtype=numpy.float64)
+    if len(X) < 2:
+        return numpy.full(t.shape, Y[0] if len(X) else numpy.nan)
+    j = numpy.clip(numpy.searchsorted(X, t, 'left'), 1, len(X) - 1)
+    k = numpy.where(numpy.abs(t - X[j - 1]) <= numpy.abs(X[j] - t), j - 1, j)
+    return Y[numpy.searchsorted(X, X[k], 'left')] # first of any points at the same time
+
+# Area between two piecewise-linear curves (X sorted or not) over the x-range
+# they share, in one pass over their merged breakpoints: on each interval the
+# difference A - B is linear, so its integral is a trapezoid, split at the
+# crossing when the curves swap places.
+# < Returns (signed, absolute): the area where A is above B minus where it's
+# < below, and the total area between them.
+def areaBetween(AX, AY, BX, BY):
+    (AX, AY) = _sorted(AX, AY)
+    (BX, BY) = _sorted(BX, BY)
+    if len(AX) == 0 or len(BX) == 0:
+        return (0.0, 0.0)
+    lo = max(AX[0], BX[0])
+    hi = min(AX[-1], BX[-1])
+    if hi <= lo:
+        return (0.0, 0.0)
+
+    x = numpy.union1d(AX, BX)
+    x = x[(x >= lo) & (x <= hi)]
+    d = numpy.interp(x, AX, AY) - numpy.interp(x, BX, BY)
+    dx = numpy.diff(x)
+    (d0, d1) = (d[:-1], d[1:])
+
+    signed = numpy.sum(0.5 * (d0 + d1) * dx)
+    crossing = d0 * d1 < 0
+    span = numpy.where(crossing, numpy.abs(d0) + numpy.abs(d1), 1.0)
+    absolute = numpy.sum(numpy.where(crossing, 0.5 * (d0 * d0 + d1 * d1) / span, 0.5 * numpy.abs(d0 + d1)) * dx)
+    return (float(signed), float(absolute))
+
+def _sorted(X, Y):
+    X = numpy.asarray(X, dtype=numpy.float64)
+    Y = numpy.asarray(Y, dtype=numpy.float64)
+    order = numpy.argsort(X, kind='mergesort')
+    return (X[order], Y[order])
@@ -0,0 +1,128 @@
+'''
+    Asynchronous jobs for long-running operations (HTK alignment, synthesis).
+
+    Instead of holding an HTTP thread for the seconds HTK or Praat take,
+    a request submits a job and gets its id back at once. The job runs on
+    the queue's own threads, and the client polls (or long-polls) its
+    status and fetches the result when it's done:
+
+        jobid = jobs.submit(lambda: align_files(wavname, trsname))
+        jobs.wait(jobid, 30).status   # -> 'queued', 'running', 'done' or 'failed'
+        jobs.get(jobid).result
+
+    Finished jobs are kept for `ttl` seconds (see JobQueue.sweep, run
+    periodically by a Monitor), then dropped along with their results.
+    A job may have a scratch workspace of its own (see workspace.py): it's
+    current while the job runs, and removed when the job is dropped.
+'''
+import threading
+import time
+import uuid
+from cherrypy.process.plugins import SimplePlugin
+from stages import StagePool
+
+class Job(object):
+
+    def __init__(self, fn, cleanup=None, workspace=None):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.cleanup = cleanup  # called with the result when the job is dropped
+        self.workspace = workspace
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.finished = None    # time.time() when done or failed
+        self.discarded = False
+        self.done = threading.Event()
+
+class JobQueue(SimplePlugin):
+
+    def __init__(self, bus, threads=4, maxjobs=1000, ttl=600):
+        SimplePlugin.__init__(self, bus)
+        self.pool = StagePool(threads)
+        self.maxjobs = maxjobs
+        self.ttl = ttl
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    # Queues fn() and returns the job's id, or None if too many jobs are
+    # pending. fn returns the result; a result that is an 'Error: ...'
+    # string (as our handlers return) or an exception fails the job.
+    # The job takes over the workspace, if given (and removes it if refused).
+    def submit(self, fn, cleanup=None, workspace=None):
+        job = Job(fn, cleanup, workspace)
+        with self.lock:
+            if len(self.jobs) >= self.maxjobs:
+                if workspace is not None:
+                    workspace.close()
+                return None
+            self.jobs[job.id] = job
+        self.pool.submit(lambda: self._run(job))
+        return job.id
+
+    def _run(self, job):
+        job.status = 'running'
+        try:
+            if job.workspace is None:
+                job.result = job.fn()
+            else:
+                with job.workspace.active():
+                    job.result = job.fn()
+            if isinstance(job.result, str) and job.result.startswith('Error'):
+                job.error = job.result
+        except Exception as e:
+            self.bus.log('Job ' + job.id + ' failed.', traceback=True)
+            job.error = 'Error: ' + str(e)
+        job.finished = time.time()
+        job.status = 'failed' if job.error is not None else 'done'
+        job.done.set()
+
+    def get(self, jobid):
+        with self.lock:
+            return self.jobs.get(jobid)
+
+    # Long-poll: waits up to timeout seconds for the job to finish.
+    # Returns the job (to read its status, and error, from), or None if there's no such job.
+    def wait(self, jobid, timeout=0):
+        job = self.get(jobid)
+        if job is None:
+            return None
+        if timeout > 0:
+            job.done.wait(timeout)
+        return job
+
+    # Drops a job (e.g. once its result has been fetched). Jobs still
+    # running are dropped when they finish, by the next sweep.
+    def discard(self, jobid):
+        with self.lock:
+            job = self.jobs.get(jobid)
+            if job is None:
+                return
+            job.discarded = True
+            if not job.done.is_set():
+                return
+            del self.jobs[jobid]
+        self._cleanup(job)
+
+    # Drops finished jobs older than ttl. (Run periodically by a Monitor; must not raise.)
+    def sweep(self, ttl=None):
+        cutoff = time.time() - (self.ttl if ttl is None else ttl)
+        with self.lock:
+            expired = [j for j in self.jobs.values() if j.done.is_set() and (j.discarded or j.finished <= cutoff)]
+            for j in expired:
+                del self.jobs[j.id]
+        for j in expired:
+            self._cleanup(j)
+
+    # Cleans up after every finished job when the server stops.
+    def stop(self):
+        self.sweep(0)
+
+    def _cleanup(self, job):
+        if job.cleanup is not None and job.error is None:
+            try:
+                job.cleanup(job.result)
+            except Exception:
+                self.bus.log('Error cleaning up job ' + job.id + '.', traceback=True)
+        if job.workspace is not None:
+            job.workspace.close()
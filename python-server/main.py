@@ -17,10 +17,34 @@ from cherrypy.lib.static import serve_file
 # File I/O and processing
 import tgt # TextGrid API
 import subprocess
-import tempfile
+import logging
+import threading
+import multiprocessing
 import os
 import praatUtil
+import analysis
+import psola
+import contour
+import wavconvert
+import responses
+import workspace
 import math
+import numpy
+from praatpool import PraatPool
+from tiercache import TierCache, tierKey
+from stages import Plan, StagePool
+from batchpool import ProcessPool, zipStream
+from jobs import JobQueue
+from multiprocessing.util import Finalize
+import zipfile
+import shutil
+import tempfile
+import itertools
+import json
+import re
+import uploads
+from cherrypy.process.plugins import Monitor
+from p2fa import align as aligner
 
 # Database (you should be running mongod)
 from pymongo import MongoClient
@@ -29,7 +53,60 @@ db = client['newspeak']
 words_collection = db['words'] # DB is called 'newspeak' and Collection is called 'words'
 user_collection = db['users'] # for safety reasons
 
-constants = { 'SEGMENTS':40 }
+constants = { 'SEGMENTS':40,
+              'PRAAT_WORKERS':4,          # resident Praat processes (0 = spawn one per job)
+              'PRAAT_MAX_JOBS':200,       # recycle a worker after this many jobs
+              'PRAAT_TIMEOUT':60,         # seconds before a silent worker is restarted
+              'PRAAT_HEALTH_CHECK':30,    # seconds between worker pings
+              'PITCH_TRACKER':'praat',    # 'praat' (extract_pitchtier.praat) or 'native' (analysis.py)
+              'INTENSITY_TRACKER':'native', # 'praat' (extract_intensitytier.praat) or 'native' (analysis.py)
+              'RESYNTH_ENGINE':'praat',   # PSOLA via 'praat' (*_resynth.praat) or 'native' (psola.py)
+              'TIER_CACHE_BYTES':64 << 20, # in-memory budget for cached pitch/intensity tiers
+              'TIER_CACHE_DIR':None,      # optional directory to also keep cached tiers on disk
+              'PITCH_TRANSFER':'zscore',  # 'zscore' (renormalized source pitch) or 'blend' (mixed with the nearest TTS pitch)
+              'PITCH_BLEND':0.5,          # weight of the source pitch in 'blend' mode
+              'FUSED_SYNTHESIS':True,     # /synthesize applies all tiers in one resynthesis pass
+              'SPOOL_DIR':None,           # where uploads are spooled, e.g. a tmpfs (None = the temp dir)
+              'CONVERT_CACHE_DIR':None,   # converted TTS WAVs, by content (None = a folder in the temp dir)
+              'CONVERT_CACHE_FILES':256,  # how many of them to keep
+              'AUDIO_STORE_DIR':None,     # where /db/store keeps words' audio (None = a folder in the temp dir)
+              'SCRATCH_DIR':None,         # where requests' scratch files go (None = /dev/shm if there is one, else the temp dir)
+              'SCRATCH_QUOTA':256 << 20,  # bytes of scratch files per request or job (None = no limit)
+              'SCRATCH_MAX_AGE':3600,     # seconds before abandoned scratch files are swept
+              'ALIGN_WORKERS':None,       # alignments (HTK runs) at once (None = one per core)
+              'STAGE_THREADS':8,          # threads running independent stages of requests
+              'BATCH_PROCESSES':None,     # processes for /batchsynthesize (None = one per core, 0 = in the request thread)
+              'BATCH_PRAAT_WORKERS':2,    # resident Praat processes in each batch process (as PRAAT_WORKERS)
+              'JOB_THREADS':8,            # threads running /submit'd jobs
+              'JOB_LIMIT':1000,           # jobs held (queued, running or awaiting fetch) at once
+              'JOB_TTL':600,              # seconds a finished job's result is kept
+              'JOB_POLL_MAX':30 }         # longest /status long-poll, in seconds
+
+# What PITCH_TRACKER, INTENSITY_TRACKER and a request's tracker may name.
+TRACKERS = ('praat', 'native')
+
+# All Praat scripts run through this pool (see praatpool.py).
+praat = PraatPool(cherrypy.engine, constants['PRAAT_WORKERS'], constants['PRAAT_MAX_JOBS'], constants['PRAAT_TIMEOUT'])
+praat.subscribe()
+Monitor(cherrypy.engine, praat.check, constants['PRAAT_HEALTH_CHECK'], 'PraatHealthCheck').subscribe()
+
+# Pitch and intensity tiers, keyed by audio content (see tiercache.py).
+tiers = TierCache(constants['TIER_CACHE_BYTES'], constants['TIER_CACHE_DIR'])
+
+# TTS WAVs Praat can't read, converted, by content (see wavconvert.py).
+converted = wavconvert.ConvertCache(constants['CONVERT_CACHE_DIR'], constants['CONVERT_CACHE_FILES'])
+
+# P2FA's pronunciation dictionary (with dict.local), loaded once for every alignment (see p2fa/lexicon.py).
+lexicon = aligner.load_lexicon()
+alignslots = threading.BoundedSemaphore(constants['ALIGN_WORKERS'] or multiprocessing.cpu_count())
+
+# Independent stages within a request (analyses, conversion) run here (see stages.py).
+stagepool = StagePool(constants['STAGE_THREADS'])
+
+# Jobs from /submit run here, off the HTTP threads (see jobs.py).
+jobs = JobQueue(cherrypy.engine, constants['JOB_THREADS'], constants['JOB_LIMIT'], constants['JOB_TTL'])
+jobs.subscribe()
+Monitor(cherrypy.engine, jobs.sweep, 60, 'JobSweep').subscribe()
 
 # Computes the mean-squared-error between arbitrary graphs. (normalizes dx beforehand)
 def mean_squared_error(A, B, abgn, aend, bbgn, bend):
@@ -42,111 +119,20 @@ def mean_squared_error(A, B, abgn, aend, bbgn, bend):
     return sum([((nA[i][1] - nB[i][1])**2) for i in xrange(200)]) / 200.0
 
 # Calculates the area between two graphs
-# of arbitrary x-distances between each point.
-# > Does this by isolating the 'top graph' and the 'bottom graph'
-# > based on their intersections, then subtracting the bottom area
-# > from the top.
+# of arbitrary x-distances between each point,
+# over the x-range they have in common (see contour.areaBetween).
 # < Takes: two lists of 2D tuples (x, y) representing graph A and B
 # < NOTE: While dx can vary between points in A and B,
-# < dx should be in the same ultimate range, i.e. 0.0 to 1.0 or 0 to 100,
-# < and y should always be nonnegative (>= 0) for both A and B.
-def areaBetween(A, B):
+# < dx should be in the same ultimate range, i.e. 0.0 to 1.0 or 0 to 100.
+# < Returns the total area between them or, if signed, the area where A is
+# < above B minus the area where it's below.
+def areaBetween(A, B, signed=False):
     if A == None or B == None or len(A) == 0 or len(B) == 0:
         return 0
-    elif B[0][1] > A[0][1]: # enforce that A starts with highest Y-value
-        return areaBetween(B, A)
-
-    # Thanks to Paul Draper @ SO.
-    # http://stackoverflow.com/a/20677983
-    def findIntersection(line1, line2):
-
-        # Thanks to Grumdrig @ SO.
-        # http://stackoverflow.com/a/9997374
-        def ccw(A,B,C):
-            return (C[1]-A[1]) * (B[0]-A[0]) > (B[1]-A[1]) * (C[0]-A[0])
-
-        # Return true if line segments AB and CD intersect
-        def intersect(A,B,C,D):
-            return ccw(A,C,D) != ccw(B,C,D) and ccw(A,B,C) != ccw(A,B,D)
-
-        # First, determine whether SEGMENTS intersect...
-        if intersect(line1[0], line1[1], line2[0], line2[1]) == False:
-            return None
-
-        # ...Then determine where.
-        xdiff = (line1[0][0] - line1[1][0], line2[0][0] - line2[1][0])
-        ydiff = (line1[0][1] - line1[1][1], line2[0][1] - line2[1][1])
-
-        def det(a, b):
-            return a[0] * b[1] - a[1] * b[0]
-
-        div = det(xdiff, ydiff)
-        if div == 0:
-           return None
-
-        d = (det(*line1), det(*line2))
-        x = det(d, xdiff) / div
-        y = det(d, ydiff) / div
-        return (x, y)
-
-    # Assumes all y's are >= 0...
-    def areaUnder(X):
-        area = 0
-        for p in xrange(len(X)-1):
-            x, y = X[p]
-            nX, nY = X[p+1]
-            dx = nX - x
-            area += dx * abs(nY - y) / 2.0 + min(y, nY) * dx # area += dA
-        return area
-
-    # A starts high.
-    top = []
-    bottom = []
-    j = 0
-    for i in xrange(len(A)-1):
-        aX, aY = A[i]
-        naX, naY = A[i+1]
-        bX, bY = B[j]
-        nbX, nbY = B[j+1]
-        while bX < aX and nbX < naX: # B's first point is behind us. Skip to the point where it's not.
-            bottom.append(B[j])
-            j += 1
-            bX, bY = B[j]
-            if j < len(B)-1: nbX, nbY = B[j+1]
-            else:
-                bottom.append(B[j])
-                break
-
-        if j >= len(B)-1:
-            break
-
-        # B's line starts after (or on) A's.
-        inter = findIntersection((A[i], A[i+1]), (B[j], B[j+1]))
-        if inter is None: # A's line is on top.
-            top.append(A[i])
-            continue
-        else: # The lines intersect, and B comes out on top.
-            # print((A[i], A[i+1], B[j], B[j+1], inter))
-            top.append(A[i])
-            top.append(inter)
-            bottom.append(B[j])
-            bottom.append(inter)
-            nextBottom = list(A[(i+1):]).insert(0, inter) # A is now the underdog
-            nextTop = list(B[(j+1):]).insert(0, (inter[0], inter[1]+0.00001)) # B's starting value must be slightly higher
-
-            area_under_top = areaUnder(top)
-            area_under_bot = areaUnder(bottom)
-            print('Area under top: ' + str(area_under_top))
-            print('Area under bottom: ' + str(area_under_bot))
-
-            return areaUnder(top) - areaUnder(bottom) + areaBetween(nextTop, nextBottom) # yay tail recursion
-
-    # We've reached the end of B.
-    area_under_top = areaUnder(top)
-    area_under_bot = areaUnder(bottom)
-    print('Area under top: ' + str(area_under_top))
-    print('Area under bottom: ' + str(area_under_bot))
-    return areaUnder(top) - areaUnder(bottom)
+    A = numpy.asarray(A, dtype=numpy.float64)
+    B = numpy.asarray(B, dtype=numpy.float64)
+    (signedarea, area) = contour.areaBetween(A[:, 0], A[:, 1], B[:, 0], B[:, 1])
+    return signedarea if signed else area
 
 def mapToInterval(A, originalInterval, newInterval):
     C = []
@@ -243,9 +229,32 @@ def normalizeDx(A, segs=100):
     return nA
 
 def convertAudioToWAV(wavfile, new_filename):
-    cmd = ['ffmpeg', '-i', wavfile, new_filename]
+    cmd = ['ffmpeg', '-y', '-i', wavfile, new_filename]
     subprocess.call(cmd)
 
+# CONVERT TTS AUDIO TO WAV.
+# * IN the future, we shouldn't have to do this. But Watson returns
+# * a WAV file that Praat can't read. So we need to convert the audio after-the-fact. (sigh)
+# Plain PCM WAVs are left alone; other WAVs are rewritten in-process (see wavconvert.py),
+# and cached by content; anything else still goes through ffmpeg.
+# Replaces the uploaded file; returns the path of the converted one, or an error string.
+def convertTTS(tname):
+    info = wavconvert.probe(tname)
+    if info is not None and info.readable:
+        return tname
+    nname = workspace.mkstemp('.wav') # removed with the request, whatever happens to it
+    def convert(src, dst):
+        if wavconvert.convert(src, dst, info):
+            return True
+        convertAudioToWAV(src, dst)
+        return os.path.getsize(dst) > 0
+    ok = converted.fetch(tname, nname, convert)
+    os.remove(tname)
+    if not ok:
+        os.remove(nname)
+        return 'Error: Could not convert the target (TTS) audio to WAV.'
+    return nname
+
 '''
     Handles database + audio cache on filesystem
 
@@ -280,19 +289,27 @@ class AudioCache(object):
     # Stores a wav representing a single word into the DB.
     # > Returns 1 if successful, -1 if failed.
     @cherrypy.expose
-    def store(self, user, word, wav):
+    def store(self, user, word, wav, tracker=None):
+
+        tracker = trackerOption(tracker)
+        if isError(tracker):
+            print(tracker)
+            return -1
 
         # If user exists...
         if user_collection.find_one({'user':user}) is not None:
 
-            # Store wav on file system:
-            # TODO: Change this to different folder
-            (_, wavfile) = storeTempWAV(wav)
+            # Store wav on file system, for /db/get to serve later:
+            wavfile = storeWAV(wav)
 
             # == Get various properties ==
             # Extract pitch contour + normalize
-            (X, Y) = self.scripts.extractPitchContour(wavfile)
-            (X, Y) = eliminateNullPoints(X, Y)
+            contour = self.scripts.extractPitchContour(wavfile, tracker)
+            if contour is None:
+                print('Could not extract pitch contour for ' + str(word) + '.')
+                os.remove(wavfile)
+                return -1
+            (X, Y) = eliminateNullPoints(*contour)
             (avgpitch, stdeviation) = computeMeanAndDeviation(Y)
             dur = X[-1]
             nY = normalizeToUnitSquare(X, Y) # we don't need X anymore b/c dx is constant
@@ -351,62 +368,133 @@ class AudioCache(object):
             return -1
 
 
+# Scratch files go in the request's (or job's) workspace, removed with it (see workspace.py).
+# Uploads are spooled to named files (see uploads.py), so this normally just takes
+# the upload's file over; otherwise it's copied out in chunks.
 def storeTempWAV(wavfile):
-    (fd, filename) = tempfile.mkstemp('.wav')
-    with open(filename, 'wb') as f:
-        f.write(wavfile.file.read())
+    filename = uploads.claim(wavfile)
+    if filename is not None:
+        try:
+            workspace.adopt(filename)
+        except IOError: # over quota: nobody owns it now
+            os.remove(filename)
+            raise
+    else:
+        filename = workspace.mkstemp('.wav')
+        with open(filename, 'wb') as f:
+            copyUpload(wavfile, f)
+    os.chmod(filename, 0o755)
+    return (None, filename)
+# Keeps an uploaded WAV for good, in AUDIO_STORE_DIR (not a workspace). > Returns its path.
+def storeWAV(wavfile):
+    directory = constants['AUDIO_STORE_DIR'] or os.path.join(tempfile.gettempdir(), 'praatjs-audio')
+    try:
+        os.makedirs(directory)
+    except OSError:
+        if not os.path.isdir(directory):
+            raise
+    (fd, filename) = tempfile.mkstemp('.wav', dir=directory)
+    spooled = uploads.claim(wavfile)
+    try:
+        if spooled is not None:
+            os.close(fd)
+            shutil.move(spooled, filename)
+        else:
+            with os.fdopen(fd, 'wb') as f:
+                copyUpload(wavfile, f)
+    except:
+        for path in (spooled, filename):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+        raise
     os.chmod(filename, 0o755)
-    return (fd, filename)
+    return filename
+def copyUpload(wavfile, f):
+    if wavfile.file is not None:
+        wavfile.file.seek(0)
+        shutil.copyfileobj(wavfile.file, f, 1 << 16)
+    else:
+        f.write(wavfile.value)
 def storeTempTXT(txt):
-    (fd, filename) = tempfile.mkstemp('.txt')
-    with open(filename, 'wb') as f:
-        f.write(txt)
+    filename = workspace.write(txt, '.txt')
     os.chmod(filename, 0o755)
-    return (fd, filename)
+    return (None, filename)
 def storeTempGrid(txtgrid):
-    (fd, filename) = tempfile.mkstemp()
+    filename = workspace.mkstemp()
     tgt.io.write_to_file(txtgrid, filename, format='short', encoding='utf8')
     os.chmod(filename, 0o755)
     return filename
 def storeTempPitchTier(dataX, dataY): # this is the short version, which is what praatUtil can read
-    (fd, filename) = tempfile.mkstemp()
-    with open(filename, 'wb') as f:
-        f.write('File type = "ooTextFile"\nObject class = "PitchTier"\n\n')
-        f.write(str(dataX[0]) + '\n')
-        f.write(str(dataX[-1]) + '\n')
-        f.write(str(len(dataX)-2) + '\n')
-        for i in xrange(1, len(dataX)-1):
-            f.write(str(dataX[i]) + '\n')
-            f.write(str(dataY[i]) + '\n')
-    os.chmod(filename, 0o755)
-    return filename
+    header = 'File type = "ooTextFile"\nObject class = "PitchTier"\n\n'
+    header += formatNumbers([dataX[0], dataX[-1]]) + str(len(dataX)-2) + '\n'
+    return storeTempTier(header, interleave(dataX[1:-1], dataY[1:-1]))
 def storeTempDurTier(wavdur, durps): # this is the short version, which is what praatUtil can read
-    (_, filename) = tempfile.mkstemp()
-    with open(filename, 'wb') as f:
-        f.write('File type = "ooTextFile"\nObject class = "DurationTier"\n\n')
-        f.write('0\n')
-        f.write(str(wavdur) + '\n')
-        f.write(str(len(durps) / 2) + '\n')
-        for i in xrange(len(durps)):
-            f.write(str(durps[i]) + '\n')
-    # with open(filename, 'r') as f:
-    #     print(f.read())
-    os.chmod(filename, 0o755)
-    return filename
+    header = 'File type = "ooTextFile"\nObject class = "DurationTier"\n\n'
+    header += '0\n' + formatNumbers([wavdur]) + str(len(durps) // 2) + '\n'
+    return storeTempTier(header, durps)
 def storeTempIntensityTier(dataX, dataY):
-    (_, filename) = tempfile.mkstemp()
-    with open(filename, 'wb') as f:
-        f.write('File type = "ooTextFile"\nObject class = "IntensityTier"\n\n')
-        f.write(str(dataX[0]) + '\n')
-        f.write(str(dataX[-1]) + '\n')
-        f.write(str(len(dataX)-2) + '\n')
-        for i in xrange(0, len(dataX)):
-            f.write(str(dataX[i]) + '\n')
-            f.write(str(dataY[i]) + '\n')
-    with open(filename, 'r') as f:
-         print(f.read())
-    os.chmod(filename, 0o755)
-    return filename
+    header = 'File type = "ooTextFile"\nObject class = "IntensityTier"\n\n'
+    header += formatNumbers([dataX[0], dataX[-1]]) + str(len(dataX)-2) + '\n'
+    return storeTempTier(header, interleave(dataX, dataY))
+
+# Writes a short-text tier file in one go: the header, then the numbers one per line.
+def storeTempTier(header, values):
+    return workspace.write((header + formatNumbers(values)).encode('ascii'))
+
+# Formats numbers one per line, as str() would (%.12g), with a single format operation.
+def formatNumbers(values):
+    values = numpy.asarray(values, dtype=numpy.float64).ravel()
+    return ('%.12g\n' * len(values)) % tuple(values.tolist())
+
+# [x0, y0, x1, y1, ...] from X and Y.
+def interleave(X, Y):
+    return numpy.column_stack((numpy.asarray(X, dtype=numpy.float64), numpy.asarray(Y, dtype=numpy.float64))).ravel()
+
+# Our handlers return 'Error: ...' strings in place of results.
+def isError(result):
+    return isinstance(result, str) and result.startswith('Error')
+
+# Reads the word tier of a TextGrid made by P2FA as timestamps ("word start end ..."),
+# skipping spaces. Returns an error string if it can't.
+def textgrid_to_timestamps(txtgrid):
+    ts = ""
+    try:
+        tg = tgt.io.read_textgrid(txtgrid)
+        if tg.has_tier('word'):
+            wrdtier = tg.get_tier_by_name('word')
+            annots = wrdtier.annotations
+            for a in annots:
+                if a.text == 'sp': continue # skip spaces
+                ts += " ".join([ str(a.text), str(a.start_time), str(a.end_time) ]) + " "
+        else:
+            return 'Error: No word tier.'
+    except Exception, err:
+        return 'Error: Could not open TextGrid ' + txtgrid + '. ' + str(err)
+    return ts
+
+# Checks a request's pitchmode and pitchblend fields (see transferPitch).
+# Returns (mode, blend), None for either not given, or an error string.
+def pitchTransferOptions(pitchmode, pitchblend):
+    (pitchmode, pitchblend) = (fieldValue(pitchmode) or None, fieldValue(pitchblend) or None)
+    if pitchmode not in (None, 'zscore', 'blend'):
+        return 'Error: Unknown pitch mode ' + str(pitchmode) + '. Try zscore or blend.'
+    if pitchblend is not None:
+        try:
+            pitchblend = float(pitchblend)
+        except ValueError:
+            return 'Error: pitchblend must be a number from 0 to 1.'
+        if not 0 <= pitchblend <= 1:
+            return 'Error: pitchblend must be a number from 0 to 1.'
+    return (pitchmode, pitchblend)
+
+# Checks a request's tracker field (see extractPitchContour).
+# Returns the tracker, None if not given, or an error string.
+def trackerOption(tracker):
+    tracker = fieldValue(tracker) or None
+    if tracker not in (None,) + TRACKERS:
+        return 'Error: Unknown tracker ' + str(tracker) + '. Try praat or native.'
+    return tracker
+
 def stringToTimestamps(strg):
     s = strg.split(',')
     ts = []
@@ -432,6 +520,142 @@ def computeMean(Y):
     return sum(Y) / len(Y)
 
 
+### Transfers the source's pitch contour (X, Y) onto the target, word by word,
+# renormalizing to the target's (ttsX, ttsY) mean + deviation.
+# Words whose contours differ by less than transferThreshold (RMSE) keep the target's pitch.
+# mode (default constants['PITCH_TRANSFER']) is 'zscore' to use the renormalized source
+# pitch as is, or 'blend' to mix it with the TTS pitch nearest each point, weighted by blend
+# (default constants['PITCH_BLEND']): the source's shape around the TTS's own pitch.
+# Works on whole slices of the (time-sorted) tiers at once, so long utterances cost next to nothing.
+# Returns the new PitchTier as (tX, tY), in target time.
+def transferPitch(X, Y, ttsX, ttsY, srctimestamps, ttimestamps, transferThreshold=0, mode=None, blend=None):
+    mode = mode or constants['PITCH_TRANSFER']
+    blend = constants['PITCH_BLEND'] if blend is None else blend
+    X = numpy.asarray(X, dtype=numpy.float64)
+    Y = numpy.asarray(Y, dtype=numpy.float64)
+    ttsX = numpy.asarray(ttsX, dtype=numpy.float64)
+    ttsY = numpy.asarray(ttsY, dtype=numpy.float64)
+
+    # Index bounds [lo, hi) of the points of tier A with bgn <= x < end.
+    def _getPitchPointsInSegment(bgn, end, A):
+        return (numpy.searchsorted(A, bgn, 'left'), numpy.searchsorted(A, end, 'left'))
+
+    # Transpose pitch points from source to target, according to timestamp data.
+    # -> 1. Loop through all source segments (words).
+    # -> 2. For each segment, get the pitch points contained in it.
+    # -> 3. Translate + scale the pitch points to the corresponding target segment.
+    # -> 4. OPT: Normalize pitch Hz using target's avg pitch, and OPT scale Y using std deviation
+    # -> 5. Write result (tX, tY) into new pitch tier and save
+    (src_mean, src_stdeviation) = computeMeanAndDeviation(withoutZeros(Y))
+    (tgt_mean, tgt_stdeviation) = computeMeanAndDeviation(withoutZeros(ttsY))
+    cherrypy.log('transferPitch: source mean ' + str(src_mean) + ', deviation ' + str(src_stdeviation) + '.', severity=logging.DEBUG)
+
+    # Difference between the source and target contours of every word at once (see contour.py)
+    if transferThreshold != 0:
+        spans = numpy.array([[s[1], s[2], t[1], t[2]] for (s, t) in zip(srctimestamps, ttimestamps)], dtype=numpy.float64).reshape(-1, 4)
+        rmses = contour.segmentRMSE(X, Y, spans[:, 0], spans[:, 1], ttsX, ttsY, spans[:, 2], spans[:, 3])
+
+    tX = []
+    tY = []
+    for i in range(len(srctimestamps)):
+        srcts = srctimestamps[i]
+        tgtts = ttimestamps[i]
+        bgn = srcts[1]
+        end = srcts[2]
+        if bgn == 0 and end == 0:
+            continue # Skip null timestamps.
+        tbgn = tgtts[1]
+        tend = tgtts[2]
+        lensrc = end - bgn
+        lentgt = tend - tbgn
+        (lo, hi) = _getPitchPointsInSegment(bgn, end, X)
+        rmse = 0
+
+        if abs(tbgn - tend) < 0.00001:
+            (tlo, thi) = _getPitchPointsInSegment(tbgn, tend, ttsX)
+            tX.append(ttsX[tlo:thi])
+            tY.append(ttsY[tlo:thi])
+            cherrypy.log('transferPitch: skipping null word "' + srcts[0] + '".', severity=logging.DEBUG)
+            continue # Skip the prosody transfer for null words
+
+        if transferThreshold != 0:
+            (tlo, thi) = _getPitchPointsInSegment(tbgn, tend, ttsX)
+            rmse = rmses[i]
+            if rmse < transferThreshold:
+                tX.append(ttsX[tlo:thi])
+                tY.append(ttsY[tlo:thi])
+                cherrypy.log('transferPitch: skipping "' + srcts[0] + '" with rms ' + str(rmse) + '.', severity=logging.DEBUG)
+                continue # Skip the prosody transfer for this word b/c it doesn't clear our threshold difference.
+
+        cherrypy.log('transferPitch: transferring "' + srcts[0] + '" with rms ' + str(rmse) + '.', severity=logging.DEBUG)
+        px = X[lo:hi]
+        py = Y[lo:hi]
+        keep = ~(py > src_mean * 2.5) # skip outliers
+        px = px[keep]
+        py = py[keep]
+
+        # Map the word's time span onto the target's: x -> tbgn + (x - bgn) / lensrc * lentgt
+        tp = tbgn + ((px - bgn) / lensrc) * lentgt
+
+        # Pitch renormalization
+        # RESCALE SRC Y BY ST DEVIATION --> rescaled_src_pitch = (src_pitch - src_avgpitch) / src_stdeviation * t_stdeviation
+        # TRANSLATE SRC Y TO NEW MEAN --> rescaled_src_pitch + (t_avgpitch - src_avgpitch)
+        tv = ((py - src_mean) / src_stdeviation * tgt_stdeviation) + tgt_mean
+
+        # (alternatives: renormalize w/ just mean offset, py / src_mean * tgt_mean; or one-to-one, py)
+
+        if mode == 'blend' and len(ttsX) > 0:
+            # Find nearest value in TTS wav's pitch contour for every point (see contour.py)
+            tv = blend * tv + (1.0 - blend) * contour.nearestValues(ttsX, ttsY, tp)
+
+        tX.append(tp)
+        tY.append(tv)
+
+    if not tX:
+        return ([], [])
+    return (numpy.concatenate(tX).tolist(), numpy.concatenate(tY).tolist())
+
+### Transfers the source's intensity contour (X, Y) onto the target (tX, tY), word by word:
+# each word's points are moved onto the target word's time span and rescaled from the
+# source's to the target's average intensity, all in one pass over the (time-sorted) tiers.
+# Returns the new IntensityTier as (aX, aY), in target time.
+def transferIntensity(X, Y, tX, tY, srctimestamps, ttimestamps):
+    X = numpy.asarray(X, dtype=numpy.float64)
+    Y = numpy.asarray(Y, dtype=numpy.float64)
+    tX = numpy.asarray(tX, dtype=numpy.float64)
+    tY = numpy.asarray(tY, dtype=numpy.float64)
+
+    # Calculate avg intensity for the whole sentence
+    voiced = Y[Y > 0.0001]
+    tvoiced = tY[tY > 0.0001]
+    if len(voiced) == 0 or len(tvoiced) == 0:
+        return ([], [])
+    avgint_src = voiced.mean() # TODO: Weight points by area...
+    avgint_tgt = tvoiced.mean()
+
+    # Source and target spans of every word, skipping null timestamps.
+    words = [(s[1], s[2], t[1], t[2]) for (s, t) in zip(srctimestamps, ttimestamps) if not (s[1] == 0 and s[2] == 0)]
+    if not words:
+        return ([], [])
+    (bgn, end, tbgn, tend) = numpy.array(words, dtype=numpy.float64).T
+
+    # Index bounds of each word's points in the source and target contours
+    (lo, hi) = (numpy.searchsorted(X, bgn, 'left'), numpy.searchsorted(X, end, 'left'))
+    (tlo, thi) = (numpy.searchsorted(tX, tbgn, 'left'), numpy.searchsorted(tX, tend, 'left'))
+    found = (hi > lo) & (thi > tlo)
+    if not found.all():
+        cherrypy.log('transferIntensity: skipping ' + str(numpy.count_nonzero(~found)) + ' words with no intensity points.', severity=logging.DEBUG)
+
+    # Gather the points of all words at once: word[k] is the word of the k'th point, idx[k] its index in X.
+    counts = numpy.where(found, hi - lo, 0)
+    word = numpy.repeat(numpy.arange(len(counts)), counts)
+    idx = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts - lo, counts)
+
+    # Transpose intensity points from source to target span, and scale to the target's average
+    aX = tbgn[word] + ((X[idx] - bgn[word]) / (end - bgn)[word]) * (tend - tbgn)[word]
+    aY = Y[idx] / avgint_src * avgint_tgt
+    return (aX.tolist(), aY.tolist())
+
 '''
     Exposes the Praat API to a local web server.
 '''
@@ -471,32 +695,27 @@ class PraatScripts(object):
         # Store temp transcript to disk
         (td, trsname) = storeTempTXT(transcript)
 
+        # Return timestamp array.
+        return self.align_files(wavname, trsname)
+
+    # Runs 'align' on a WAV and transcript already stored to disk, and removes them.
+    # Returns the timestamps (or an error string).
+    def align_files(self, wavname, trsname):
         # Run Penn Phonetics Lab Forced Alignment Toolkit (P2FA)
-        (bd, alignfile) = tempfile.mkstemp()
+        alignfile = workspace.mkstemp()
 
         # return 'Checking: ' + wavname + ' ' + trsname + ' ' + alignfile
 
-        cmd = ['python', 'p2fa/align.py', wavname, trsname, alignfile]
-        # cmd = ['mediainfo', wavname] # debug -- check whether it's really a wav file...
-        p = subprocess.call(cmd) # Call HTK and wait for HTK to finish.
+        # In-process, with the dictionary loaded at startup; blocks until HTK is done.
+        # Each alignment works in a directory of its own in the workspace, so up to
+        # ALIGN_WORKERS run at once (HTK runs as separate processes).
+        try:
+            with alignslots:
+                aligner.align(wavname, trsname, alignfile, lexicon, tmpdir=workspace.directory())
+        except Exception, err:
+            print('Alignment failed: ' + str(err))
 
         # Read output. Convert TextGrid to timestamp array.
-        def textgrid_to_timestamps(txtgrid):
-            ts = ""
-            try:
-                tg = tgt.io.read_textgrid(txtgrid)
-                if tg.has_tier('word'):
-                    wrdtier = tg.get_tier_by_name('word')
-                    annots = wrdtier.annotations
-                    for a in annots:
-                        if a.text == 'sp': continue # skip spaces
-                        ts += " ".join([ str(a.text), str(a.start_time), str(a.end_time) ]) + " "
-                else:
-                    return 'Error: No word tier.'
-            except Exception, err:
-                return 'Error: Could not open TextGrid ' + txtgrid + '. ' + str(err)
-            return ts
-
         timestamps = textgrid_to_timestamps(alignfile)
 
         print('Timestamps: ' + timestamps);
@@ -506,12 +725,147 @@ class PraatScripts(object):
         os.remove(trsname)
         os.remove(alignfile)
 
-        # Return timestamp array.
         return timestamps
 
+    # Forced alignment of many WAVs at once: repeated wavfile and transcript fields,
+    # one of each per item. HTK runs once for the lot (see p2fa.align.align_batch),
+    # so the models are loaded once rather than per WAV.
+    # Returns a JSON list with, for each item, its timestamps (as from 'align') or an error string.
+    @cherrypy.expose
+    def batchalign(self, wavfile=None, transcript=None):
+        cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
+
+        wavfiles = asList(wavfile)
+        transcripts = asList(transcript)
+        if len(wavfiles) == 0 or len(wavfiles) != len(transcripts):
+            return 'Error: Batch alignment needs as many wavfile and transcript fields.'
+
+        items = []
+        for i in range(len(wavfiles)):
+            (_, wavname) = storeTempWAV(wavfiles[i])
+            (_, trsname) = storeTempTXT(fieldValue(transcripts[i]))
+            items.append((wavname, trsname))
+
+        cherrypy.response.headers['Content-Type'] = 'application/json'
+        return json.dumps(self.align_batch_files(items))
+
+    # Runs 'batchalign' on (WAV, transcript) pairs already stored to disk, and removes them.
+    # Returns a list of timestamps (or error strings), one per pair.
+    def align_batch_files(self, items):
+        alignfiles = [workspace.mkstemp() for _ in items]
+
+        # One alignment slot for the batch, as it's one HCopy and one HVite run.
+        try:
+            with alignslots:
+                aligned = aligner.align_batch([(w, t, a) for ((w, t), a) in zip(items, alignfiles)], lexicon, tmpdir=workspace.directory())
+        except Exception, err:
+            print('Batch alignment failed: ' + str(err))
+            aligned = [False] * len(items)
+
+        timestamps = []
+        for ((wavname, trsname), alignfile, ok) in zip(items, alignfiles, aligned):
+            timestamps.append(textgrid_to_timestamps(alignfile) if ok else 'Error: Could not align ' + os.path.basename(wavname) + '.')
+            os.remove(wavname)
+            os.remove(trsname)
+            os.remove(alignfile)
+
+        return timestamps
+
+    # Asynchronous versions of 'align' and 'synthesize' (see jobs.py):
+    # submit takes the same fields plus op ('align' or 'synthesize'),
+    # stores the uploads and returns a job id right away.
+    # Each job has its own workspace, as it outlives this request.
+    @cherrypy.expose
+    def submit(self, op=None, wavfile=None, transcript=None, srcwav=None, srctimestamps=None, twav=None, ttimestamps=None, options="prosody,duration", tracker=None, pitchmode=None, pitchblend=None):
+        cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
+
+        if op == 'align':
+            if wavfile == None or transcript == None:
+                return 'Error: Forced alignment needs a transcript.'
+        elif op == 'synthesize':
+            if srcwav == None or twav == None:
+                return 'Error: Synthesis needs both source (srcwav) and target (twav).'
+            elif srctimestamps == None or ttimestamps == None:
+                return 'Error: Synthesis needs both source and target timestamps.'
+            pitch = pitchTransferOptions(pitchmode, pitchblend)
+            if isError(pitch):
+                return pitch
+            tracker = trackerOption(tracker)
+            if isError(tracker):
+                return tracker
+        else:
+            return 'Error: Unknown operation ' + str(op) + '. Try align or synthesize.'
+
+        ws = workspace.Workspace()
+        try:
+            with ws.active():
+                if op == 'align':
+                    (_, wavname) = storeTempWAV(wavfile)
+                    (_, trsname) = storeTempTXT(fieldValue(transcript))
+                else:
+                    (_, srcname) = storeTempWAV(srcwav)
+                    (_, tname)   = storeTempWAV(twav)
+        except Exception:
+            ws.close()
+            raise
+
+        if op == 'align':
+            jobid = jobs.submit(lambda: self.align_files(wavname, trsname), None, ws)
+        else:
+            (srctimestamps, ttimestamps, options) = [fieldValue(f) for f in (srctimestamps, ttimestamps, options)]
+            jobid = jobs.submit(lambda: self.synthesize_files(srcname, srctimestamps, tname, ttimestamps, options, tracker, *pitch), responses.discardResult, ws)
+
+        if jobid is None:
+            return 'Error: Too many jobs. Try again later.'
+        return jobid
+
+    # Status of a submitted job: queued, running, done, or its error if it failed.
+    # With wait (seconds), long-polls until the job finishes or the time is up.
+    @cherrypy.expose
+    def status(self, job=None, wait=0):
+        cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
+
+        try:
+            wait = min(float(wait), constants['JOB_POLL_MAX'])
+        except ValueError:
+            return 'Error: wait must be a number of seconds.'
+
+        # The job itself, as it may be discarded or swept while we wait.
+        j = jobs.wait(job, wait)
+        if j is None:
+            return 'Error: No such job.'
+        elif j.status == 'failed':
+            return j.error
+        return j.status
+
+    # Result of a finished job: the timestamps for align, the WAV for synthesize.
+    # The job is dropped once its result has been fetched.
+    @cherrypy.expose
+    def result(self, job=None):
+        cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
+
+        j = jobs.get(job)
+        if j is None:
+            return 'Error: No such job.'
+        elif j.status == 'failed':
+            jobs.discard(job)
+            return j.error
+        elif j.status != 'done':
+            return 'Error: Job is ' + j.status + '.'
+
+        if j.cleanup is None:
+            jobs.discard(job)
+            return j.result
+
+        # Drop the job once its result has been sent.
+        cherrypy.request.hooks.attach('on_end_request', lambda: jobs.discard(job))
+        return responses.serveResult(j.result)
+
     # General 'synthesize' function.
+    # pitchmode ('zscore' or 'blend') and pitchblend (0-1) pick how pitch is transferred
+    # (see transferPitch); by default, as PITCH_TRANSFER and PITCH_BLEND say.
     @cherrypy.expose
-    def synthesize(self, srcwav=None, srctimestamps=None, twav=None, ttimestamps=None, options="prosody,duration"):
+    def synthesize(self, srcwav=None, srctimestamps=None, twav=None, ttimestamps=None, options="prosody,duration", tracker=None, pitchmode=None, pitchblend=None):
         cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
 
         if isinstance(srcwav, cherrypy._cpreqbody.Entity) and srcwav.file == None:
@@ -524,12 +878,87 @@ class PraatScripts(object):
             ttimestamps = ttimestamps.fullvalue()
         if isinstance(options, cherrypy._cpreqbody.Entity):
             options = options.fullvalue()
+        if isinstance(tracker, cherrypy._cpreqbody.Entity):
+            tracker = tracker.fullvalue()
 
         if srcwav == None or twav == None:
             return 'Error: Synthesis needs both source (srcwav) and target (twav).'
         elif srctimestamps == None or ttimestamps == None:
             return 'Error: Synthesis needs both source and target timestamps.'
+        pitch = pitchTransferOptions(pitchmode, pitchblend)
+        if isError(pitch):
+            return pitch
+        tracker = trackerOption(tracker)
+        if isError(tracker):
+            return tracker
+
+        # Store source and target WAVs to disk
+        (_, srcname) = storeTempWAV(srcwav)
+        (_, tname)   = storeTempWAV(twav)
 
+        synthpath = self.synthesize_files(srcname, srctimestamps, tname, ttimestamps, options, tracker, *pitch)
+        if isError(synthpath):
+            return synthpath
+
+        # Serve file back to client (and remove it)
+        return responses.serveResult(synthpath)
+
+    # Batch version of 'synthesize': takes N (srcwav, srctimestamps, twav, ttimestamps)
+    # items, either as repeated multipart fields (options and tracker may be given once
+    # for all items, or once per item) or as a zip (batch) holding a folder per item with
+    # srcwav.wav, twav.wav, srctimestamps.txt, ttimestamps.txt and optionally options.txt.
+    # Items are synthesized in parallel on the batch processes (see batchpool.py).
+    # Returns a zip, streamed as items finish, with <id>.wav for each item, or <id>.txt holding
+# its error; the id is the item's index, or its folder's name (see batchItemName).
+    @cherrypy.expose
+    def batchsynthesize(self, srcwav=None, srctimestamps=None, twav=None, ttimestamps=None, options="prosody,duration", tracker=None, batch=None):
+        cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
+
+        failed = [] # (item id, error) for items that never got as far as synthesis
+        if batch is not None:
+            items = unpackBatch(batch)
+            if isinstance(items, str):
+                return items
+        else:
+            fields = [asList(f) for f in (srcwav, srctimestamps, twav, ttimestamps)]
+            n = len(fields[0])
+            if n == 0:
+                return 'Error: Batch synthesis needs source (srcwav) and target (twav) items, or a zip (batch).'
+            if any(len(f) != n for f in fields):
+                return 'Error: Batch synthesis needs as many srcwav, srctimestamps, twav and ttimestamps fields.'
+            options = asList(options) if isinstance(options, list) else [options] * n
+            tracker = asList(tracker) if isinstance(tracker, list) else [tracker] * n
+            if len(options) != n or len(tracker) != n:
+                return 'Error: Give options and tracker once, or once per item.'
+            tracker = [trackerOption(t) for t in tracker]
+            for t in tracker:
+                if isError(t):
+                    return t
+            items = []
+            for i in range(n):
+                if not all(isinstance(fields[k][i], cherrypy._cpreqbody.Entity) for k in (0, 2)):
+                    failed.append((i, 'Error: Item ' + str(i) + ' needs srcwav and twav as files.'))
+                    continue
+                (_, srcname) = storeTempWAV(fields[0][i])
+                (_, tname)   = storeTempWAV(fields[2][i])
+                items.append((i, srcname, fieldValue(fields[1][i]), tname, fieldValue(fields[3][i]), fieldValue(options[i]), tracker[i]))
+
+        cherrypy.response.headers['Content-Type'] = 'application/zip'
+        cherrypy.response.headers['Content-Disposition'] = 'attachment; filename="synthesized.zip"'
+
+        def results():
+            for (i, synthpath) in itertools.chain(failed, batchpool.imap_unordered(synthesizeItem, items)):
+                if isError(synthpath):
+                    yield (str(i) + '.txt', synthpath)
+                    continue
+                yield (str(i) + '.wav', responses.readResult(synthpath))
+        return zipStream(results())
+    batchsynthesize._cp_config = {'response.stream': True}
+
+    # Runs 'synthesize' on WAVs already stored to disk, with timestamps and options
+    # as POSTed. Removes both WAVs. Returns the path of the result, the result
+    # itself if it's only in memory (a responses.Audio), or an error string.
+    def synthesize_files(self, srcname, srctimestamps, tname, ttimestamps, options="prosody,duration", tracker=None, pitchmode=None, pitchblend=None):
         prosody = 'prosody' in options
         intensity = 'intensity' in options
         duration = 'duration' in options
@@ -541,40 +970,35 @@ class PraatScripts(object):
         print('Source timestamps: ' + str(srctimestamps))
         print('Target timestamps: ' + str(ttimestamps))
 
-        # Store source and target WAVs to disk
-        (_, srcname) = storeTempWAV(srcwav)
-        (_, tname)   = storeTempWAV(twav)
-
-        # CONVERT TTS AUDIO TO WAV.
-        # * IN the future, we shouldn't have to do this. But Watson returns
-        # * a WAV file that Praat can't read. So we need to convert the audio after-the-fact. (sigh)
-        nname = tname[:-4] + '_.wav'
-        convertAudioToWAV(tname, nname)
-        os.remove(tname)
-        tname = nname
+        if constants['FUSED_SYNTHESIS']:
+            # All tiers at once, one resynthesis (see fused_synthesis; converts the TTS WAV too).
+            synthpath = self.fused_synthesis(srcname, srctimestamps, tname, ttimestamps, prosody, intensity, duration, tracker, pitchmode, pitchblend)
+            if duration:
+                ttimestamps = srctimestamps
+        else:
+            synthpath = convertTTS(tname)
+            if isError(synthpath):
+                os.remove(srcname)
+                return synthpath
 
-        # Synthesis operations
-        synthpath = tname
+            # ! ORDER OF OPERATIONS IS IMPORTANT !
+            # Perform prosodic transfer first (these calls are blocking):
+            if prosody:
+                synthpath = self.praat_prosody(srcname, srctimestamps, synthpath, ttimestamps, 20, tracker, pitchmode, pitchblend)
 
-        # ! ORDER OF OPERATIONS IS IMPORTANT !
-        # Perform prosodic transfer first (these calls are blocking):
-        if prosody:
-            synthpath = self.praat_prosody(srcname, srctimestamps, synthpath, ttimestamps, 20)
+            # Intensity next
+            if intensity:
+                synthpath = self.praat_intensity(srcname, srctimestamps, synthpath, ttimestamps)
 
-        # Intensity next
-        if intensity:
-            synthpath = self.praat_intensity(srcname, srctimestamps, synthpath, ttimestamps)
-
-        # Duration last. Note that duration invalidates timestamp info.
-        if duration:
-            synthpath = self.praat_duration(srctimestamps, synthpath, ttimestamps)
-            ttimestamps = srctimestamps
+            # Duration last. Note that duration invalidates timestamp info.
+            if duration:
+                synthpath = self.praat_duration(srctimestamps, synthpath, ttimestamps)
+                ttimestamps = srctimestamps
 
         # Teardown
         os.remove(srcname)
 
-        # Serve file back to client
-        return serve_file(synthpath, content_type='audio/wav', disposition='attachment')
+        return synthpath
 
     @cherrypy.expose
     def intensitysynthesis(self, srcwav=None, srctimestamps=None, twav=None, ttimestamps=None):
@@ -594,20 +1018,19 @@ class PraatScripts(object):
         (_, srcname) = storeTempWAV(srcwav)
         (_, tname)   = storeTempWAV(twav)
 
-        # CONVERT TTS AUDIO TO WAV.
-        # * IN the future, we shouldn't have to do this. But Watson returns
-        # * a WAV file that Praat can't read. So we need to convert the audio after-the-fact. (sigh)
-        nname = tname[:-4] + '_.wav'
-        convertAudioToWAV(tname, nname)
-        os.remove(tname)
-        tname = nname
+        tname = convertTTS(tname)
+        if isError(tname):
+            os.remove(srcname)
+            return tname
 
-        resynthpath = praat_intensity(srcname, srctimestamps, tname, ttimestamps)
+        resynthpath = self.praat_intensity(srcname, srctimestamps, tname, ttimestamps)
 
         os.remove(srcname)
+        if isError(resynthpath):
+            return resynthpath
 
         # Send back the resynth'd WAV file
-        return serve_file(resynthpath, content_type='audio/wav', disposition='attachment')
+        return responses.serveResult(resynthpath)
 
     # Matches duration of src words to target words in audio file.
     @cherrypy.expose
@@ -627,30 +1050,35 @@ class PraatScripts(object):
         # Store target WAV to disk
         (_, tname)   = storeTempWAV(twav)
 
-        # CONVERT TTS AUDIO TO WAV.
-        # * IN the future, we shouldn't have to do this. But Watson returns
-        # * a WAV file that Praat can't read. So we need to convert the audio after-the-fact. (sigh)
-        nname = tname[:-4] + '_.wav'
-        convertAudioToWAV(tname, nname)
-        os.remove(tname)
-        tname = nname
+        tname = convertTTS(tname)
+        if isError(tname):
+            return tname
 
-        resynthpath = praat_duration(srctimestamps, tname, ttimestamps)
+        resynthpath = self.praat_duration(srctimestamps, tname, ttimestamps)
+        if isError(resynthpath):
+            return resynthpath
 
         # Send back the resynth'd WAV file
-        return serve_file(resynthpath, content_type='audio/wav', disposition='attachment')
+        return responses.serveResult(resynthpath)
 
     # Transfers prosody from original WAV to TTS WAV through Praat.
     # Takes: The two WAV files and their corresponding timestamp data as a paired sequence.
+    # Takes: pitchmode and pitchblend, as for 'synthesize'.
     # Returns: The resynthesized TTS WAV.
     @cherrypy.expose
-    def prosodicsynthesis(self, srcwav=None, srctimestamps=None, twav=None, ttimestamps=None):
+    def prosodicsynthesis(self, srcwav=None, srctimestamps=None, twav=None, ttimestamps=None, tracker=None, pitchmode=None, pitchblend=None):
         cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
 
         if srcwav == None or twav == None:
             return 'Error: Synthesis needs both source (srcwav) and target (twav).'
         elif srctimestamps == None or ttimestamps == None:
             return 'Error: Synthesis needs both source and target timestamps.'
+        pitch = pitchTransferOptions(pitchmode, pitchblend)
+        if isError(pitch):
+            return pitch
+        tracker = trackerOption(tracker)
+        if isError(tracker):
+            return tracker
 
         srctimestamps = stringToTimestamps(srctimestamps)
         ttimestamps = stringToTimestamps(ttimestamps)
@@ -661,175 +1089,40 @@ class PraatScripts(object):
         (_, srcname) = storeTempWAV(srcwav)
         (_, tname)   = storeTempWAV(twav)
 
-        # CONVERT TTS AUDIO TO WAV.
-        # * IN the future, we shouldn't have to do this. But Watson returns
-        # * a WAV file that Praat can't read. So we need to convert the audio after-the-fact. (sigh)
-        nname = tname[:-4] + '_.wav'
-        convertAudioToWAV(tname, nname)
-        os.remove(tname)
-        tname = nname
+        tname = convertTTS(tname)
+        if isError(tname):
+            os.remove(srcname)
+            return tname
 
         # Perform prosody transfer on stored files via Praat scripts
-        resynthpath = praat_prosody(srcname, srctimestamps, tname, ttimestamps)
+        resynthpath = self.praat_prosody(srcname, srctimestamps, tname, ttimestamps, 0, tracker, *pitch)
 
         os.remove(srcname)
+        if isError(resynthpath):
+            return resynthpath
 
         # Send back the resynth'd WAV file
-        return serve_file(resynthpath, content_type='audio/wav', disposition='attachment')
+        return responses.serveResult(resynthpath)
 
     # PRIVATE: PRAAT TRANSFER METHODS
-    def praat_prosody(self, srcname, srctimestamps, tname, ttimestamps, transferThreshold=0):
-
-        # Extract pitch contour from source WAV
-        (_, pitchtierpath) = tempfile.mkstemp()
-        print('Reading pitch tier from src WAV ' + srcname + ' to filepath ' + pitchtierpath)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/extract_pitchtier.praat', srcname, pitchtierpath]
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        pitchtierpath_resp = p.stdout.readline()
-        if not pitchtierpath_resp:
-            return 'Error: Could not read pitch tier filename from stdout.'
-
-        # EXPERIMENTAL: Extract pitch contour from TTS WAV
-        (_, tpitchtierpath) = tempfile.mkstemp()
-        print('Reading pitch tier from TTS WAV ' + tname + ' to filepath ' + tpitchtierpath)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/extract_pitchtier.praat', tname, tpitchtierpath]
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        tpitchtierpath_resp = p.stdout.readline()
-        if not tpitchtierpath_resp:
-            return 'Error: Could not read tts pitch tier filename from stdout.'
-
-        # Read src pitch tier into memory
-        print('Reading from source pitch tier file: ' + pitchtierpath)
-        (X, Y) = praatUtil.readPitchTier(pitchtierpath)
-
-        print('Reading from TTS pitch tier file: ' + tpitchtierpath)
-        (ttsX, ttsY) = praatUtil.readPitchTier(tpitchtierpath)
-
-        def _getTTSPitchAroundPoint(ptX):
-            minX = 10000000
-            minI = 0
-            for i in xrange(len(ttsX)): # Find closest point
-                dist = (ttsX[i] - ptX) * (ttsX[i] - ptX)
-                if dist < minX:
-                    minX = dist
-                    minI = i
-            return ttsY[minI] # lazy but let's see how this fares
-
-        def _getPitchPointsInSegment(bgn, end, A, B):
-            pps = []
-            for i in xrange(len(A)):
-                x = A[i]
-                y = B[i]
-
-                # if i > 0 and A[i-1] < bgn and x >= bgn: # append intersection point w/ bgn
-                #     ratio = (bgn - A[i-1]) / (x - A[i-1])
-                #     pps.append([bgn, ratio * y + (1.0 - ratio) * B[i-1]])
-
-                if x >= bgn and x < end:
-                    pps.append([x, y])
-                elif x >= end:
-                    # if i > 0 and A[i-1] < end: # append intersection point w/ end
-                    #     ratio = (end - A[i-1]) / (x - A[i-1])
-                    #     pps.append([bgn, ratio * y + (1.0 - ratio) * B[i-1]])
-                    break
-            return pps # format [x, y]
-
-        # Transpose pitch points from source to target, according to timestamp data.
-        # -> 1. Loop through all source segments (words).
-        # -> 2. For each segment, get the pitch points contained in it.
-        # -> 3. Translate + scale the pitch points to the corresponding target segment.
-        # -> 4. OPT: Normalize pitch Hz using target's avg pitch, and OPT scale Y using std deviation
-        # -> 5. Write result (tX, tY) into new pitch tier and save
-        #_, nY = normalizeToUnitSquare(X, withoutZeros(Y))
-        (src_mean, src_stdeviation) = computeMeanAndDeviation(withoutZeros(Y))
-        #src_mean *= max(Y) - min(Y)
-        (tgt_mean, tgt_stdeviation) = computeMeanAndDeviation(withoutZeros(ttsY))
-        print('srcmean --------> ' + str(src_mean))
-        print('srcdev --------> ' + str(src_stdeviation))
-        tX = []
-        tY = []
-        for i in range(len(srctimestamps)):
-            srcts = srctimestamps[i]
-            tgtts = ttimestamps[i]
-            bgn = srcts[1]
-            end = srcts[2]
-            if bgn == 0 and end == 0:
-                continue # Skip null timestamps.
-            tbgn = tgtts[1]
-            tend = tgtts[2]
-            lensrc = end - bgn
-            lentgt = tend - tbgn
-            pps = _getPitchPointsInSegment(bgn, end, X, Y)
-
-            if abs(tbgn - tend) < 0.00001:# or len(pps) == 0 or len(tpps) == 0:
-                tpps = _getPitchPointsInSegment(tbgn, tend, ttsX, ttsY)
-                for m in xrange(len(tpps)):
-                    tX.append(tpps[m][0])
-                    tY.append(tpps[m][1])
-                print('(skipping "' + srcts[0] + '")')
-                continue # Skip the prosody transfer for null words
-
-            if transferThreshold != 0:
-                tpps = _getPitchPointsInSegment(tbgn, tend, ttsX, ttsY)
-
-                # print('Calculating difference between prosodic curves for "' + srcts[0] + '"...')
-                if len(tpps) == 0 or len(pps) == 0:
-                    rmse = 0
-                    area = 0
-                else:
-
-                    rmse = math.sqrt(mean_squared_error(toTupleList(pps), toTupleList(tpps), bgn, end, tbgn, tend))
-                    #print('Root mean squared error: ' + str(rmse))
-
-                    #(tpps_mean, _) = computeMeanAndDeviation(normalizeDx(tpps))
-                    #(pps_mean, _) = computeMeanAndDeviation(normalizeDx(pps))
-                    #norm_tpps = mapSubtractY(mapToInterval(toTupleList(tpps), (tbgn, tend), (0, 100)), tpps_mean - 1000)
-                    #norm_pps = mapSubtractY(mapToInterval(toTupleList(pps), (bgn, end), (0, 100)), pps_mean - 1000) # that -1000 ensures all the y's will be > 0 for areaBetween.
-                    #area = areaBetween(norm_pps, norm_tpps)
-
-                # print('Difference between prosodic curves for "' + srcts[0] + '" is ', area)
-                if rmse < transferThreshold:
-                    for m in xrange(len(tpps)):
-                        tX.append(tpps[m][0])
-                        tY.append(tpps[m][1])
-                    print('(skipping "' + srcts[0] + '" with rms ' + str(rmse) + ')')
-                    continue # Skip the prosody transfer for this word b/c it doesn't clear our threshold difference.
-
-            print('Transferring prosody for word "' + srcts[0] + '" with rms ' + str(rmse))
-            for p in pps:
-                if p[1] > src_mean * 2.5: continue # skip outliers
-
-                dx = p[0] - bgn # x = px - dx ... x2 + tdx = tx ... x2 = ttimestamps[i]['t_bgn'] ... tdx = (dx / (end-bgn)) * (tend-tbgn)
-                tdx = (dx / lensrc) * lentgt
-                tp = tbgn + tdx # timestamp transform... ???
-
-                # Find nearest value in TTS wav's pitch contour...
-                #tts_pitch = _getTTSPitchAroundPoint(tp)
-
-                # Pitch renormalization
-                # RESCALE SRC Y BY ST DEVIATION --> rescaled_src_pitch = (src_pitch - src_avgpitch) / src_stdeviation * t_stdeviation
-                # TRANSLATE SRC Y TO NEW MEAN --> rescaled_src_pitch + (t_avgpitch - src_avgpitch)
+    def praat_prosody(self, srcname, srctimestamps, tname, ttimestamps, transferThreshold=0, tracker=None, pitchmode=None, pitchblend=None):
 
-                # renormalize w/ mean + st deviation
-                tv = ((p[1] - src_mean) / src_stdeviation * tgt_stdeviation) + tgt_mean
-
-                # renormalize w/ just mean offset
-                #tv = p[1] / src_mean * tgt_mean
+        tier = self.prosody_tier(srcname, srctimestamps, tname, ttimestamps, transferThreshold, tracker, pitchmode, pitchblend)
+        if tier is None:
+            return 'Error: Could not read pitch tier filename from stdout.'
+        (tX, tY) = tier
 
-                # one-to-one mapping
-                #tv = p[1]
+        if constants['RESYNTH_ENGINE'] == 'native':
+            resynthpath = self.native_resynth(tname, pitch=(tX, tY), contour=self.extractPitchContour(tname, tracker))
+            os.remove(tname)
+            return resynthpath
 
-                tX.append(tp)
-                tY.append(tv)
         tpitchtier = storeTempPitchTier(tX, tY) # will need to figure out xmin and xmax properties ...
 
         # Run Praat resynthesis script.
-        (_, resynthpath) = tempfile.mkstemp()
+        resynthpath = workspace.mkstemp()
         print('Resynthing to tmpfile: ' + resynthpath + ' using tts audio: ' + tname)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/pitch_resynth.praat', tname, tpitchtier, resynthpath] # --> need to write script
-        print('Running Praat with command: ' + ' '.join(cmd))
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        p.wait()
+        resynthpath_resp = praat.run('pitch_resynth.praat', tname, tpitchtier, resynthpath)
 
         '''
         # Convert timestamps to Interval TextGrids and store
@@ -843,175 +1136,115 @@ class PraatScripts(object):
         p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)'''
 
         # Error checking...
-        # Read the filename of the resynthesized file.
-        resynthpath_resp = p.stdout.readline()
+        # Check for the filename of the resynthesized file.
         if not resynthpath_resp:
             return 'Error: Could not read filename from stdout.'
 
         print('Praat response: ' + resynthpath_resp)
 
         # Teardown
-        os.remove(pitchtierpath)
-        os.remove(tpitchtierpath)
         os.remove(tpitchtier)
         os.remove(tname)
 
         return resynthpath;
 
-    def praat_intensity(self, srcname, srctimestamps, tname, ttimestamps):
-
-        # Extract intensity contour from source WAV
-        (_, inttierpath) = tempfile.mkstemp()
-        print('Reading intensity tier from src WAV ' + srcname + ' to filepath ' + inttierpath)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/extract_intensitytier.praat', srcname, inttierpath]
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        p.wait()
-        resp = p.stdout.readline()
-        if not resp:
-            return 'Error: Could not read intensity tier filename from stdout.'
+    # Builds the PitchTier (tX, tY) that transfers the source's pitch contour
+    # onto the target, word by word (pitchmode and pitchblend as for transferPitch).
+    # Returns None if a contour can't be extracted.
+    def prosody_tier(self, srcname, srctimestamps, tname, ttimestamps, transferThreshold=0, tracker=None, pitchmode=None, pitchblend=None):
+
+        # Extract pitch contours from source and TTS WAVs (concurrently)
+        print('Reading pitch tiers from src WAV ' + srcname + ' and TTS WAV ' + tname)
+        plan = Plan()
+        plan.add('src', lambda: self.extractPitchContour(srcname, tracker))
+        plan.add('tts', lambda: self.extractPitchContour(tname, tracker))
+        contours = plan.run(stagepool)
+        if contours['src'] is None or contours['tts'] is None:
+            print('Error: Could not read pitch tiers of ' + srcname + ' and ' + tname)
+            return None
 
-        # Extract intensity contour from target WAV
-        (_, inttierpath_tgt) = tempfile.mkstemp()
-        print('Reading intensity tier from target WAV ' + tname + ' to filepath ' + inttierpath_tgt)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/extract_intensitytier.praat', tname, inttierpath_tgt]
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        p.wait()
-        resp = p.stdout.readline()
-        if not resp:
-            return 'Error: Could not read intensity tier filename from stdout.'
+        return transferPitch(contours['src'][0], contours['src'][1], contours['tts'][0], contours['tts'][1], srctimestamps, ttimestamps, transferThreshold, pitchmode, pitchblend)
 
-        # Read intensity tiers into memory
-        print('Reading from source intensity tier file: ' + inttierpath)
-        (X, Y) = praatUtil.readIntensityTier(inttierpath)
-        print('Reading from target intensity tier file: ' + inttierpath_tgt)
-        (tX, tY) = praatUtil.readIntensityTier(inttierpath_tgt)
-
-        # Calculate avg intensity for each word
-        # Calculate avg intensity for the whole sentence
-        (avgint_src, stdeviation_src) = computeMeanAndDeviation(withoutZeros(Y)) # TODO: Weight points by area...
-        (avgint_tgt, stdeviation_tgt) = computeMeanAndDeviation(withoutZeros(tY)) # TODO: Weight points by area...
-
-        tintmax = max(tY)
-        #aY = []
-        #for i in xrange(len(Y)):
-        #    aY.append(tintmax - Y[i])
-
-        def _getIntPointsInSegment(bgn, end, X, Y):
-            pps = []
-            for i in xrange(len(X)):
-                x = X[i]
-                y = Y[i]
-                if x >= bgn and x < end:
-                    pps.append([x, y])
-            return pps # format [x, y]
-        def _getAvgInt(pps):
-            avg = 0
-            for i in xrange(len(pps)):
-                avg += pps[i][1]
-            return avg / len(pps)
-
-        # Transpose intensity points from source to target, according to timestamp data.
-        # -> 1. Loop through all source segments (words).
-        # -> 2. For each segment, get the intensity points contained in it.
-        # -> 3. Translate + scale the intensity points to the corresponding target segment.
-        # -> 4. // OPT: Normalize intensity target's avg intensity, and OPT scale Y using std deviation
-        # -> 5. Write result (tX, tY) into new intensity tier and save
-        aX = []
-        aY = []
-        for i in range(len(srctimestamps)):
-            srcts = srctimestamps[i]
-            tgtts = ttimestamps[i]
-            bgn = srcts[1]
-            end = srcts[2]
-            if bgn == 0 and end == 0:
-                continue # Skip null timestamps.
-            tbgn = tgtts[1]
-            tend = tgtts[2]
+    def praat_intensity(self, srcname, srctimestamps, tname, ttimestamps):
 
-            # Get part of the intensity contour corresponding to this ts interval
-            pps = _getIntPointsInSegment(bgn, end, X, Y)
-            tpps = _getIntPointsInSegment(tbgn, tend, tX, tY)
-
-            if len(pps) == 0 or len(tpps) == 0:
-                print('Warning @ praat_intensity: skipping word-intensity gap. TODO: fix in future!')
-                continue
-
-
-
-            # DEBUG: Invert contour
-            '''for k in xrange(len(tpps)):
-                tp = tpps[k]
-                tx = tp[0]
-                ty = tintmax - tp[1]
-                aX.append(tx)
-                aY.append(ty)
-            continue'''
-
-            for p in pps:
-                dx = p[0] - bgn
-                tdx = (dx / (end-bgn)) * (tend-tbgn)
-                tp = tbgn + tdx
-                aX.append(tp)
-                aY.append(p[1] / avgint_src * avgint_tgt)
-            continue
-
-            # Calculate average intensity of the word
-            avgint_word = max(_getAvgInt(pps), 0)
-            avgint_word_tgt = max(_getAvgInt(tpps), 0)
-
-            if avgint_word_tgt == 0 or avgint_word == 0:
-                avgint_word = avgint_src
-                avgint_word_tgt = avgint_tgt
-
-            # Compute how the word's intensity differs from the avg
-            intmult_src = avgint_word / avgint_src # e.g., 120% intensity = 1.2
-            intmult_tgt = avgint_word_tgt / avgint_tgt
-
-            # Transfer intensity by scaling src to target
-            # NOTE: This is interval will get _multiplied_ with the target audio. So if
-            # we want no change, all intervals will equal 1. Consider if the src intensity is 20% greater
-            # than avg, and the target intensity is 20% less. Now intmult_src=1.2 and intmult_tgt=0.8.
-            # intmult_src / intmult_tgt would equal 1.5, corresponding to a 50% increase. Conversely,
-            # scaling target 1.2 to src 0.8 corresponds to a 33.3% decrease. Does that make sense?
-            aX.append(tbgn+0.000001)
-            aY.append(avgint_tgt * (intmult_src / intmult_tgt)) # if intensity variations are equal, this will do nothing!
-            aX.append(tend-0.000001)
-            aY.append(avgint_tgt * (intmult_src / intmult_tgt))
+        tier = self.intensity_tier(srcname, srctimestamps, tname, ttimestamps)
+        if tier is None:
+            return 'Error: Could not read intensity tier filename from stdout.'
+        (aX, aY) = tier
 
         tinttier = storeTempIntensityTier(aX, aY) # will need to figure out xmin and xmax properties ...
 
         # Run Praat resynthesis script.
-        (_, resynthpath) = tempfile.mkstemp()
+        resynthpath = workspace.mkstemp()
         print('Resynthing to tmpfile: ' + resynthpath + ' using tts audio: ' + tname)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/intensity_resynth.praat', tname, tinttier, resynthpath] # --> need to write script
-        print('Running Praat with command: ' + ' '.join(cmd))
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        p.wait()
+        resp = praat.run('intensity_resynth.praat', tname, tinttier, resynthpath)
 
         # Error checking...
-        # Read the filename of the resynthesized file.
-        resp = p.stdout.readline()
+        # Check for the filename of the resynthesized file.
         if not resp:
             return 'Error: Could not read filename from stdout.'
 
         print('Praat response: ' + resp)
 
         # Teardown
-        os.remove(inttierpath)
-        os.remove(inttierpath_tgt)
         os.remove(tinttier)
         os.remove(tname)
 
         return resynthpath
 
+    # Builds the IntensityTier (aX, aY) that transfers the source's intensity
+    # contour onto the target. Returns None if a contour can't be extracted.
+    def intensity_tier(self, srcname, srctimestamps, tname, ttimestamps):
+
+        # Extract intensity contours from source and target WAVs (concurrently)
+        print('Reading intensity tiers from src WAV ' + srcname + ' and target WAV ' + tname)
+        plan = Plan()
+        plan.add('src', lambda: self.extractIntensityContour(srcname))
+        plan.add('tgt', lambda: self.extractIntensityContour(tname))
+        contours = plan.run(stagepool)
+        if contours['src'] is None or contours['tgt'] is None:
+            print('Error: Could not read intensity tiers of ' + srcname + ' and ' + tname)
+            return None
+
+        return transferIntensity(contours['src'][0], contours['src'][1], contours['tgt'][0], contours['tgt'][1], srctimestamps, ttimestamps)
+
+
     def praat_duration(self, srctimestamps, tname, ttimestamps):
+        wavdur = ttimestamps[-1][2]
+        durps = self.duration_tier(srctimestamps, ttimestamps)
+
+        if constants['RESYNTH_ENGINE'] == 'native':
+            resynthpath = self.native_resynth(tname, duration=(durps[0::2], durps[1::2]))
+            os.remove(tname)
+            return resynthpath
+
+        tdurtier = storeTempDurTier(wavdur, durps) # Store DurationTier data to disk.
+
+        # Run Praat resynthesis script.
+        resynthpath = workspace.mkstemp()
+        print('Resynthing to tmpfile: ' + resynthpath + ' using tts audio: ' + tname)
+        resynthpath_resp = praat.run('dur_resynth.praat', tname, tdurtier, resynthpath)
+
+        # Error checking...
+        # Check for the filename of the resynthesized file.
+        if not resynthpath_resp:
+            return 'Error: Could not read filename from stdout.'
+
+        print('Praat response: ' + resynthpath_resp)
+
+        # Teardown
+        os.remove(tdurtier)
+        os.remove(tname)
+
+        return resynthpath
+
+    # Returns the DurationTier as a flat list of (time, relative duration) pairs.
+    def duration_tier(self, srctimestamps, ttimestamps):
         # Build duration tier from timestamp data.
         # -> 1. Loop through all source segments (words).
         # -> 2. For each segment, get its duration.
         # -> 3. Add duration points to mark the start and end of each word.
-        # -> 4. Save duration tier to disk.
         durps = []
-        wavdur = ttimestamps[-1][2]
         prev_tbgn = 0
         prev_tend = 0
         prev_bgn = 0
@@ -1049,43 +1282,161 @@ class PraatScripts(object):
             prev_end = end
             prev_tbgn = tbgn
             prev_tend = tend
-        tdurtier = storeTempDurTier(wavdur, durps) # Store DurationTier data to disk.
+        return durps
+
+    # Fused synthesis: builds every requested tier from the original TTS WAV
+    # first, then applies them all in a single Praat job (fused_resynth.praat)
+    # or a single native pass, instead of one resynthesis + WAV round-trip per stage.
+    # Intensity is applied before PSOLA, so all three tiers share the TTS WAV's timeline.
+    # Takes the TTS WAV as uploaded: converting it is one of the stages, which run
+    # as a DAG so that source analysis overlaps the conversion and target analysis.
+    def fused_synthesis(self, srcname, srctimestamps, rawtname, ttimestamps, prosody, intensity, duration, tracker=None, pitchmode=None, pitchblend=None):
+        plan = Plan()
+        plan.add('tts', lambda: convertTTS(rawtname))
+        if prosody:
+            plan.add('src_pitch', lambda: self.extractPitchContour(srcname, tracker))
+            plan.add('tts_pitch', lambda tname: None if isError(tname) else self.extractPitchContour(tname, tracker), 'tts')
+        if intensity:
+            plan.add('src_int', lambda: self.extractIntensityContour(srcname))
+            plan.add('tts_int', lambda tname: None if isError(tname) else self.extractIntensityContour(tname), 'tts')
+        stage = plan.run(stagepool)
+        tname = stage['tts']
+        if isError(tname):
+            return tname
+
+        pitch = inttier = durtier = None
+        if prosody:
+            if stage['src_pitch'] is None or stage['tts_pitch'] is None:
+                return 'Error: Could not read pitch tier filename from stdout.'
+            pitch = transferPitch(stage['src_pitch'][0], stage['src_pitch'][1], stage['tts_pitch'][0], stage['tts_pitch'][1], srctimestamps, ttimestamps, 20, pitchmode, pitchblend)
+        if intensity:
+            if stage['src_int'] is None or stage['tts_int'] is None:
+                return 'Error: Could not read intensity tier filename from stdout.'
+            inttier = transferIntensity(stage['src_int'][0], stage['src_int'][1], stage['tts_int'][0], stage['tts_int'][1], srctimestamps, ttimestamps)
+        if duration:
+            durps = self.duration_tier(srctimestamps, ttimestamps)
+            durtier = (durps[0::2], durps[1::2])
+
+        # Drop empty tiers (e.g. no words had pitch points)
+        (pitch, inttier, durtier) = [t if t is not None and len(t[0]) > 0 else None for t in (pitch, inttier, durtier)]
+        if pitch is None and inttier is None and durtier is None:
+            return tname
+
+        if constants['RESYNTH_ENGINE'] == 'native':
+            resynthpath = self.native_resynth(tname, pitch, durtier, stage.get('tts_pitch'), inttier, inmemory=True)
+            os.remove(tname)
+            return resynthpath
+
+        tierpaths = ['', '', '']
+        if pitch is not None:
+            tierpaths[0] = storeTempPitchTier(*pitch)
+        if inttier is not None:
+            tierpaths[1] = storeTempIntensityTier(*inttier)
+        if durtier is not None:
+            tierpaths[2] = storeTempDurTier(ttimestamps[-1][2], durps)
 
         # Run Praat resynthesis script.
-        (_, resynthpath) = tempfile.mkstemp()
+        resynthpath = workspace.mkstemp()
         print('Resynthing to tmpfile: ' + resynthpath + ' using tts audio: ' + tname)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/dur_resynth.praat', tname, tdurtier, resynthpath] # --> need to write script
-        print('Running Praat with command: ' + ' '.join(cmd))
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        p.wait()
+        resynthpath_resp = praat.run('fused_resynth.praat', tname, tierpaths[0], tierpaths[1], tierpaths[2], resynthpath)
 
         # Error checking...
-        # Read the filename of the resynthesized file.
-        resynthpath_resp = p.stdout.readline()
+        # Check for the filename of the resynthesized file.
         if not resynthpath_resp:
             return 'Error: Could not read filename from stdout.'
 
         print('Praat response: ' + resynthpath_resp)
 
         # Teardown
-        os.remove(tdurtier)
+        for path in tierpaths:
+            if path: os.remove(path)
         os.remove(tname)
 
         return resynthpath
 
-    # Extract pitch contour from WAV
-    def extractPitchContour(self, wavfile):
-        (_, pitchtierpath) = tempfile.mkstemp()
-        print('Extracting pitch tier from WAV file ' + srcname + ' to filepath ' + pitchtierpath)
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/extract_pitchtier.praat', wavfile, pitchtierpath]
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        pitchtierpath_resp = p.stdout.readline()
-        if not pitchtierpath_resp:
-            return 'Error: Could not read pitch tier filename from stdout.'
+    # PSOLA resynthesis of a WAV in-process (see psola.py), in place of
+    # pitch_resynth.praat / dur_resynth.praat. The tiers are (X, Y) arrays
+    # in the WAV's time; contour is its own pitch contour, if we already have it.
+    # An intensity tier, if given, is multiplied in first (as intensity_resynth.praat does).
+    # Returns the path of the resynthesized WAV, or with inmemory, the WAV itself
+    # (a responses.Audio), for results that go straight back to the client, or an error string.
+    def native_resynth(self, wavname, pitch=None, duration=None, contour=None, intensity=None, inmemory=False):
+        sound = analysis.readWAV(wavname)
+        if sound is None:
+            return 'Error: Could not read the target (TTS) audio.'
+        (x, sr) = sound
+        if intensity is not None:
+            x = psola.multiplyIntensity(x, sr, intensity[0], intensity[1])
+        if contour is None:
+            contour = analysis.pitchTier(x, sr)
+        (marks, voiced) = psola.pitchMarks(x, sr, contour[0], contour[1])
+        y = psola.resynthesize(x, sr, marks, voiced, pitch, duration)
+        if inmemory:
+            return responses.Audio(analysis.encodeWAV(y, sr))
+
+        resynthpath = workspace.mkstemp()
+        print('Resynthing to tmpfile: ' + resynthpath + ' using tts audio: ' + wavname + ' (native PSOLA)')
+        analysis.writeWAV(resynthpath, y, sr)
+        return resynthpath
 
-        # Read src pitch tier into memory
-        print('Reading from pitch tier file: ' + pitchtierpath)
-        return praatUtil.readPitchTier(pitchtierpath)
+    # Extract pitch contour from WAV, with Praat or the native tracker in analysis.py
+    # (tracker is 'praat' or 'native'; defaults to constants['PITCH_TRACKER']).
+    # Returns (X, Y) arrays as read by praatUtil.readPitchTier, or None on failure;
+    # raises ValueError for any other tracker.
+    # Tiers are cached by audio content, so repeat requests on the same WAV skip analysis.
+    def extractPitchContour(self, wavfile, tracker=None):
+        tracker = tracker or constants['PITCH_TRACKER']
+        if tracker not in TRACKERS:
+            raise ValueError('Unknown pitch tracker ' + str(tracker) + '. Try praat or native.')
+
+        def extract():
+            if tracker == 'native':
+                tier = analysis.extractPitchTier(wavfile)
+                if tier is not None:
+                    return tier
+                # not a WAV we can decode (e.g. mu-law): Praat may still read it
+
+            pitchtierpath = workspace.mkstemp()
+            print('Extracting pitch tier from WAV file ' + wavfile + ' to filepath ' + pitchtierpath)
+            pitchtierpath_resp = praat.run('extract_pitchtier.praat', wavfile, pitchtierpath)
+            if not pitchtierpath_resp:
+                return None
+
+            # Read pitch tier into memory
+            print('Reading from pitch tier file: ' + pitchtierpath)
+            (X, Y) = praatUtil.readPitchTier(pitchtierpath)
+            os.remove(pitchtierpath)
+            return (X, Y)
+
+        return tiers.fetch(tierKey(wavfile, 'pitch:' + tracker, (0.001, 75, 600)), extract)
+
+    # Extract intensity contour from WAV, with Praat or natively (see analysis.intensityTier).
+    # Returns (X, Y) arrays as read by praatUtil.readIntensityTier, or None on failure.
+    def extractIntensityContour(self, wavfile, tracker=None):
+        tracker = tracker or constants['INTENSITY_TRACKER']
+        if tracker not in TRACKERS:
+            raise ValueError('Unknown intensity tracker ' + str(tracker) + '. Try praat or native.')
+
+        def extract():
+            if tracker == 'native':
+                tier = analysis.extractIntensityTier(wavfile)
+                if tier is not None:
+                    return tier
+                # not a WAV we can decode (e.g. mu-law): Praat may still read it
+
+            inttierpath = workspace.mkstemp()
+            print('Extracting intensity tier from WAV file ' + wavfile + ' to filepath ' + inttierpath)
+            resp = praat.run('extract_intensitytier.praat', wavfile, inttierpath)
+            if not resp:
+                return None
+
+            # Read intensity tier into memory
+            print('Reading from intensity tier file: ' + inttierpath)
+            (X, Y) = praatUtil.readIntensityTier(inttierpath)
+            os.remove(inttierpath)
+            return (X, Y)
+
+        return tiers.fetch(tierKey(wavfile, 'intensity:' + tracker, (100,)), extract)
 
     # Listens for a POST'd WAV file and returns its average pitch,
     # calculated by a Praat subprocess.
@@ -1107,37 +1458,133 @@ class PraatScripts(object):
 
         # Run Praat to analyze avg pitch.
         #return wavfile['filename']
-        cmd = ['praat/Praat.app/Contents/MacOS/Praat', '--run', 'praat/scripts/avg_pitch.praat', filename, '10', '75', '500', '11025']
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        line = praat.run('avg_pitch.praat', filename, '10', '75', '500', '11025')
 
         # Teardown
         os.remove(filename)
 
         # Read result
-        while True:
-            line = p.stdout.readline()
-            if not line:
-                return 'Error: unknown.'
-                break
-            return line
+        if not line:
+            return 'Error: unknown.'
+        return line
+
+'''
+    Batch synthesis: helpers for /batchsynthesize, and the work done in each batch process.
+'''
+
+# Multipart fields come as a single value, or a list when repeated.
+def asList(field):
+    if field is None:
+        return []
+    return field if isinstance(field, list) else [field]
+
+# Text of a form field (multipart values may arrive as parts, not strings).
+def fieldValue(field):
+    if isinstance(field, cherrypy._cpreqbody.Entity):
+        return field.fullvalue()
+    return field
+
+# Unpacks a POSTed zip of batch items (see PraatScripts.batchsynthesize),
+# storing the WAVs to disk. Returns a list of items, or an error string.
+def unpackBatch(batch):
+    try:
+        z = zipfile.ZipFile(batch.file)
+    except Exception, err:
+        return 'Error: Could not open batch zip. ' + str(err)
+    folders = {}
+    for name in z.namelist():
+        (folder, _, field) = name.rpartition('/')
+        if field:
+            folders.setdefault(folder, {})[os.path.splitext(field)[0]] = name
+    items = []
+    taken = set()
+    for folder in sorted(folders):
+        entries = folders[folder]
+        if not all(k in entries for k in ('srcwav', 'srctimestamps', 'twav', 'ttimestamps')):
+            continue # e.g. __MACOSX/
+        srcname = workspace.mkstemp('.wav')
+        tname   = workspace.mkstemp('.wav')
+        for (path, entry) in ((srcname, 'srcwav'), (tname, 'twav')):
+            with open(path, 'wb') as f:
+                f.write(z.read(entries[entry]))
+        options = z.read(entries['options']).strip() if 'options' in entries else "prosody,duration"
+        items.append((batchItemName(folder, len(items), taken), srcname, z.read(entries['srctimestamps']).strip(), tname, z.read(entries['ttimestamps']).strip(), options, None))
+    if not items:
+        return 'Error: Batch zip has no folders with srcwav, srctimestamps, twav and ttimestamps.'
+    return items
+
+# Names a zipped batch item after its folder, for the names of its results in the
+# zip we send back: anything but letters, digits, _ and - becomes _, so no folder
+# can name an entry outside it; an item with no folder name, or with one that
+# another item's already became, gets its index instead (with _ if that's taken too).
+def batchItemName(folder, index, taken):
+    name = re.sub(r'[^A-Za-z0-9_-]', '_', folder)
+    if not name or name in taken:
+        name = str(index)
+        while name in taken:
+            name += '_'
+    taken.add(name)
+    return name
+
+# Synthesizes one batch item (in a batch process), in a workspace of its own.
+# Returns (item id, the resulting WAV as a responses.Audio, or an error string).
+def synthesizeItem(item):
+    (i, srcname, srctimestamps, tname, ttimestamps, options, tracker) = item
+    ws = workspace.Workspace()
+    try:
+        with ws.active():
+            result = PraatScripts().synthesize_files(srcname, srctimestamps, tname, ttimestamps, options, tracker)
+            if not isError(result):
+                result = responses.Audio(responses.readResult(result))
+        return (i, result)
+    except Exception, err:
+        return (i, 'Error: Synthesis failed. ' + str(err))
+    finally:
+        ws.close()
+
+# Sets up a batch process. The processes are forked before the server's Praat pool
+# starts, so each runs its own few Praat workers, stopped when it exits.
+def batchProcessInit():
+    praat.size = constants['BATCH_PRAAT_WORKERS']
+    praat.start()
+    Finalize(praat, praat.stop, exitpriority=10)
+
+# Batch items run here, one process per core by default.
+batchpool = ProcessPool(cherrypy.engine, constants['BATCH_PROCESSES'], batchProcessInit)
+batchpool.subscribe()
 
 ''' Cross-origin reference stuff, to get around Chrome's restrictions on communicating w/ same-host servers. '''
 def CORS():
     cherrypy.response.headers["Access-Control-Allow-Origin"] = "*"
 
-config = {'/': { 'tools.CORS.on': True}}
+# Uploads are spooled to named files in SPOOL_DIR, for storeTempWAV to take over.
+uploads.SpooledPart.spooldir = constants['SPOOL_DIR']
+# Scratch files: a workspace per request (see workspace.py), and a sweep for abandoned ones.
+workspace.Workspace.root = constants['SCRATCH_DIR']
+workspace.Workspace.quota = constants['SCRATCH_QUOTA']
+def sweepScratch():
+    workspace.sweep(constants['SCRATCH_MAX_AGE'])
+    workspace.sweep(constants['SCRATCH_MAX_AGE'], constants['SPOOL_DIR'] or tempfile.gettempdir(), uploads.PREFIX)
+Monitor(cherrypy.engine, sweepScratch, 300, 'ScratchSweep').subscribe()
+
+config = {'/': { 'tools.CORS.on': True,
+                 'tools.workspace.on': True,
+                 'request.body.part_class': uploads.SpooledPart }}
 cherrypy.tools.CORS = cherrypy.Tool('before_finalize', CORS)
+cherrypy.tools.workspace = cherrypy.Tool('on_start_resource', workspace.requestWorkspace)
 
 ## HTTPS + SSL
 cherrypy.server.ssl_module = 'builtin'
 cherrypy.server.ssl_certificate = "ssl/cert.pem"
 cherrypy.server.ssl_private_key = "ssl/privkey.pem"
 
-#cherrypy.quickstart(PraatScripts(), config=config)
-cherrypy.tree.mount(PraatScripts(), "/", config=config)
-cherrypy.tree.mount(AudioCache(), "/db", config=config)
-cherrypy.engine.start()
-cherrypy.engine.block()
+# (Only when run as the server, so tests can import this module.)
+if __name__ == '__main__':
+    #cherrypy.quickstart(PraatScripts(), config=config)
+    cherrypy.tree.mount(PraatScripts(), "/", config=config)
+    cherrypy.tree.mount(AudioCache(), "/db", config=config)
+    cherrypy.engine.start()
+    cherrypy.engine.block()
 
 #ps = PraatScripts()
 #ps.debug()
@@ -7,63 +7,79 @@
         -s start_time    -- start of portion of wavfile to align (in seconds, default 0)
         -e end_time      -- end of portion of wavfile to align (in seconds, defaul to end)
 
-	You can also import this file as a module and use the functions directly.
+	You can also import this file as a module and use the functions directly,
+	or align() for the whole thing. To align many files, load the dictionary once
+	and pass it to each call:
+
+	    lexicon = load_lexicon()
+	    align(wavfile, trsfile, outfile, lexicon)
+
+	or align them all with one run of HCopy and HVite, which then load the
+	models just once:
+
+	    align_batch([(wavfile, trsfile, outfile), ...], lexicon)
+
+	Each alignment works in a temporary directory of its own, so any number
+	can run at once.
 """
 
 import os
 import sys
 import getopt
-import wave
 import re
-
-def prep_wav(orig_wav, out_wav, sr_override, wave_start, wave_end):
-    global sr_models
-
-    if os.path.exists(out_wav) and False :
-        f = wave.open(out_wav, 'r')
-        SR = f.getframerate()
-        f.close()
-        print "Already re-sampled the wav file to " + str(SR)
+import shutil
+import tempfile
+from lexicon import Lexicon
+import resample
+
+# sample rates for which there are acoustic models set up (in the default model
+# directory), otherwise the signal must be resampled to one of these rates.
+SR_MODELS = [8000, 11025, 16000]
+
+def prep_wav(orig_wav, out_wav, sr_override, wave_start, wave_end, sr_models=None):
+    # the rate to align a file of sample rate SR at
+    def model_rate(SR):
+        if (sr_models != None and SR not in sr_models) or (sr_override != None and SR != sr_override):
+            new_sr = 11025
+            if sr_override != None :
+                new_sr = sr_override
+            print "Resampling wav file from " + str(SR) + " to " + str(new_sr) + "..."
+            return new_sr
         return SR
 
-    f = open(out_wav, 'a')
-    f.close()
-
-    f = wave.open(orig_wav, 'r')
-    SR = f.getframerate()
-    f.close()
-
-    soxopts = ""
-    if float(wave_start) != 0.0 or wave_end != None :
-    	soxopts += " trim " + wave_start
-    	if wave_end != None :
-    		soxopts += " " + str(float(wave_end)-float(wave_start))
-
-    if (sr_models != None and SR not in sr_models) or (sr_override != None and SR != sr_override) or soxopts != "":
-    	new_sr = 11025
-    	if sr_override != None :
-    		new_sr = sr_override
-
-        print "Resampling wav file from " + str(SR) + " to " + str(new_sr) + soxopts + "..."
-        SR = new_sr
-        os.system("sox " + orig_wav + " -r " + str(SR) + " " + out_wav + " rate" + soxopts)
-    else:
-        #print "Using wav file, already at sampling rate " + str(SR) + "."
-        os.system("cp -f " + orig_wav + " " + out_wav)
+    # resampled and/or trimmed in-process; otherwise linked, as it is
+    return resample.prepare(orig_wav, out_wav, model_rate, float(wave_start), None if wave_end == None else float(wave_end))
 
-    return SR
 
+# Writes the MLF for a transcript and, if dictfile is given, the dictionary for HVite
+# there: just the pronunciations of the words in the MLF (see prep_dict).
+def prep_mlf(trsfile, mlffile, word_dictionary, surround, between, dictfile = None):
+    words = transcript_words(trsfile, word_dictionary, surround, between)
+    writeInputMLF(mlffile, words)
+    if dictfile != None:
+        prep_dict(words, word_dictionary, dictfile)
+
+# HVite parses the whole dictionary it's given, so rather than the full one
+# (127k words) it gets one with only the words it needs, looked up in the
+# Lexicon: those given, plus sp and sil. Sorted, as HTK dictionaries are.
+def prep_dict(words, lexicon, dictfile):
+    if not isinstance(lexicon, Lexicon):
+        lexicon = Lexicon(lexicon)
+    fw = open(dictfile, 'wb')
+    for wrd in sorted(set(words) | set(["sp", "sil"])):
+        for line in lexicon.pronunciations(wrd):
+            fw.write(line + b'\n')
+    fw.close()
 
-def prep_mlf(trsfile, mlffile, word_dictionary, surround, between):
-	# Read in the dictionary to ensure all of the words
+# The words of a transcript, as they go in the MLF.
+def transcript_words(trsfile, word_dictionary, surround, between):
+	# Check the dictionary to ensure all of the words
 	# we put in the MLF file are in the dictionary. Words
 	# that are not are skipped with a warning.
-    f = open(word_dictionary, 'r')
-    dict = { } # build hash table
-    for line in f.readlines():
-    	if line != "\n" and line != "" :
-	        dict[line.split()[0]] = True
-    f.close()
+	# (word_dictionary is a Lexicon, or the path of a dictionary to load.)
+    dict = word_dictionary
+    if not isinstance(dict, Lexicon):
+        dict = Lexicon(word_dictionary)
 
     f = open(trsfile, 'r')
     lines = f.readlines()
@@ -112,15 +128,21 @@ def prep_mlf(trsfile, mlffile, word_dictionary, surround, between):
     if surround != None:
         words += surround.split(',')
 
-    writeInputMLF(mlffile, words)
+    return words
 
 def writeInputMLF(mlffile, words) :
+    writeInputMLFs(mlffile, [('tmp', words)]) # labels tmp.plp, wherever it is (see prep_scp)
+
+# One MLF for many utterances: entries are (label, words), where the
+# label is the name of the utterance's PLP file without extension.
+def writeInputMLFs(mlffile, entries) :
     fw = open(mlffile, 'w')
     fw.write('#!MLF!#\n')
-    fw.write('"*/tmp.lab"\n')
-    for wrd in words:
-        fw.write(wrd + '\n')
-    fw.write('.\n')
+    for (label, words) in entries:
+        fw.write('"*/' + label + '.lab"\n')
+        for wrd in words:
+            fw.write(wrd + '\n')
+        fw.write('.\n')
     fw.close()
 
 
@@ -137,9 +159,29 @@ def readAlignedMLF(mlffile, SR, wave_start):
 	if len(lines) < 3 :
 		raise ValueError("Alignment did not complete succesfully.")
 
-	j = 2
+	return parseAlignment(lines, 2, SR, wave_start)[0]
+
+# As readAlignedMLF, for an MLF with many utterances. Returns a dict
+# of their word alignments, by label (see writeInputMLFs).
+def readAlignedMLFs(mlffile, SR, wave_start):
+	f = open(mlffile, 'r')
+	lines = [l.rstrip() for l in f.readlines()]
+	f.close()
+
+	ret = {}
+	j = 1
+	while j < len(lines):
+		if lines[j].startswith('"'):
+			label = os.path.splitext(os.path.basename(lines[j].strip('"')))[0]
+			(ret[label], j) = parseAlignment(lines, j + 1, SR, wave_start)
+		j += 1
+	return ret
+
+# Reads one utterance's alignment from an output MLF's lines, starting at line j.
+# Returns the word alignments (see readAlignedMLF) and the index of its closing '.'.
+def parseAlignment(lines, j, SR, wave_start):
 	ret = []
-	while (lines[j] <> '.'):
+	while (j < len(lines) and lines[j] <> '.'):
 		if (len(lines[j].split()) == 5): # Is this the start of a word; do we have a word label?
 			# Make a new word list in ret and put the word label at the beginning
 			wrd = lines[j].split()[4]
@@ -158,7 +200,7 @@ def readAlignedMLF(mlffile, SR, wave_start):
 
 		j += 1
 
-	return ret
+	return (ret, j)
 
 def writeTextGrid(outfile, word_alignments) :
 	# make the list of just phone alignments
@@ -213,23 +255,157 @@ def writeTextGrid(outfile, word_alignments) :
 
 	fw.close()
 
-def prep_working_directory() :
-	os.system("rm -r -f ./tmp")
-	os.system("mkdir ./tmp")
+# Makes a new, empty working directory (in parent, default the system temp dir)
+# and returns its path.
+def prep_working_directory(parent = None) :
+	return tempfile.mkdtemp(prefix = "p2fa-", dir = parent)
 
-def prep_scp(wavfile) :
-    fw = open('./tmp/codetr.scp', 'w')
-    fw.write(wavfile + ' ./tmp/tmp.plp\n')
+def prep_scp(wavfile, workdir) :
+    prep_scps([(wavfile, 'tmp')], workdir)
+
+# Script files for HCopy and HVite listing many utterances: entries are
+# (wavfile, label), and each utterance's features go in workdir/label.plp.
+def prep_scps(entries, workdir) :
+    fw = open(workdir + '/codetr.scp', 'w')
+    for (wavfile, label) in entries:
+        fw.write(wavfile + ' ' + workdir + '/' + label + '.plp\n')
     fw.close()
-    fw = open('./tmp/test.scp', 'w')
-    fw.write('./tmp/tmp.plp\n')
+    fw = open(workdir + '/test.scp', 'w')
+    for (wavfile, label) in entries:
+        fw.write(workdir + '/' + label + '.plp\n')
     fw.close()
 
-def create_plp(hcopy_config) :
-	os.system('HCopy -T 1 -C ' + hcopy_config + ' -S ./tmp/codetr.scp')
+def create_plp(hcopy_config, workdir) :
+	os.system('HCopy -T 1 -C ' + hcopy_config + ' -S ' + workdir + '/codetr.scp')
+
+def viterbi(input_mlf, word_dictionary, output_mlf, phoneset, hmmdir, workdir) :
+	os.system('HVite -T 1 -a -m -I ' + input_mlf + ' -H ' + hmmdir + '/macros -H ' + hmmdir + '/hmmdefs  -S ' + workdir + '/test.scp -i ' + output_mlf + ' -p 0.0 -s 5.0 ' + word_dictionary + ' ' + phoneset + ' > ' + workdir + '/aligned.results')
+
+# Loads the pronunciation dictionary of a model directory (default: ./model next
+# to this file), plus dict.local if there is one, for align() to share.
+def load_lexicon(mypath = None, local = "dict.local") :
+	if mypath == None :
+		mypath = default_model()
+	return Lexicon(mypath + "/dict", local)
+
+def default_model() :
+	return os.path.dirname(os.path.abspath(__file__)) + "/model"
 
-def viterbi(input_mlf, word_dictionary, output_mlf, phoneset, hmmdir) :
-	os.system('HVite -T 1 -a -m -I ' + input_mlf + ' -H ' + hmmdir + '/macros -H ' + hmmdir + '/hmmdefs  -S ./tmp/test.scp -i ' + output_mlf + ' -p 0.0 -s 5.0 ' + word_dictionary + ' ' + phoneset + ' > ./tmp/aligned.results')
+# Aligns a wav file with its transcript and writes the alignment as a Praat TextGrid
+# to outfile. lexicon is the model's dictionary (see load_lexicon), loaded here if not given.
+# The intermediate files go in a new directory under tmpdir (default the system temp
+# dir), removed afterwards.
+def align(wavfile, trsfile, outfile, lexicon = None, sr_override = None, wave_start = "0.0", wave_end = None, mypath = None, surround_token = "sp", between_token = "sp", tmpdir = None) :
+	(mypath, hmmsubdir, sr_models) = model_dirs(mypath, sr_override)
+
+	if lexicon == None :
+		lexicon = load_lexicon(mypath)
+
+	# create working directory
+	workdir = prep_working_directory(tmpdir)
+	try:
+		word_dictionary = workdir + '/dict'
+		input_mlf = workdir + '/tmp.mlf'
+		output_mlf = workdir + '/aligned.mlf'
+
+		#prepare wavefile: do a resampling if necessary
+		tmpwav = workdir + "/sound.wav"
+		SR = prep_wav(wavfile, tmpwav, sr_override, wave_start, wave_end, sr_models)
+
+		if hmmsubdir == "FROM-SR" :
+			hmmsubdir = "/" + str(SR)
+
+		#prepare mlfile, and the dictionary of its words
+		prep_mlf(trsfile, input_mlf, lexicon, surround_token, between_token, word_dictionary)
+
+		#prepare scp files
+		prep_scp(tmpwav, workdir)
+
+		# generate the plp file using a given configuration file for HCopy
+		create_plp(mypath + hmmsubdir + '/config', workdir)
+
+		# run Verterbi decoding
+		#print "Running HVite..."
+		mpfile = mypath + '/monophones'
+		if not os.path.exists(mpfile) :
+			mpfile = mypath + '/hmmnames'
+		viterbi(input_mlf, word_dictionary, output_mlf, mpfile, mypath + hmmsubdir, workdir)
+
+		# output the alignment as a Praat TextGrid
+		writeTextGrid(outfile, readAlignedMLF(output_mlf, SR, float(wave_start)))
+	finally:
+		shutil.rmtree(workdir, True)
+
+# Aligns many wav files with their transcripts, writing each alignment to a
+# TextGrid as align() does. items are (wavfile, trsfile, outfile). HCopy and
+# HVite run once for all of them (once per sample rate, if they differ), so
+# the models are loaded once rather than per file.
+# Returns, for each item, whether it was aligned (and its TextGrid written).
+def align_batch(items, lexicon = None, sr_override = None, mypath = None, surround_token = "sp", between_token = "sp", tmpdir = None) :
+	(mypath, hmmsubdir, sr_models) = model_dirs(mypath, sr_override)
+
+	if lexicon == None :
+		lexicon = load_lexicon(mypath)
+
+	aligned = [False] * len(items)
+	workdir = prep_working_directory(tmpdir)
+	try:
+		# prepare the wavefiles, grouped by the rate of the model they need;
+		# one that can't be read is left unaligned, and the rest go ahead
+		groups = {}
+		for i in range(len(items)) :
+			label = "utt" + str(i)
+			try :
+				SR = prep_wav(items[i][0], workdir + "/" + label + ".wav", sr_override, "0.0", None, sr_models)
+			except Exception, err :
+				print "Could not prepare " + items[i][0] + " for alignment: " + str(err)
+				continue
+			groups.setdefault(SR, []).append(i)
+
+		mpfile = mypath + '/monophones'
+		if not os.path.exists(mpfile) :
+			mpfile = mypath + '/hmmnames'
+
+		for SR in groups :
+			hmmdir = mypath + ("/" + str(SR) if hmmsubdir == "FROM-SR" else hmmsubdir)
+			srdir = workdir + "/" + str(SR)
+			os.mkdir(srdir)
+			labels = ["utt" + str(i) for i in groups[SR]]
+
+			entries = [(label, transcript_words(items[i][1], lexicon, surround_token, between_token)) for (i, label) in zip(groups[SR], labels)]
+			writeInputMLFs(srdir + '/tmp.mlf', entries)
+			prep_dict([wrd for (_, words) in entries for wrd in words], lexicon, srdir + '/dict')
+			prep_scps([(workdir + "/" + label + ".wav", label) for label in labels], srdir)
+			create_plp(hmmdir + '/config', srdir)
+			viterbi(srdir + '/tmp.mlf', srdir + '/dict', srdir + '/aligned.mlf', mpfile, hmmdir, srdir)
+
+			# split the alignments back up; HVite leaves out utterances it couldn't align
+			if not os.path.exists(srdir + '/aligned.mlf') :
+				continue
+			alignments = readAlignedMLFs(srdir + '/aligned.mlf', SR, 0.0)
+			for (i, label) in zip(groups[SR], labels) :
+				words = alignments.get(label, [])
+				if [w for w in words if len(w) > 1] :
+					writeTextGrid(items[i][2], words)
+					aligned[i] = True
+	finally:
+		shutil.rmtree(workdir, True)
+	return aligned
+
+# The model directory (default: ./model next to this file), the subdirectory of its
+# HMMs (or "FROM-SR" to pick one by sample rate) and the sample rates there are models for.
+def model_dirs(mypath, sr_override) :
+	hmmsubdir = ""
+	sr_models = None
+	if mypath == None :
+		mypath = default_model()
+		hmmsubdir = "FROM-SR"
+		sr_models = SR_MODELS
+
+	if sr_override != None and sr_models != None and not sr_override in sr_models :
+		raise ValueError, "invalid sample rate: not an acoustic model available"
+
+	return (mypath, hmmsubdir, sr_models)
 
 def getopt2(name, opts, default = None) :
 	value = [v for n,v in opts if n==name]
@@ -266,54 +442,4 @@ if __name__ == '__main__':
 		print value
 		sys.exit(0)
 
-	# If no model directory was said explicitly, get directory containing this script.
-	hmmsubdir = ""
-	sr_models = None
-	if mypath == None :
-		mypath = os.path.dirname(os.path.abspath(sys.argv[0])) + "/model"
-		hmmsubdir = "FROM-SR"
-		# sample rates for which there are acoustic models set up, otherwise
-		# the signal must be resampled to one of these rates.
-		sr_models = [8000, 11025, 16000]
-
-	if sr_override != None and sr_models != None and not sr_override in sr_models :
-		raise ValueError, "invalid sample rate: not an acoustic model available"
-
-	word_dictionary = "./tmp/dict"
-	input_mlf = './tmp/tmp.mlf'
-	output_mlf = './tmp/aligned.mlf'
-
-	# create working directory
-	prep_working_directory()
-
-	# create ./tmp/dict by concatening our dict with a local one
-	if os.path.exists("dict.local"):
-		os.system("cat " + mypath + "/dict dict.local > " + word_dictionary)
-	else:
-		os.system("cat " + mypath + "/dict > " + word_dictionary)
-
-	#prepare wavefile: do a resampling if necessary
-	tmpwav = "./tmp/sound.wav"
-	SR = prep_wav(wavfile, tmpwav, sr_override, wave_start, wave_end)
-
-	if hmmsubdir == "FROM-SR" :
-		hmmsubdir = "/" + str(SR)
-
-	#prepare mlfile
-	prep_mlf(trsfile, input_mlf, word_dictionary, surround_token, between_token)
-
-	#prepare scp files
-	prep_scp(tmpwav)
-
-	# generate the plp file using a given configuration file for HCopy
-	create_plp(mypath + hmmsubdir + '/config')
-
-	# run Verterbi decoding
-	#print "Running HVite..."
-	mpfile = mypath + '/monophones'
-	if not os.path.exists(mpfile) :
-		mpfile = mypath + '/hmmnames'
-	viterbi(input_mlf, word_dictionary, output_mlf, mpfile, mypath + hmmsubdir)
-
-	# output the alignment as a Praat TextGrid
-	writeTextGrid(outfile, readAlignedMLF(output_mlf, SR, float(wave_start)))
+	align(wavfile, trsfile, outfile, None, sr_override, wave_start, wave_end, mypath, surround_token, between_token)
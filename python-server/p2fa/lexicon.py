@@ -0,0 +1,127 @@
+""" The pronunciation dictionary, loaded once and shared.
+
+    model/dict has 127k lines (3.4 MB). Rather than reading it into a Python
+    dict for every alignment, a Lexicon memory-maps the file along with a
+    sorted index of its lines (an array of line offsets, ordered by word),
+    saved next to the temp files and reused while the dictionary is unchanged.
+    Lookups are binary searches over the index. Both maps are plain files in
+    the page cache, so processes that load the same dictionary (or are forked
+    after loading it) share one copy:
+
+        lex = Lexicon('model/dict', 'dict.local')
+        'HELLO' in lex           # True
+        lex.pronunciations('A')  # ['A  AH0', 'A  EY1']
+
+    HVite gets a dictionary of just the words it needs, written from these
+    lookups (see align.prep_dict).
+
+    dict.local, if given, is small and simply read into memory; its
+    entries are added to those of the main dictionary.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+
+ENTRY = struct.Struct('<I') # one line offset in the index
+
+class Lexicon(object):
+
+    def __init__(self, path, local=None, indexdir=None):
+        self.main = path
+        self.indexdir = indexdir or tempfile.gettempdir()
+        with open(path, 'rb') as f:
+            self.text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index = self._loadIndex()
+        self.size = len(self.index) // ENTRY.size
+
+        self.local = {}
+        if local is not None and os.path.exists(local):
+            with open(local, 'rb') as f:
+                localtext = f.read()
+            for line in localtext.splitlines():
+                if line.strip():
+                    self.local.setdefault(line.split()[0], []).append(line.rstrip())
+
+    def __contains__(self, word):
+        word = _bytes(word)
+        if word in self.local:
+            return True
+        i = self._lowerBound(word)
+        return i < self.size and self._word(self._offset(i)) == word
+
+    def __len__(self):
+        return self.size + sum(len(v) for v in self.local.values())
+
+    # The dictionary lines for a word (main dictionary first), as in the file.
+    def pronunciations(self, word):
+        word = _bytes(word)
+        lines = []
+        i = self._lowerBound(word)
+        while i < self.size:
+            o = self._offset(i)
+            if self._word(o) != word:
+                break
+            lines.append(self._line(o))
+            i += 1
+        return lines + self.local.get(word, [])
+
+    def close(self):
+        self.index.close()
+        self.text.close()
+
+    def _offset(self, i):
+        return ENTRY.unpack_from(self.index, i * ENTRY.size)[0]
+
+    def _line(self, o):
+        end = self.text.find(b'\n', o)
+        return self.text[o:end if end >= 0 else len(self.text)].rstrip()
+
+    def _word(self, o):
+        return self._line(o).split(None, 1)[0]
+
+    # First index position whose word is >= word.
+    def _lowerBound(self, word):
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word(self._offset(mid)) < word:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # Maps the index for this version of the dictionary, building it first if need be.
+    def _loadIndex(self):
+        st = os.stat(self.main)
+        self.key = hashlib.sha1(('%s:%d:%d' % (os.path.abspath(self.main), st.st_size, int(st.st_mtime))).encode('utf-8')).hexdigest()
+        path = os.path.join(self.indexdir, 'p2fa-dict-' + self.key + '.idx')
+        if not os.path.exists(path):
+            self._buildIndex(path)
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # Sorts the offsets of the non-blank lines by word (stably, so a word's
+    # pronunciations keep their order) and writes them out, atomically.
+    def _buildIndex(self, path):
+        entries = []
+        o = 0
+        n = len(self.text)
+        while o < n:
+            end = self.text.find(b'\n', o)
+            if end < 0:
+                end = n
+            line = self.text[o:end]
+            if line.strip():
+                entries.append((line.split(None, 1)[0], o))
+            o = end + 1
+        entries.sort(key=lambda e: e[0])
+        (fd, tmp) = tempfile.mkstemp(dir=self.indexdir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b''.join(ENTRY.pack(o) for (_, o) in entries))
+        os.rename(tmp, path)
+
+def _bytes(word):
+    return word if isinstance(word, bytes) else word.encode('utf-8')
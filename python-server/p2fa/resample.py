@@ -0,0 +1,115 @@
+""" Resampling and trimming of WAV files for HCopy, in NumPy.
+
+    prep_wav used to run sox for every file that wasn't already at a model's
+    sample rate (or had to be trimmed), and cp for every one that was.
+    prepare() does both in-process, reading the header once:
+
+        SR = prepare('in.wav', 'out.wav', lambda sr: 11025)          # resample
+        SR = prepare('in.wav', 'out.wav', lambda sr: sr, 1.5, 3.0)   # trim only
+        SR = prepare('in.wav', 'out.wav', lambda sr: sr)             # hard link
+
+    Resampling is polyphase: for a rate change of up/down (in lowest terms),
+    each output sample is a windowed-sinc interpolation of the input, using
+    one of `up` precomputed filters. Output is 16-bit PCM, as HTK reads it.
+"""
+
+import math
+import os
+import shutil
+import wave
+import numpy
+
+ZEROS = 16      # zero crossings of the sinc on each side of the (low-pass) filter
+ROLLOFF = 0.945 # cutoff, as a fraction of the lower rate's Nyquist frequency
+BETA = 8.6      # Kaiser window shape
+BLOCK = 4096    # output samples computed per vectorized step
+
+# Writes orig_wav to out_wav at the sample rate rate(its own rate) picks,
+# cut to start..end (in seconds; end None = to the end). When there's nothing
+# to change, out_wav is a hard link to orig_wav (or a copy, across filesystems).
+# < Returns the sample rate of out_wav.
+def prepare(orig_wav, out_wav, rate, start = 0.0, end = None):
+    f = wave.open(orig_wav, 'rb')
+    try:
+        sr = f.getframerate()
+        new_sr = rate(sr)
+        if new_sr == sr and float(start) == 0.0 and end == None:
+            link(orig_wav, out_wav)
+            return sr
+        nchannels = f.getnchannels()
+        width = f.getsampwidth()
+        first = int(round(float(start) * sr))
+        f.setpos(min(first, f.getnframes()))
+        count = f.getnframes() - first if end == None else int(round(float(end) * sr)) - first
+        data = f.readframes(max(count, 0))
+    finally:
+        f.close()
+
+    x = decode(data, width, nchannels)
+    y = numpy.column_stack([resample(x[:, c], sr, new_sr) for c in range(nchannels)])
+    write(out_wav, y, new_sr)
+    return new_sr
+
+def link(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+# Little-endian PCM bytes as floats in [-1, 1], one column per channel.
+def decode(data, width, nchannels):
+    if width == 1: # 8-bit WAV is unsigned
+        x = (numpy.frombuffer(data, numpy.uint8).astype(numpy.float64) - 128.0) / 128.0
+    elif width == 3: # no 24-bit dtype; sign-extend into int32
+        b = numpy.frombuffer(data, numpy.uint8).reshape(-1, 3).astype(numpy.int32)
+        x = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8) / float(1 << 23)
+    else:
+        x = numpy.frombuffer(data, {2: '<i2', 4: '<i4'}[width]).astype(numpy.float64) / float(1 << (8 * width - 1))
+    return x[:len(x) - len(x) % nchannels].reshape(-1, nchannels)
+
+def write(filename, x, sr):
+    pcm = numpy.round(numpy.clip(x, -1.0, 1.0) * 32767.0).astype('<i2')
+    f = wave.open(filename, 'wb')
+    try:
+        f.setnchannels(x.shape[1])
+        f.setsampwidth(2)
+        f.setframerate(int(sr))
+        f.writeframes(pcm.tobytes())
+    finally:
+        f.close()
+
+# Resamples a signal from sr to new_sr (both whole numbers of Hz).
+def resample(x, sr, new_sr):
+    g = gcd(sr, new_sr)
+    (up, down) = (new_sr // g, sr // g)
+    if up == down:
+        return x
+    (h, half) = filters(up, down)
+
+    # output n sits at input position n*down/up = base + phase/up, and is
+    # the sum of x[base + k] * h[phase][k], k = -half+1 .. half
+    nout = (len(x) * up + down - 1) // down
+    xpad = numpy.concatenate((numpy.zeros(half), x, numpy.zeros(half + 1)))
+    taps = numpy.arange(-half + 1, half + 1) + half
+    y = numpy.empty(nout)
+    for b in range(0, nout, BLOCK):
+        n = numpy.arange(b, min(b + BLOCK, nout))
+        (base, phase) = divmod(n * down, up)
+        y[b:b + len(n)] = (xpad[base[:, None] + taps] * h[phase]).sum(axis=1)
+    return y
+
+# The polyphase filter bank for resampling by up/down: one row per phase,
+# taps -half+1 .. half (in input samples) around the output's position.
+def filters(up, down):
+    cutoff = ROLLOFF * min(1.0, float(up) / down) # of the input's Nyquist frequency
+    half = int(math.ceil(ZEROS / cutoff))
+    d = numpy.arange(up)[:, None] / float(up) - numpy.arange(-half + 1, half + 1)[None, :]
+    window = numpy.i0(BETA * numpy.sqrt(numpy.clip(1.0 - (d / half) ** 2, 0.0, 1.0))) / numpy.i0(BETA)
+    return (cutoff * numpy.sinc(cutoff * d) * window, half)
+
+def gcd(a, b):
+    while b:
+        (a, b) = (b, a % b)
+    return a
@@ -0,0 +1,228 @@
+'''
+    Pool of resident Praat processes.
+
+    Starting Praat costs more than most of our scripts do, so instead of
+    one `Praat --run` per operation we keep a few Praat processes alive.
+    Each runs praat/scripts/worker.praat in a directory of its own: it
+    polls for a job file there, runs the requested script through
+    runScript, and writes the Info window back to a reply file.
+
+    Jobs and replies are plain files, as Praat's readFile$ sizes a file by
+    seeking (so it can't read pipes). A job is written to job.tmp and
+    renamed to job, so the worker never sees half of one; a reply ends
+    with EOT, so we never take half of one.
+
+    The pool is a CherryPy engine plugin: workers are spawned when the
+    engine starts and shut down when it stops. Workers are recycled after
+    a fixed number of jobs and respawned if they crash or stop answering.
+    tests/test_praatpool.py runs the worker on a real Praat, where there is one.
+'''
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from cherrypy._cpcompat import ntob, tonative
+from cherrypy.process.plugins import SimplePlugin
+
+PRAAT = 'praat/Praat.app/Contents/MacOS/Praat'
+SCRIPTS = 'praat/scripts'
+EOT = '%%end%%\n' # written by worker.praat after each reply
+MAXARGS = 5       # arguments worker.praat can pass on to a script
+STOPPED = None    # put on the idle queue when the pool stops, to wake callers waiting on it
+
+class PraatError(Exception):
+    pass
+
+# Returns the absolute path of a script in praat/scripts.
+# (runScript resolves relative paths against the worker script, not our cwd.)
+def scriptPath(script):
+    return os.path.abspath(os.path.join(SCRIPTS, script))
+
+# Runs a script in a fresh Praat process and returns what it printed.
+def runOnce(script, args, praat=PRAAT):
+    cmd = [praat, '--run', scriptPath(script)] + [str(a) for a in args]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+    (out, _) = p.communicate()
+    return tonative(out)
+
+class PraatWorker(object):
+
+    def __init__(self, praat=PRAAT, timeout=60):
+        self.praat = praat
+        self.timeout = timeout
+        self.jobs = 0
+
+        self.dir = tempfile.mkdtemp(prefix='praatworker')
+        self.jobfile = os.path.join(self.dir, 'job')
+        self.replyfile = os.path.join(self.dir, 'reply')
+
+        cmd = [praat, '--run', scriptPath('worker.praat'), self.dir]
+        with open(os.devnull, 'wb') as devnull:
+            self.proc = subprocess.Popen(cmd, stdout=devnull, stderr=devnull)
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    # Runs one script and returns the contents of Praat's Info window.
+    # > Raises PraatError if the worker dies or times out.
+    def run(self, script, *args):
+        self._send(''.join(line + '\n' for line in [scriptPath(script)] + [str(a) for a in args]))
+        resp = self._receive()
+        self.jobs += 1
+        return resp
+
+    def ping(self):
+        try:
+            self._send('ping\n')
+            return self._receive() == 'pong\n'
+        except PraatError:
+            return False
+
+    def _send(self, job):
+        if not self.alive():
+            raise PraatError('Praat worker exited with code ' + str(self.proc.returncode) + '.')
+        with open(self.jobfile + '.tmp', 'wb') as f:
+            f.write(ntob(job, 'utf-8'))
+        os.rename(self.jobfile + '.tmp', self.jobfile)
+
+    # Waits for the reply to the job just sent (complete once it ends with
+    # EOT, as Praat may be part way through writing it) and removes it.
+    def _receive(self):
+        deadline = time.time() + self.timeout
+        delay = 0.001
+        eot = ntob(EOT)
+        while True:
+            resp = self._read(self.replyfile)
+            if resp is not None and resp.endswith(eot):
+                os.remove(self.replyfile)
+                return tonative(resp[:-len(eot)], 'utf-8')
+            if not self.alive():
+                raise PraatError('Praat worker exited with code ' + str(self.proc.returncode) + ' while running a job.')
+            if time.time() > deadline:
+                raise PraatError('Timed out waiting for Praat worker to reply.')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.02)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None # not there yet
+
+    def stop(self):
+        if self.alive():
+            try:
+                self._send('quit\n')
+            except PraatError:
+                pass
+            deadline = time.time() + 2
+            while self.alive() and time.time() < deadline:
+                time.sleep(0.01)
+            if self.alive():
+                self.proc.kill()
+                self.proc.wait()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+class PraatPool(SimplePlugin):
+
+    def __init__(self, bus, size=2, maxjobs=200, timeout=60, praat=PRAAT):
+        SimplePlugin.__init__(self, bus)
+        self.size = size
+        self.maxjobs = maxjobs
+        self.timeout = timeout
+        self.praat = praat
+        self.idle = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.size <= 0:
+            self.bus.log('Praat pool disabled; running one Praat process per job.')
+            return
+        for i in range(self.size):
+            self.idle.put(self._spawn())
+        self.bus.log('Started ' + str(self.size) + ' Praat workers.')
+
+    def stop(self):
+        with self.lock:
+            workers = self.workers
+            self.workers = []
+            idle = self.idle
+            self.idle = queue.Queue()
+        idle.put(STOPPED)
+        for w in workers:
+            w.stop()
+        if workers:
+            self.bus.log('Stopped ' + str(len(workers)) + ' Praat workers.')
+
+    def _spawn(self):
+        w = PraatWorker(self.praat, self.timeout)
+        with self.lock:
+            self.workers.append(w)
+        return w
+
+    # A new worker in place of w; or STOPPED, if the pool has stopped meanwhile.
+    def _replace(self, w):
+        with self.lock:
+            if w not in self.workers:
+                w = None
+            else:
+                self.workers.remove(w)
+        if w is None:
+            return STOPPED # stop() has it
+        w.stop()
+        return self._spawn()
+
+    # Runs a script in praat/scripts on an idle worker and returns whatever
+    # it wrote to the Info window (e.g. the output path), or '' on failure.
+    # Falls back to a one-off Praat process if the pool isn't running.
+    # > Raises PraatError if given more than MAXARGS arguments.
+    def run(self, script, *args):
+        if len(args) > MAXARGS:
+            raise PraatError(script + ' was given ' + str(len(args)) + ' arguments; Praat workers take at most ' + str(MAXARGS) + '.')
+        if not self.workers:
+            return runOnce(script, args, self.praat)
+
+        idle = self.idle
+        w = idle.get()
+        if w is STOPPED:
+            idle.put(w) # pass it on to the next caller waiting here
+            return runOnce(script, args, self.praat)
+        try:
+            resp = w.run(script, *args)
+        except PraatError as e:
+            self.bus.log('Praat worker failed on ' + script + ': ' + str(e) + ' Restarting it.')
+            w = self._replace(w)
+            return ''
+        finally:
+            if w is not STOPPED and w.jobs >= self.maxjobs:
+                w = self._replace(w)
+            if w is not STOPPED:
+                idle.put(w)
+        return resp
+
+    # Health check: pings every idle worker and replaces any that don't answer.
+    # (Run periodically by a Monitor; must not raise.)
+    def check(self):
+        for i in range(self.idle.qsize()):
+            try:
+                w = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if w is STOPPED:
+                break
+            try:
+                if not w.ping():
+                    self.bus.log('Praat worker failed health check. Restarting it.')
+                    w = self._replace(w)
+            except Exception:
+                self.bus.log('Error restarting Praat worker.', traceback=True)
+            self.idle.put(w)
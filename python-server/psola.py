@@ -0,0 +1,155 @@
+'''
+    Time-domain PSOLA resynthesis in NumPy (plus the intensity
+    multiplication we do alongside it).
+
+    Does the job of Praat's "To Manipulation... 0.001 75 600",
+    "Replace pitch tier" / "Replace duration tier" and
+    "Get resynthesis (PSOLA)" on a waveform held in memory:
+
+        (marks, voiced) = psola.pitchMarks(x, sr, X, Y)
+        y = psola.resynthesize(x, sr, marks, voiced, pitch=(tX, tY), duration=(dX, dY))
+
+    where (X, Y) is the sound's own pitch contour (e.g. analysis.pitchTier),
+    (tX, tY) the target PitchTier and (dX, dY) a DurationTier, all in the
+    time domain of the input sound, as they would be in a Manipulation.
+'''
+import numpy
+
+FLOOR = 75.0          # Hz; longest period we treat as voiced
+CEILING = 600.0       # Hz
+UNVOICED_STEP = 0.01  # seconds between marks in unvoiced stretches
+MAX_GAP = 0.02        # seconds; pitch points further apart than this start a new voiced region
+
+# Tier value at times t, interpolated linearly and held constant outside
+# the first and last points, as Praat does for PitchTier and DurationTier.
+def interpTier(X, Y, t):
+    X = numpy.asarray(X, dtype=numpy.float64)
+    Y = numpy.asarray(Y, dtype=numpy.float64)
+    order = numpy.argsort(X, kind='mergesort')
+    return numpy.interp(t, X[order], Y[order])
+
+# Splits the times of a pitch contour into voiced regions [(start, end), ...].
+def voicedRegions(X, maxgap=MAX_GAP):
+    X = numpy.sort(numpy.asarray(X, dtype=numpy.float64))
+    if len(X) == 0:
+        return []
+    breaks = numpy.nonzero(numpy.diff(X) > maxgap)[0]
+    starts = numpy.concatenate(([X[0]], X[breaks + 1]))
+    ends = numpy.concatenate((X[breaks], [X[-1]]))
+    return list(zip(starts, ends))
+
+# Places analysis pitch marks (as sample indices): one per period in voiced
+# regions, each snapped to the waveform maximum within a quarter period,
+# and evenly spaced marks in between.
+# < Returns (marks, voiced), where voiced[i] says whether marks[i] is a pulse.
+def pitchMarks(x, sr, X, Y):
+    x = numpy.asarray(x, dtype=numpy.float64)
+    order = numpy.argsort(X, kind='mergesort')
+    X = numpy.asarray(X, dtype=numpy.float64)[order]
+    Y = numpy.asarray(Y, dtype=numpy.float64)[order]
+    marks = []
+    voiced = []
+    t = 0.0
+    duration = len(x) / float(sr)
+    for (start, end) in voicedRegions(X) + [(duration, None)]:
+        # Unvoiced stretch up to the region (or the end of the sound)
+        while t < start - UNVOICED_STEP:
+            marks.append(int(round(t * sr)))
+            voiced.append(False)
+            t += UNVOICED_STEP
+        if end is None:
+            break
+        t = start
+        while t <= end:
+            period = 1.0 / numpy.clip(numpy.interp(t, X, Y), FLOOR, CEILING)
+            centre = int(round(t * sr))
+            reach = max(1, int(0.25 * period * sr))
+            lo = max(0, centre - reach)
+            hi = min(len(x), centre + reach + 1)
+            if hi <= lo:
+                break
+            peak = lo + int(numpy.argmax(x[lo:hi]))
+            if not marks or peak > marks[-1]:
+                marks.append(peak)
+                voiced.append(True)
+            t = peak / float(sr) + period
+    return (numpy.array(marks, dtype=int), numpy.array(voiced, dtype=bool))
+
+# Sound & IntensityTier: Multiply, as in intensity_resynth.praat: scales the
+# waveform by the tier's dB values (interpolated in time), then rescales the
+# result to a peak of 0.9.
+def multiplyIntensity(x, sr, X, Y):
+    x = numpy.asarray(x, dtype=numpy.float64)
+    if len(X) == 0:
+        return x
+    t = numpy.arange(len(x)) / float(sr)
+    db = interpTier(X, Y, t)
+    y = x * 10.0 ** ((db - numpy.max(db)) / 20.0) # relative to the loudest point, to stay in range
+    peak = numpy.max(numpy.abs(y))
+    return y * (0.9 / peak) if peak > 0 else y
+
+# Maps output times back to input times for a DurationTier (relative
+# durations, interpolated like Praat's), by integrating it on a fine grid.
+def _outputToInput(duration, dX, dY, step=0.001):
+    grid = numpy.arange(0.0, duration + step, step)
+    rel = numpy.maximum(interpTier(dX, dY, grid), 1e-3)
+    out = numpy.concatenate(([0.0], numpy.cumsum(0.5 * (rel[1:] + rel[:-1]) * step)))
+    return (out, grid)
+
+# TD-PSOLA: overlap-adds two-period Hann-windowed grains taken around the
+# analysis marks at synthesis marks spaced by the target periods. Each grain
+# is scaled by its spacing over its period, so that raising or lowering the
+# pitch keeps the level of the input.
+# < pitch, duration: optional (X, Y) tiers in input time.
+# < Returns the resynthesized waveform as a float array.
+def resynthesize(x, sr, marks, voiced, pitch=None, duration=None):
+    x = numpy.asarray(x, dtype=numpy.float64)
+    marks = numpy.asarray(marks, dtype=int)
+    voiced = numpy.asarray(voiced, dtype=bool)
+    if len(marks) < 2:
+        return x.copy()
+    indur = len(x) / float(sr)
+
+    if duration is not None and len(duration[0]) > 0:
+        (outgrid, ingrid) = _outputToInput(indur, duration[0], duration[1])
+    else:
+        (outgrid, ingrid) = (numpy.array([0.0, indur]), numpy.array([0.0, indur]))
+    outdur = outgrid[-1]
+    nout = int(round(outdur * sr))
+
+    # Local period at each analysis mark: distance to its neighbours.
+    spacing = numpy.diff(marks)
+    periods = numpy.concatenate(([spacing[0]], 0.5 * (spacing[1:] + spacing[:-1]), [spacing[-1]]))
+    periods = numpy.clip(periods, 1, int(sr / FLOOR)).astype(int)
+    midpoints = 0.5 * (marks[1:] + marks[:-1])
+
+    if pitch is not None and len(pitch[0]) > 0:
+        order = numpy.argsort(pitch[0], kind='mergesort')
+        (pX, pY) = (numpy.asarray(pitch[0], dtype=numpy.float64)[order], numpy.asarray(pitch[1], dtype=numpy.float64)[order])
+    else:
+        pX = None
+
+    y = numpy.zeros(nout)
+    to = 0.0
+    while to < outdur:
+        t = numpy.interp(to, outgrid, ingrid)
+        i = int(numpy.searchsorted(midpoints, t * sr)) # nearest analysis mark
+        p = periods[i]
+        if not voiced[i]:
+            p = int(UNVOICED_STEP * sr)
+            step = float(p)
+        elif pX is not None:
+            step = sr / numpy.clip(numpy.interp(t, pX, pY), FLOOR, CEILING)
+        else:
+            step = float(p)
+
+        # Grain [mark - p, mark + p) placed around the synthesis mark, clipped to both signals.
+        centre = int(round(to * sr))
+        lo = max(-p, -marks[i], -centre)
+        hi = min(p, len(x) - marks[i], nout - centre)
+        if hi > lo:
+            window = numpy.hanning(2 * p + 1)[p + lo:p + hi]
+            y[centre + lo:centre + hi] += x[marks[i] + lo:marks[i] + hi] * window * (step / p)
+        to += max(step, 1.0) / sr
+
+    return y
@@ -0,0 +1,74 @@
+'''
+    Sends synthesized audio back to the client without leaving it behind.
+
+    Synthesis leaves its result in a temp file (Praat), or just in memory
+    (native PSOLA, as an Audio). serveResult sends either:
+
+        return responses.serveResult(synthpath)
+
+    A file is unlinked as soon as it's open, so it's gone whatever happens
+    to the request; its data stays readable through the open file, which
+    is closed (freeing the space) once the body has been written. The body
+    is the server's wsgi.file_wrapper, so the file goes out with sendfile
+    where the server and socket allow it (see WSGIGateway.sendfile).
+'''
+import os
+import cherrypy
+from cherrypy.lib import file_generator
+
+# WAV data held in memory, in place of a temp file's path.
+class Audio(object):
+
+    def __init__(self, data, content_type='audio/wav'):
+        self.data = data
+        self.content_type = content_type
+
+# Sets up the response to send a synthesis result (a temp file's path,
+# or Audio), which it then owns. < Returns the body.
+def serveResult(result, disposition='attachment', name=None):
+    if isinstance(result, Audio):
+        return serveData(result.data, result.content_type, disposition, name or 'synthesized.wav')
+    return serveTemp(result, 'audio/wav', disposition, name)
+
+# As serve_file, for a file nobody needs after this response: removes it.
+def serveTemp(path, content_type='audio/wav', disposition='attachment', name=None):
+    request = cherrypy.serving.request
+    f = open(path, 'rb')
+    request.hooks.attach('on_end_request', f.close)
+    try:
+        os.remove(path)
+    except OSError:
+        # Can't remove open files (Windows): remove it once it's closed.
+        request.hooks.attach('on_end_request', lambda: discardResult(path))
+    setHeaders(content_type, disposition, name or os.path.basename(path), os.fstat(f.fileno()).st_size)
+    wrapper = request.wsgi_environ.get('wsgi.file_wrapper', file_generator)
+    return wrapper(f)
+
+def serveData(data, content_type='audio/wav', disposition='attachment', name=None):
+    setHeaders(content_type, disposition, name, len(data))
+    return data
+
+def setHeaders(content_type, disposition, name, length):
+    headers = cherrypy.serving.response.headers
+    headers['Content-Type'] = content_type
+    if disposition is not None:
+        headers['Content-Disposition'] = disposition if name is None else '%s; filename="%s"' % (disposition, name)
+    headers['Content-Length'] = length
+
+# The bytes of a result (e.g. for a zip entry), removing its file if it has one.
+def readResult(result):
+    if isinstance(result, Audio):
+        return result.data
+    with open(result, 'rb') as f:
+        data = f.read()
+    discardResult(result)
+    return data
+
+# Drops a result nobody will fetch (e.g. an expired job's).
+def discardResult(result):
+    if isinstance(result, Audio):
+        return
+    try:
+        os.remove(result)
+    except OSError:
+        pass
@@ -0,0 +1,105 @@
+'''
+    Runs the stages of a request as a small dependency graph.
+
+    A Plan holds named stages, each a function of the results of the stages
+    it depends on. Plan.run submits every stage whose dependencies are done
+    to a bounded StagePool, so independent stages (e.g. source and target
+    analysis) overlap and a request takes about as long as its longest branch.
+
+        plan = Plan()
+        plan.add('tts', convert)
+        plan.add('src', lambda: analyse(srcname))
+        plan.add('tgt', lambda tname: analyse(tname), 'tts')
+        results = plan.run(pool) # {'tts': ..., 'src': ..., 'tgt': ...}
+'''
+import threading
+from collections import OrderedDict
+import workspace
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+# Fixed set of daemon threads running submitted callables.
+class StagePool(object):
+
+    def __init__(self, size=8):
+        self.size = size
+        self.jobs = queue.Queue()
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def submit(self, fn):
+        with self.lock:
+            if not self.threads: # start lazily, e.g. not at import time
+                for i in range(self.size):
+                    t = threading.Thread(target=self._work, name='Stage-' + str(i))
+                    t.daemon = True
+                    t.start()
+                    self.threads.append(t)
+        self.jobs.put(fn)
+
+    def _work(self):
+        while True:
+            self.jobs.get()()
+
+class Plan(object):
+
+    def __init__(self):
+        self.stages = OrderedDict() # name -> (function, dependency names)
+
+    # Adds a stage. fn is called with the results of deps, in order.
+    def add(self, name, fn, *deps):
+        for d in deps:
+            if d not in self.stages:
+                raise ValueError('Stage ' + name + ' depends on unknown stage ' + d + '.')
+        self.stages[name] = (fn, deps)
+
+    # Runs every stage as soon as its dependencies have finished, and waits
+    # for all of them, each with the caller's scratch workspace (see workspace.py).
+    # Returns {name: result}. If a stage raises, the stages
+    # that depend on it are skipped and the first error is re-raised here
+    # once everything in flight has finished.
+    def run(self, pool):
+        results = {}
+        errors = []
+        pending = OrderedDict(self.stages)
+        running = set()
+        done = threading.Condition()
+
+        def launch(name):
+            (fn, deps) = pending.pop(name)
+            args = [results[d] for d in deps]
+            running.add(name)
+
+            def stage():
+                try:
+                    result = fn(*args)
+                    error = None
+                except Exception as e:
+                    result = None
+                    error = e
+                with done:
+                    running.discard(name)
+                    if error is None:
+                        results[name] = result
+                    else:
+                        errors.append(error)
+                    done.notify()
+            pool.submit(workspace.carry(stage))
+
+        with done:
+            while pending or running:
+                if not errors:
+                    for name in [n for n in pending if all(d in results for d in pending[n][1])]:
+                        launch(name)
+                elif not running:
+                    break
+                if running:
+                    done.wait()
+                elif pending:
+                    break # stages left whose dependencies failed
+
+        if errors:
+            raise errors[0]
+        return results
@@ -0,0 +1,66 @@
+'''
+    Tests for p2fa.align.align_batch, with HCopy and HVite stood in for
+    (HVite aligns every utterance it's given as "sil HELLO").
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from p2fa import align
+
+def fakeViterbi(input_mlf, word_dictionary, output_mlf, phoneset, hmmdir, workdir):
+    f = open(output_mlf, 'w')
+    f.write('#!MLF!#\n')
+    for line in open(workdir + '/test.scp'):
+        label = os.path.splitext(os.path.basename(line.strip()))[0]
+        f.write('"' + label + '.rec"\n0 1000000 sil -100 sil\n1000000 3000000 HH -100 HELLO\n3000000 5000000 AH -100\n.\n')
+    f.close()
+
+def silentWAV(path, sr, seconds):
+    f = wave.open(path, 'wb')
+    f.setnchannels(1)
+    f.setsampwidth(2)
+    f.setframerate(sr)
+    f.writeframes(b'\0\0' * int(sr * seconds))
+    f.close()
+
+class AlignBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.saved = (align.create_plp, align.viterbi)
+        align.create_plp = lambda hcopy_config, workdir: None
+        align.viterbi = fakeViterbi
+
+    def tearDown(self):
+        (align.create_plp, align.viterbi) = self.saved
+        shutil.rmtree(self.dir, True)
+
+    def item(self, name, wavdata=None):
+        wavfile = os.path.join(self.dir, name + '.wav')
+        if wavdata is None:
+            silentWAV(wavfile, 16000, 0.5)
+        else:
+            with open(wavfile, 'wb') as f:
+                f.write(wavdata)
+        trsfile = os.path.join(self.dir, name + '.txt')
+        with open(trsfile, 'w') as f:
+            f.write('hello\n')
+        return (wavfile, trsfile, os.path.join(self.dir, name + '.TextGrid'))
+
+    def test_unreadable_wav_fails_alone(self):
+        items = [self.item('good1'), self.item('bad', b'not a wav file'), self.item('good2')]
+        aligned = align.align_batch(items, tmpdir=self.dir)
+        self.assertEqual(aligned, [True, False, True])
+        self.assertTrue(os.path.exists(items[0][2]))
+        self.assertFalse(os.path.exists(items[1][2]))
+        self.assertTrue(os.path.exists(items[2][2]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+'''
+    Tests for the native analyses in analysis.py, on signals whose
+    contours are known, and for how main.py picks between them and Praat's.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import analysis
+import main
+from test_wavconvert import floatWAV
+
+SR = 16000
+
+def sine(freq, amplitude, seconds, sr=SR):
+    t = numpy.arange(int(sr * seconds)) / float(sr)
+    return amplitude * numpy.sin(2 * numpy.pi * freq * t)
+
+# Intensity of a sine of the given amplitude, in dB re 2e-5 Pa.
+def sineDB(amplitude):
+    return 10 * numpy.log10(amplitude * amplitude / 2 / 4e-10)
+
+class PitchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    # A glide from 150 to 250 Hz: its instantaneous frequency is 150 + 100t.
+    def test_glide(self):
+        t = numpy.arange(SR) / float(SR)
+        (X, Y) = analysis.pitchTier(0.5 * numpy.sin(2 * numpy.pi * (150 * t + 50 * t * t)), SR)
+        self.assertTrue(len(X) > 900)
+        self.assertTrue(X[0] < 0.05 and X[-1] > 0.95)
+        numpy.testing.assert_allclose(Y, 150 + 100 * X, rtol=0.01)
+
+    def test_silence(self):
+        (X, Y) = analysis.pitchTier(numpy.zeros(SR), SR)
+        self.assertEqual((len(X), len(Y)), (0, 0))
+
+    def test_noise(self):
+        (X, Y) = analysis.pitchTier(0.3 * numpy.random.RandomState(0).randn(SR), SR)
+        self.assertEqual(len(X), 0)
+
+    # Only the voiced frames have points.
+    def test_tone_then_silence(self):
+        x = numpy.concatenate((sine(200, 0.5, 0.5), numpy.zeros(SR // 2)))
+        (X, Y) = analysis.pitchTier(x, SR)
+        self.assertTrue(len(X) > 400)
+        self.assertTrue(X[-1] < 0.55)
+        numpy.testing.assert_allclose(Y, 200, rtol=0.01)
+
+    def test_too_short(self):
+        (X, Y) = analysis.pitchTier(sine(200, 0.5, 0.02), SR)
+        self.assertEqual((len(X), len(Y)), (0, 0))
+
+    def test_float_wav(self):
+        x = sine(200, 0.5, 0.5)
+        path = os.path.join(self.dir, 'float.wav')
+        floatWAV(path, x, sr=SR)
+        (X, Y) = analysis.extractPitchTier(path)
+        (eX, eY) = analysis.pitchTier(x, SR)
+        numpy.testing.assert_allclose(X, eX)
+        numpy.testing.assert_allclose(Y, eY, rtol=1e-3)
+
+class TrackerTest(unittest.TestCase):
+
+    def test_request_option(self):
+        self.assertEqual(main.trackerOption(None), None)
+        self.assertEqual(main.trackerOption(''), None)
+        self.assertEqual(main.trackerOption('native'), 'native')
+        self.assertEqual(main.trackerOption('praat'), 'praat')
+        self.assertTrue(main.isError(main.trackerOption('Native')))
+
+    # A tracker no request could give (e.g. from constants) is refused, not run as Praat.
+    def test_unknown_tracker(self):
+        scripts = main.PraatScripts()
+        self.assertRaises(ValueError, scripts.extractPitchContour, 'x.wav', 'yin')
+        self.assertRaises(ValueError, scripts.extractIntensityContour, 'x.wav', 'yin')
+
+class IntensityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def test_sine(self):
+        (X, Y) = analysis.intensityTier(sine(200, 0.1, 1.0), SR)
+        self.assertTrue(len(X) > 100)
+        numpy.testing.assert_allclose(numpy.diff(X), 0.008)
+        self.assertTrue(X[0] > 0 and X[-1] < 1.0)
+        numpy.testing.assert_allclose(Y, sineDB(0.1), atol=0.05)
+
+    def test_step(self):
+        x = numpy.concatenate((sine(200, 0.1, 0.5), sine(200, 0.01, 0.5)))
+        (X, Y) = analysis.intensityTier(x, SR)
+        numpy.testing.assert_allclose(Y[X < 0.4], sineDB(0.1), atol=0.05)
+        numpy.testing.assert_allclose(Y[X > 0.6], sineDB(0.01), atol=0.05)
+
+    def test_too_short(self):
+        (X, Y) = analysis.intensityTier(sine(200, 0.1, 0.05), SR)
+        self.assertEqual((len(X), len(Y)), (0, 0))
+
+    def test_pcm_wav(self):
+        x = sine(200, 0.1, 0.5)
+        path = os.path.join(self.dir, 'pcm.wav')
+        analysis.writeWAV(path, x, SR)
+        (X, Y) = analysis.extractIntensityTier(path)
+        numpy.testing.assert_allclose(Y, sineDB(0.1), atol=0.05)
+
+    # Float WAVs, which the wave module can't read, as Praat can.
+    def test_float_wav(self):
+        x = sine(200, 0.1, 0.5)
+        path = os.path.join(self.dir, 'float.wav')
+        floatWAV(path, x, sr=SR)
+        (X, Y) = analysis.extractIntensityTier(path)
+        (eX, eY) = analysis.intensityTier(x, SR)
+        numpy.testing.assert_allclose(X, eX)
+        numpy.testing.assert_allclose(Y, eY, atol=1e-3)
+
+    def test_streamed_float_wav(self):
+        x = sine(200, 0.1, 0.5)
+        path = os.path.join(self.dir, 'streamed.wav')
+        floatWAV(path, x, sr=SR, riffsize=0xFFFFFFFF, datasize=0xFFFFFFFF)
+        (X, Y) = analysis.extractIntensityTier(path)
+        self.assertEqual(len(X), len(analysis.intensityTier(x, SR)[0]))
+
+    def test_not_a_wav(self):
+        path = os.path.join(self.dir, 'tts.mp3')
+        with open(path, 'wb') as f:
+            f.write(b'ID3' + b'\0' * 100)
+        self.assertEqual(analysis.extractIntensityTier(path), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+'''
+    Tests for how main.py's batchsynthesize takes its items: the names of
+    zipped items' results, and items whose WAV fields aren't files.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cherrypy
+import main
+import workspace
+
+# A file field, as CherryPy hands a request's uploads over.
+class FilePart(cherrypy._cpreqbody.Entity):
+
+    def __init__(self, data):
+        self.file = io.BytesIO(data)
+        self.value = None
+
+# A POSTed zip holding a folder per item.
+def batchZip(folders):
+    data = io.BytesIO()
+    z = zipfile.ZipFile(data, 'w')
+    for folder in folders:
+        prefix = folder + '/' if folder else ''
+        for field in ('srcwav.wav', 'twav.wav', 'srctimestamps.txt', 'ttimestamps.txt'):
+            z.writestr(prefix + field, b'x')
+    z.close()
+    data.seek(0)
+    return FilePart(data.getvalue())
+
+def readZip(chunks):
+    z = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    return dict((name, z.read(name)) for name in z.namelist())
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.ws = workspace.Workspace(self.dir)
+
+    def tearDown(self):
+        self.ws.close()
+        shutil.rmtree(self.dir, True)
+
+    def test_item_names(self):
+        folders = ['', '../../etc/cron.d', 'a b', 'a_b', '0', 'x/y', 'ok-1']
+        with self.ws.active():
+            items = main.unpackBatch(batchZip(folders))
+        names = [item[0] for item in items]
+        self.assertEqual(len(names), len(folders))
+        self.assertEqual(len(set(names)), len(names))
+        for name in names:
+            self.assertTrue(re.match(r'^[A-Za-z0-9_-]+$', name), name)
+        self.assertTrue('ok-1' in names and 'x_y' in names)
+
+    def test_item_name_collisions(self):
+        taken = set()
+        self.assertEqual(main.batchItemName('', 0, taken), '0')
+        self.assertEqual(main.batchItemName('0', 1, taken), '1')
+        self.assertEqual(main.batchItemName('1', 2, taken), '2')
+        self.assertEqual(main.batchItemName('../2', 3, taken), '___2')
+        self.assertEqual(main.batchItemName('2', 4, taken), '4')
+        self.assertEqual(main.batchItemName('4', 5, taken), '5')
+        self.assertEqual(main.batchItemName('5', 4, taken), '4_')
+
+    # Form fields that aren't files fail their own item, not the request.
+    def test_non_file_fields(self):
+        with self.ws.active():
+            chunks = main.PraatScripts().batchsynthesize(
+                srcwav=['not a file', FilePart(b'RIFF')], srctimestamps=['a,0,1', 'a,0,1'],
+                twav=[FilePart(b'RIFF'), 'nor this'], ttimestamps=['a,0,1', 'a,0,1'])
+            results = readZip(chunks)
+        self.assertEqual(sorted(results), ['0.txt', '1.txt'])
+        for error in results.values():
+            self.assertTrue(error.startswith(b'Error: '))
+            self.assertTrue(b'srcwav and twav' in error)
+
+if __name__ == '__main__':
+    unittest.main()
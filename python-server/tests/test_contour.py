@@ -0,0 +1,101 @@
+'''
+    Regression tests for contour.py, against the list-based code in main.py
+    it stands in for, on fixed random tiers.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import math
+import os
+import sys
+import unittest
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import main
+import contour
+
+class SegmentRMSETest(unittest.TestCase):
+
+    # The RMSE transferPitch used to compute for one word, from its points.
+    def oldRMSE(self, X, Y, bgn, end, tX, tY, tbgn, tend):
+        pps = [(x, y) for (x, y) in zip(X, Y) if bgn <= x < end]
+        tpps = [(x, y) for (x, y) in zip(tX, tY) if tbgn <= x < tend]
+        if len(pps) == 0 or len(tpps) == 0:
+            return 0
+        return math.sqrt(main.mean_squared_error(pps, tpps, bgn, end, tbgn, tend))
+
+    def check(self, X, Y, tX, tY, spans):
+        (bgn, end, tbgn, tend) = numpy.array(spans, dtype=numpy.float64).T
+        new = contour.segmentRMSE(X, Y, bgn, end, tX, tY, tbgn, tend)
+        old = [self.oldRMSE(X, Y, s[0], s[1], tX, tY, s[2], s[3]) for s in spans]
+        self.assertTrue(numpy.allclose(new, old, rtol=1e-9, atol=1e-9))
+
+    def test_matches_mean_squared_error(self):
+        for seed in range(5):
+            rng = numpy.random.RandomState(seed)
+            X = numpy.sort(rng.uniform(0, 6.0, 600))
+            Y = rng.uniform(80, 250, 600)
+            tX = numpy.sort(rng.uniform(0, 5.0, 500))
+            tY = rng.uniform(90, 200, 500)
+            cuts = numpy.sort(rng.uniform(0, 6.0, 13))
+            tcuts = numpy.sort(rng.uniform(0, 5.0, 13))
+            spans = [(cuts[i], cuts[i + 1], tcuts[i], tcuts[i + 1]) for i in range(12)]
+            spans.append((7.0, 8.0, 1.0, 2.0)) # no source points
+            self.check(X.tolist(), Y.tolist(), tX.tolist(), tY.tolist(), spans)
+
+    # Praat tiers can have several points at the same time.
+    def test_duplicate_times(self):
+        rng = numpy.random.RandomState(7)
+        X = numpy.sort(numpy.round(rng.uniform(0, 3.0, 300), 2))
+        Y = rng.uniform(80, 250, 300)
+        tX = numpy.sort(numpy.round(rng.uniform(0, 3.0, 300), 2))
+        tY = rng.uniform(90, 200, 300)
+        spans = [(0.0, 1.0, 0.5, 1.2), (1.0, 2.5, 1.2, 2.9), (2.5, 3.0, 2.9, 3.0)]
+        self.check(X.tolist(), Y.tolist(), tX.tolist(), tY.tolist(), spans)
+
+class AreaBetweenTest(unittest.TestCase):
+
+    # The old areaBetween can't be the reference: it left out the last
+    # interval, and everything after the curves' first crossing. Instead,
+    # integrate the difference densely, with the trapezoids of its areaUnder.
+    def reference(self, A, B, n=200001):
+        (AX, AY) = numpy.array(sorted(A)).T
+        (BX, BY) = numpy.array(sorted(B)).T
+        x = numpy.linspace(max(AX[0], BX[0]), min(AX[-1], BX[-1]), n)
+        d = numpy.interp(x, AX, AY) - numpy.interp(x, BX, BY)
+        dx = numpy.diff(x)
+        signed = numpy.sum(0.5 * (d[:-1] + d[1:]) * dx)
+        absolute = numpy.sum((numpy.abs(d[1:] - d[:-1]) / 2.0 + numpy.minimum(numpy.abs(d[:-1]), numpy.abs(d[1:]))) * dx)
+        return (signed, absolute)
+
+    def check(self, A, B):
+        (signed, absolute) = self.reference(A, B)
+        self.assertAlmostEqual(main.areaBetween(A, B, signed=True), signed, delta=1e-6 * absolute)
+        self.assertAlmostEqual(main.areaBetween(A, B), absolute, delta=1e-3 * absolute)
+
+    def test_random_curves(self):
+        for seed in range(5):
+            rng = numpy.random.RandomState(seed)
+            AX = numpy.sort(rng.uniform(0, 100, 40))
+            BX = numpy.sort(rng.uniform(0, 100, 55))
+            A = list(zip(AX, rng.uniform(0, 50, 40)))
+            B = list(zip(BX, rng.uniform(0, 50, 55)))
+            self.check(A, B)
+
+    def test_no_crossing(self):
+        x = numpy.linspace(0, 100, 21)
+        rng = numpy.random.RandomState(0)
+        A = list(zip(x, 300 + rng.uniform(0, 50, 21)))
+        B = list(zip(x, 100 + rng.uniform(0, 50, 21)))
+        self.check(A, B)
+        self.assertAlmostEqual(main.areaBetween(A, B), main.areaBetween(A, B, signed=True))
+
+    def test_symmetric(self):
+        A = [(0, 0.0), (1, 2.0), (2, 0.0)]
+        B = [(0, 1.0), (2, 1.0)]
+        self.assertAlmostEqual(main.areaBetween(A, B, signed=True), 0.0)
+        self.assertAlmostEqual(main.areaBetween(A, B), 1.0) # a triangle of 1/2 above the line, two of 1/4 below it
+        self.assertEqual(main.areaBetween([], B), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+'''
+    Tests for praatpool.py. Those that run scripts need a Praat: praatpool.PRAAT,
+    or the one named by the PRAAT environment variable; without one they're skipped.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import wave
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import cherrypy
+from cherrypy._cpcompat import tonative
+import praatpool
+
+PRAAT = os.environ.get('PRAAT', praatpool.PRAAT)
+havePraat = unittest.skipUnless(os.access(PRAAT, os.X_OK), 'no Praat at ' + PRAAT)
+
+# Prints its arguments, and how many objects it found on starting (the
+# worker should have removed those of earlier jobs) and made.
+ECHO = '''form Echo
+	text a
+	text b
+	text c
+	text d
+	text e
+endform
+select all
+before = numberOfSelected ()
+sound = Create Sound from formula: "s", 1, 0, 0.1, 16000, "0"
+writeInfoLine: a$, " ", b$, " ", c$, " ", d$, " ", e$
+appendInfoLine: before, " ", sound
+'''
+
+class PoolTest(unittest.TestCase):
+
+    def test_too_many_arguments(self):
+        pool = praatpool.PraatPool(cherrypy.engine, 0, praat=PRAAT)
+        self.assertRaises(praatpool.PraatError, pool.run, 'echo.praat', 1, 2, 3, 4, 5, 6)
+
+@havePraat
+class WorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.echo = os.path.join(self.dir, 'echo.praat')
+        with open(self.echo, 'w') as f:
+            f.write(ECHO)
+        self.worker = praatpool.PraatWorker(PRAAT, timeout=20)
+
+    def tearDown(self):
+        self.worker.stop()
+        shutil.rmtree(self.dir, True)
+
+    def test_ping(self):
+        self.assertTrue(self.worker.ping())
+
+    def test_jobs(self):
+        ids = []
+        cafe = tonative(u'caf\xe9'.encode('utf-8'), 'utf-8') # a native str, in either Python
+        for i in range(3):
+            lines = self.worker.run(self.echo, 'one', i, 'three four', cafe, '').splitlines()
+            self.assertEqual(lines[0], 'one ' + str(i) + ' three four ' + cafe + ' ')
+            (before, sound) = lines[1].split()
+            self.assertEqual(before, '0') # the last job's objects are gone
+            ids.append(int(sound))
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(self.worker.jobs, 3)
+        self.assertEqual(os.listdir(self.worker.dir), [])
+
+    # Runs a script that writes its output to its last argument, on the
+    # worker and in a one-off Praat, and checks both wrote the same: the
+    # same tier, or WAVs of the same length and level (Praat's PSOLA
+    # varies from run to run in unvoiced stretches).
+    # < Returns the path of the output.
+    def check(self, script, *args):
+        outputs = []
+        for run in (lambda a: self.worker.run(script, *a), lambda a: praatpool.runOnce(script, a, PRAAT)):
+            out = os.path.join(self.dir, script + str(len(outputs)))
+            self.assertEqual(run(list(args) + [out]).strip(), out)
+            with open(out, 'rb') as f:
+                outputs.append(f.read())
+        if outputs[0][:4] != b'RIFF':
+            self.assertEqual(outputs[0], outputs[1])
+            return out
+        self.assertEqual(outputs[0][:44], outputs[1][:44]) # format and length
+        (a, b) = [numpy.frombuffer(o[44:], '<i2').astype(numpy.float64) for o in outputs]
+        self.assertAlmostEqual(numpy.sqrt(numpy.mean(a * a) / numpy.mean(b * b)), 1.0, delta=0.05)
+        return out
+
+    # Every script main.py runs gives what a one-off Praat gives, as the
+    # worker's later jobs (with other object IDs) too.
+    def test_scripts(self):
+        wav = os.path.join(self.dir, 'glide.wav')
+        t = numpy.arange(16000) / 16000.0
+        x = 0.5 * numpy.sin(2 * numpy.pi * (150 * t + 50 * t * t))
+        f = wave.open(wav, 'wb')
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(numpy.round(x * 32767).astype('<i2').tobytes())
+        f.close()
+        durtier = os.path.join(self.dir, 'dur.DurationTier')
+        with open(durtier, 'w') as f:
+            f.write('File type = "ooTextFile"\nObject class = "DurationTier"\n\n0\n1\n2\n0.2\n1.0\n0.8\n1.5\n')
+
+        for i in range(2):
+            pitchtier = self.check('extract_pitchtier.praat', wav)
+            with open(pitchtier) as f:
+                self.assertTrue(len(f.read().splitlines()) > 100)
+            inttier = self.check('extract_intensitytier.praat', wav)
+            self.check('pitch_resynth.praat', wav, pitchtier)
+            self.check('intensity_resynth.praat', wav, inttier)
+            self.check('dur_resynth.praat', wav, durtier)
+            self.check('fused_resynth.praat', wav, pitchtier, '', durtier)
+            self.check('fused_resynth.praat', wav, '', inttier, '')
+        self.assertEqual(self.worker.run('avg_pitch.praat', wav, '10', '75', '500', '11025'),
+                         praatpool.runOnce('avg_pitch.praat', [wav, '10', '75', '500', '11025'], PRAAT))
+
+    def test_dead_worker(self):
+        self.worker.proc.kill()
+        self.worker.proc.wait()
+        self.assertRaises(praatpool.PraatError, self.worker.run, self.echo, 'a', 'b', 'c', 'd', 'e')
+        self.assertFalse(self.worker.ping())
+
+@havePraat
+class PoolWorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.echo = os.path.join(self.dir, 'echo.praat')
+        with open(self.echo, 'w') as f:
+            f.write(ECHO)
+        self.pool = praatpool.PraatPool(cherrypy.engine, 2, maxjobs=3, timeout=20, praat=PRAAT)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop()
+        shutil.rmtree(self.dir, True)
+
+    def test_concurrent_jobs(self):
+        results = {}
+        def run(i):
+            results[i] = self.pool.run(self.echo, i, 'b', 'c', 'd', 'e')
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for i in range(8):
+            self.assertEqual(results[i].splitlines()[0], str(i) + ' b c d e')
+        self.assertEqual(len(self.pool.workers), 2) # recycled after maxjobs, not lost
+
+    def test_replaces_dead_worker(self):
+        w = self.pool.idle.get()
+        w.proc.kill()
+        w.proc.wait()
+        self.pool.idle.put(w)
+        self.pool.check()
+        self.assertFalse(w in self.pool.workers)
+        self.assertEqual(len(self.pool.workers), 2)
+        self.assertTrue(self.pool.run(self.echo, 'a', 'b', 'c', 'd', 'e').startswith('a b c d e'))
+
+if __name__ == '__main__':
+    unittest.main()
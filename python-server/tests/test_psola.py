@@ -0,0 +1,112 @@
+'''
+    Tests for the native PSOLA in psola.py, measuring what it gives with
+    analysis.pitchTier: the target pitch, the stretched length, and the
+    unvoiced and empty-tier paths.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import os
+import sys
+import unittest
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import analysis
+import psola
+from test_analysis import SR, sine
+
+# RMS away from the edges, where grains are cut short.
+def rms(x):
+    x = x[SR // 8:-SR // 8]
+    return numpy.sqrt(numpy.mean(x * x))
+
+class ResynthesizeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.x = sine(200, 0.5, 1.0)
+        (X, Y) = analysis.pitchTier(self.x, SR)
+        (self.marks, self.voiced) = psola.pitchMarks(self.x, SR, X, Y)
+
+    def resynthesize(self, pitch=None, duration=None):
+        return psola.resynthesize(self.x, SR, self.marks, self.voiced, pitch, duration)
+
+    def test_marks(self):
+        self.assertTrue(self.voiced.sum() > 180)
+        spacing = numpy.diff(self.marks[self.voiced])
+        self.assertTrue(numpy.all(numpy.abs(spacing - SR / 200.0) <= 1)) # one a period
+
+    def test_pitch_shift(self):
+        for f0 in (150.0, 250.0):
+            y = self.resynthesize(pitch=([0.0, 1.0], [f0, f0]))
+            self.assertEqual(len(y), len(self.x))
+            (X, Y) = analysis.pitchTier(y, SR)
+            middle = (X > 0.1) & (X < 0.9)
+            self.assertTrue(middle.sum() > 700)
+            numpy.testing.assert_allclose(Y[middle], f0, rtol=0.01)
+
+    def test_duration_stretch(self):
+        for factor in (0.5, 1.5):
+            y = self.resynthesize(duration=([0.0, 1.0], [factor, factor]))
+            self.assertEqual(len(y), int(round(factor * SR)))
+            (X, Y) = analysis.pitchTier(y, SR)
+            middle = (X > 0.1) & (X < factor - 0.1)
+            numpy.testing.assert_allclose(Y[middle], 200, rtol=0.01) # pitch kept
+            self.assertAlmostEqual(rms(y) / rms(self.x), 1.0, delta=0.1)
+
+    # A stretch that varies along the tier: the output is as long as its integral.
+    def test_varying_duration(self):
+        y = self.resynthesize(duration=([0.0, 1.0], [1.0, 2.0]))
+        self.assertAlmostEqual(len(y) / float(SR), 1.5, delta=0.002)
+
+    # Empty tiers, as a word-less transcript gives, leave pitch and length alone.
+    def test_empty_tiers(self):
+        y = self.resynthesize(pitch=([], []), duration=([], []))
+        self.assertEqual(len(y), len(self.x))
+        (X, Y) = analysis.pitchTier(y, SR)
+        numpy.testing.assert_allclose(Y[(X > 0.1) & (X < 0.9)], 200, rtol=0.01)
+        self.assertAlmostEqual(rms(y) / rms(self.x), 1.0, delta=0.05)
+        numpy.testing.assert_array_equal(psola.multiplyIntensity(self.x, SR, [], []), self.x)
+
+    def test_empty_sound(self):
+        x = numpy.zeros(0)
+        (marks, voiced) = psola.pitchMarks(x, SR, [], [])
+        self.assertEqual(len(psola.resynthesize(x, SR, marks, voiced, ([0.0], [200.0]))), 0)
+
+class UnvoicedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.x = 0.3 * numpy.random.RandomState(0).randn(SR)
+
+    # With no pitch points at all (e.g. whispered TTS), every mark is unvoiced.
+    def test_marks(self):
+        (marks, voiced) = psola.pitchMarks(self.x, SR, [], [])
+        self.assertFalse(voiced.any())
+        self.assertTrue(numpy.all(numpy.diff(marks) == int(psola.UNVOICED_STEP * SR)))
+        self.assertTrue(marks[-1] >= SR - 2 * psola.UNVOICED_STEP * SR) # up to the end
+
+    # A pitch tier can't move unvoiced stretches: they come back as they were.
+    def test_pitch_ignored(self):
+        (marks, voiced) = psola.pitchMarks(self.x, SR, [], [])
+        y = psola.resynthesize(self.x, SR, marks, voiced, pitch=([0.0, 1.0], [250.0, 250.0]))
+        self.assertEqual(len(y), len(self.x))
+        numpy.testing.assert_allclose(y[SR // 8:-SR // 8], self.x[SR // 8:-SR // 8], atol=1e-9)
+
+    def test_duration_stretch(self):
+        (marks, voiced) = psola.pitchMarks(self.x, SR, [], [])
+        y = psola.resynthesize(self.x, SR, marks, voiced, duration=([0.0, 1.0], [2.0, 2.0]))
+        self.assertEqual(len(y), 2 * SR)
+        self.assertAlmostEqual(rms(y) / rms(self.x), 1.0, delta=0.1)
+
+    # Voiced then unvoiced: marks are pulses only where there are pitch points.
+    def test_voiced_then_unvoiced(self):
+        x = numpy.concatenate((sine(200, 0.5, 0.5), self.x[:SR // 2] * 0.1))
+        (X, Y) = analysis.pitchTier(x, SR)
+        (marks, voiced) = psola.pitchMarks(x, SR, X, Y)
+        self.assertTrue(numpy.all(marks[voiced] < 0.52 * SR))
+        self.assertTrue(numpy.sum(~voiced & (marks > 0.55 * SR)) > 40)
+        y = psola.resynthesize(x, SR, marks, voiced, pitch=([0.0, 1.0], [250.0, 250.0]))
+        (oX, oY) = analysis.pitchTier(y, SR)
+        numpy.testing.assert_allclose(oY[(oX > 0.1) & (oX < 0.4)], 250, rtol=0.01)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+'''
+    Tests for how p2fa's prep_wav readies a WAV for HTK (see p2fa/resample.py):
+    trimmed to -s/-e, at a model's rate or resampled to one.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import wave
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from p2fa import align
+
+FREQ = 440.0
+
+# A mono 16-bit WAV of a FREQ Hz sine.
+def sineWAV(path, sr, seconds):
+    t = numpy.arange(int(sr * seconds)) / float(sr)
+    f = wave.open(path, 'wb')
+    f.setnchannels(1)
+    f.setsampwidth(2)
+    f.setframerate(sr)
+    f.writeframes(numpy.round(0.5 * numpy.sin(2 * numpy.pi * FREQ * t) * 32767).astype('<i2').tobytes())
+    f.close()
+
+def readPCM(path):
+    f = wave.open(path, 'rb')
+    try:
+        return (numpy.frombuffer(f.readframes(f.getnframes()), '<i2') / 32767.0, f.getframerate())
+    finally:
+        f.close()
+
+class PrepWavTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.out = os.path.join(self.dir, 'out.wav')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def sine(self, sr):
+        path = os.path.join(self.dir, 'in' + str(sr) + '.wav')
+        sineWAV(path, sr, 2.0)
+        return path
+
+    def test_trim_at_model_rate(self):
+        orig = self.sine(16000)
+        SR = align.prep_wav(orig, self.out, None, "0.5", "1.25", align.SR_MODELS)
+        self.assertEqual(SR, 16000)
+        (y, sr) = readPCM(self.out)
+        (x, _) = readPCM(orig)
+        self.assertEqual(sr, 16000)
+        numpy.testing.assert_array_equal(y, x[8000:20000]) # samples, untouched
+
+    def test_trim_and_resample(self):
+        # 44100 has no model: resampled to 11025, after trimming
+        SR = align.prep_wav(self.sine(44100), self.out, None, "0.5", "1.25", align.SR_MODELS)
+        self.assertEqual(SR, 11025)
+        (y, sr) = readPCM(self.out)
+        self.assertEqual(sr, 11025)
+        self.assertEqual(len(y), int(round(0.75 * 11025)))
+        # the sine from 0.5s on, away from the cut edges
+        t = 0.5 + numpy.arange(len(y)) / 11025.0
+        expected = 0.5 * numpy.sin(2 * numpy.pi * FREQ * t)
+        self.assertLess(numpy.max(numpy.abs(y - expected)[200:-200]), 1e-3)
+
+    def test_end_only(self):
+        SR = align.prep_wav(self.sine(16000), self.out, None, "0.0", "1.0", align.SR_MODELS)
+        self.assertEqual(SR, 16000)
+        self.assertEqual(len(readPCM(self.out)[0]), 16000)
+
+    def test_untrimmed_model_rate_is_linked(self):
+        orig = self.sine(16000)
+        SR = align.prep_wav(orig, self.out, None, "0.0", None, align.SR_MODELS)
+        self.assertEqual(SR, 16000)
+        self.assertTrue(os.path.samefile(orig, self.out))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+'''
+    Regression tests for the vectorized word-by-word transfers in main.py,
+    against copies of the loops they replaced, on fixed random tiers.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import math
+import os
+import sys
+import unittest
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import main
+
+# A time-sorted tier of n points over [0, dur), with unvoiced (zero) stretches
+# and a few outliers, as extract_pitchtier.praat gives.
+def randomTier(rng, n, dur, lo, hi):
+    X = numpy.sort(rng.uniform(0, dur, n))
+    Y = rng.uniform(lo, hi, n)
+    Y[rng.rand(n) < 0.05] = 0.0
+    Y[rng.rand(n) < 0.02] *= 3.0
+    return (X.tolist(), Y.tolist())
+
+# Matching source and target word timestamps, with a null source word (0, 0)
+# and a null target word (tbgn == tend), as transcripts with gaps give.
+def randomTimestamps(rng, nwords, dur, tdur):
+    cuts = numpy.sort(rng.uniform(0, dur, nwords + 1))
+    tcuts = numpy.sort(rng.uniform(0, tdur, nwords + 1))
+    src = [['w' + str(i), float(cuts[i]), float(cuts[i + 1])] for i in range(nwords)]
+    tgt = [['w' + str(i), float(tcuts[i]), float(tcuts[i + 1])] for i in range(nwords)]
+    src[2][1:] = [0, 0]
+    tgt[5][2] = tgt[5][1]
+    return (src, tgt)
+
+# transferPitch's loop before it was vectorized (zscore mode), prints dropped.
+def oldTransferPitch(X, Y, ttsX, ttsY, srctimestamps, ttimestamps, transferThreshold=0):
+    def _getPitchPointsInSegment(bgn, end, A, B):
+        pps = []
+        for i in range(len(A)):
+            x = A[i]
+            y = B[i]
+            if x >= bgn and x < end:
+                pps.append([x, y])
+            elif x >= end:
+                break
+        return pps
+
+    (src_mean, src_stdeviation) = main.computeMeanAndDeviation(main.withoutZeros(Y))
+    (tgt_mean, tgt_stdeviation) = main.computeMeanAndDeviation(main.withoutZeros(ttsY))
+    tX = []
+    tY = []
+    for i in range(len(srctimestamps)):
+        srcts = srctimestamps[i]
+        tgtts = ttimestamps[i]
+        bgn = srcts[1]
+        end = srcts[2]
+        if bgn == 0 and end == 0:
+            continue
+        tbgn = tgtts[1]
+        tend = tgtts[2]
+        lensrc = end - bgn
+        lentgt = tend - tbgn
+        pps = _getPitchPointsInSegment(bgn, end, X, Y)
+
+        if abs(tbgn - tend) < 0.00001:
+            tpps = _getPitchPointsInSegment(tbgn, tend, ttsX, ttsY)
+            for m in range(len(tpps)):
+                tX.append(tpps[m][0])
+                tY.append(tpps[m][1])
+            continue
+
+        if transferThreshold != 0:
+            tpps = _getPitchPointsInSegment(tbgn, tend, ttsX, ttsY)
+            if len(tpps) == 0 or len(pps) == 0:
+                rmse = 0
+            else:
+                rmse = math.sqrt(main.mean_squared_error(main.toTupleList(pps), main.toTupleList(tpps), bgn, end, tbgn, tend))
+            if rmse < transferThreshold:
+                for m in range(len(tpps)):
+                    tX.append(tpps[m][0])
+                    tY.append(tpps[m][1])
+                continue
+
+        for p in pps:
+            if p[1] > src_mean * 2.5: continue
+            dx = p[0] - bgn
+            tdx = (dx / lensrc) * lentgt
+            tp = tbgn + tdx
+            tv = ((p[1] - src_mean) / src_stdeviation * tgt_stdeviation) + tgt_mean
+            tX.append(tp)
+            tY.append(tv)
+    return (tX, tY)
+
+# transferIntensity's loop before it was vectorized.
+def oldTransferIntensity(X, Y, tX, tY, srctimestamps, ttimestamps):
+    def _getIntPointsInSegment(bgn, end, X, Y):
+        pps = []
+        for i in range(len(X)):
+            x = X[i]
+            y = Y[i]
+            if x >= bgn and x < end:
+                pps.append([x, y])
+        return pps
+
+    (avgint_src, stdeviation_src) = main.computeMeanAndDeviation(main.withoutZeros(Y))
+    (avgint_tgt, stdeviation_tgt) = main.computeMeanAndDeviation(main.withoutZeros(tY))
+    aX = []
+    aY = []
+    for i in range(len(srctimestamps)):
+        srcts = srctimestamps[i]
+        tgtts = ttimestamps[i]
+        bgn = srcts[1]
+        end = srcts[2]
+        if bgn == 0 and end == 0:
+            continue
+        tbgn = tgtts[1]
+        tend = tgtts[2]
+        pps = _getIntPointsInSegment(bgn, end, X, Y)
+        tpps = _getIntPointsInSegment(tbgn, tend, tX, tY)
+        if len(pps) == 0 or len(tpps) == 0:
+            continue
+        for p in pps:
+            dx = p[0] - bgn
+            tdx = (dx / (end-bgn)) * (tend-tbgn)
+            tp = tbgn + tdx
+            aX.append(tp)
+            aY.append(p[1] / avgint_src * avgint_tgt)
+    return (aX, aY)
+
+class TransferPitchTest(unittest.TestCase):
+
+    def check(self, seed, threshold):
+        rng = numpy.random.RandomState(seed)
+        (X, Y) = randomTier(rng, 600, 6.0, 80, 250)
+        (ttsX, ttsY) = randomTier(rng, 500, 5.0, 90, 200)
+        (src, tgt) = randomTimestamps(rng, 12, 6.0, 5.0)
+        old = oldTransferPitch(X, Y, ttsX, ttsY, src, tgt, threshold)
+        new = main.transferPitch(X, Y, ttsX, ttsY, src, tgt, threshold, mode='zscore')
+        self.assertEqual(len(new[0]), len(old[0]))
+        self.assertTrue(numpy.array_equal(new[0], old[0]))
+        self.assertTrue(numpy.array_equal(new[1], old[1]))
+
+    def test_matches_old_loop(self):
+        for seed in range(5):
+            self.check(seed, 0)
+
+    # Words whose contours differ by less than the threshold keep the TTS pitch.
+    def test_threshold_matches_old_loop(self):
+        for threshold in (5, 60, float('inf')): # none, about half and all words under it
+            for seed in range(5):
+                self.check(seed, threshold)
+
+    # blend mode mixes the zscore pitch with the nearest TTS pitch, by the request's weight.
+    def test_blend(self):
+        rng = numpy.random.RandomState(0)
+        (X, Y) = randomTier(rng, 600, 6.0, 80, 250)
+        (ttsX, ttsY) = randomTier(rng, 500, 5.0, 90, 200)
+        (src, tgt) = randomTimestamps(rng, 12, 6.0, 5.0)
+        (zX, zY) = main.transferPitch(X, Y, ttsX, ttsY, src, tgt, 0, mode='zscore')
+        (bX, bY) = main.transferPitch(X, Y, ttsX, ttsY, src, tgt, 0, mode='blend', blend=0.25)
+        nearest = numpy.array([ttsY[numpy.argmin(numpy.abs(numpy.array(ttsX) - t))] for t in zX])
+        self.assertEqual(bX, zX)
+        self.assertTrue(numpy.allclose(bY, 0.25 * numpy.array(zY) + 0.75 * nearest))
+
+    def test_request_options(self):
+        self.assertEqual(main.pitchTransferOptions(None, None), (None, None))
+        self.assertEqual(main.pitchTransferOptions('blend', '0.3'), ('blend', 0.3))
+        self.assertTrue(main.isError(main.pitchTransferOptions('loud', None)))
+        self.assertTrue(main.isError(main.pitchTransferOptions('blend', 'half')))
+        self.assertTrue(main.isError(main.pitchTransferOptions('blend', '2')))
+
+class TransferIntensityTest(unittest.TestCase):
+
+    def test_matches_old_loop(self):
+        for seed in range(5):
+            rng = numpy.random.RandomState(seed)
+            (X, Y) = randomTier(rng, 600, 6.0, 40, 80)
+            (tX, tY) = randomTier(rng, 500, 5.0, 45, 75)
+            (src, tgt) = randomTimestamps(rng, 12, 6.0, 5.0)
+            old = oldTransferIntensity(X, Y, tX, tY, src, tgt)
+            new = main.transferIntensity(X, Y, tX, tY, src, tgt)
+            self.assertEqual(len(new[0]), len(old[0]))
+            self.assertTrue(numpy.allclose(new[0], old[0], rtol=1e-12, atol=0))
+            self.assertTrue(numpy.allclose(new[1], old[1], rtol=1e-12, atol=0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+'''
+    Tests for where main.py puts uploaded WAVs: a request's workspace,
+    or AUDIO_STORE_DIR for audio kept in the DB, and the sweep of what is left.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import main
+import uploads
+import workspace
+from test_wavconvert import floatWAV
+
+# An upload spooled to a named file, as uploads.SpooledPart leaves it.
+class SpooledUpload(object):
+
+    def __init__(self, directory, data):
+        self.spoolfile = tempfile.NamedTemporaryFile(suffix='.wav', prefix=uploads.PREFIX, dir=directory, delete=False)
+        self.spoolfile.write(data)
+        self.spooled = self.spoolfile.name
+        self.file = self.spoolfile
+        self.value = None
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.spooldir = os.path.join(self.dir, 'spool')
+        os.mkdir(self.spooldir)
+        self.storedir = os.path.join(self.dir, 'store')
+        self.saved = main.constants['AUDIO_STORE_DIR']
+        main.constants['AUDIO_STORE_DIR'] = self.storedir
+
+    def tearDown(self):
+        main.constants['AUDIO_STORE_DIR'] = self.saved
+        shutil.rmtree(self.dir, True)
+
+    def test_stored_audio_outlives_the_request(self):
+        ws = workspace.Workspace(self.dir)
+        with ws.active():
+            path = main.storeWAV(SpooledUpload(self.spooldir, b'RIFF....WAVE'))
+        ws.close()
+        self.assertEqual(os.path.dirname(path), self.storedir)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b'RIFF....WAVE')
+        self.assertEqual(os.listdir(self.spooldir), []) # moved, not copied
+
+    def test_temp_audio_goes_with_the_request(self):
+        ws = workspace.Workspace(self.dir)
+        with ws.active():
+            (_, path) = main.storeTempWAV(SpooledUpload(self.spooldir, b'RIFF....WAVE'))
+            self.assertTrue(os.path.exists(path))
+        ws.close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_over_quota_upload_is_removed(self):
+        ws = workspace.Workspace(self.dir, quota=4)
+        with ws.active():
+            self.assertRaises(workspace.QuotaExceeded, main.storeTempWAV, SpooledUpload(self.spooldir, b'RIFF....WAVE'))
+        ws.close()
+        self.assertEqual(os.listdir(self.spooldir), [])
+
+    def test_converted_tts_goes_with_the_request(self):
+        upload = SpooledUpload(self.spooldir, b'')
+        upload.spoolfile.close()
+        floatWAV(upload.spooled, [0.0, 0.5, -0.5] * 100)
+        ws = workspace.Workspace(self.dir)
+        with ws.active():
+            (_, tname) = main.storeTempWAV(upload)
+            nname = main.convertTTS(tname)
+            self.assertEqual(os.path.dirname(nname), ws.dir)
+        ws.close()
+        self.assertFalse(os.path.exists(nname))
+        self.assertEqual(os.listdir(self.spooldir), [])
+
+    def test_sweep_spooled_uploads(self):
+        old = time.time() - 7200
+        orphan = SpooledUpload(self.spooldir, b'RIFF').spooled
+        adopted = SpooledUpload(self.spooldir, b'RIFF').spooled
+        other = os.path.join(self.spooldir, 'other.wav')
+        open(other, 'w').close()
+        for path in (orphan, adopted, other):
+            os.utime(path, (old, old))
+        ws = workspace.Workspace(self.dir)
+        ws.adopt(adopted)
+        workspace.sweep(3600, self.spooldir, uploads.PREFIX)
+        self.assertEqual(sorted(os.listdir(self.spooldir)), sorted([os.path.basename(adopted), 'other.wav']))
+        ws.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+'''
+    Tests for wavconvert.py: headers TTS services write, and the cache.
+
+    Run from python-server:  python -m unittest discover tests
+'''
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import wave
+import numpy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import wavconvert
+
+# A mono 32-bit float WAV of x, with the given RIFF and data chunk sizes
+# (None = the true ones), as a streaming TTS service writes it.
+def floatWAV(path, x, sr=22050, riffsize=None, datasize=None):
+    data = numpy.asarray(x, '<f4').tobytes()
+    fmt = struct.pack('<HHIIHH', wavconvert.FLOAT, 1, sr, sr * 4, 4, 32)
+    body = b'WAVE' + b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(data) if datasize is None else datasize) + data
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', len(body) if riffsize is None else riffsize) + body)
+
+def readPCM(path):
+    f = wave.open(path, 'rb')
+    try:
+        return (numpy.frombuffer(f.readframes(f.getnframes()), '<i2') / 32767.0, f.getframerate())
+    finally:
+        f.close()
+
+class ConvertTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.x = numpy.sin(numpy.arange(1000) / 10.0) * 0.5
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, True)
+
+    def check(self, riffsize, datasize):
+        src = os.path.join(self.dir, 'tts.wav')
+        dst = os.path.join(self.dir, 'out.wav')
+        floatWAV(src, self.x, riffsize=riffsize, datasize=datasize)
+        info = wavconvert.probe(src)
+        self.assertFalse(info.readable)
+        self.assertEqual(info.datasize, 4 * len(self.x))
+        self.assertTrue(wavconvert.convert(src, dst, info))
+        (y, sr) = readPCM(dst)
+        self.assertEqual(sr, 22050)
+        self.assertEqual(len(y), len(self.x))
+        self.assertTrue(numpy.allclose(y, self.x, atol=1e-4))
+
+    def test_true_sizes(self):
+        self.check(None, None)
+
+    # Streamed WAVs: sizes left as 0 or 0xFFFFFFFF, or too big.
+    def test_zero_sizes(self):
+        self.check(0, 0)
+
+    def test_unknown_sizes(self):
+        self.check(0xFFFFFFFF, 0xFFFFFFFF)
+
+    def test_oversized_data(self):
+        self.check(None, 1 << 30)
+
+    # A streamed WAV must not be cached as silence.
+    def test_cache_zero_sizes(self):
+        src = os.path.join(self.dir, 'tts.wav')
+        floatWAV(src, self.x, riffsize=0, datasize=0)
+        cache = wavconvert.ConvertCache(os.path.join(self.dir, 'cache'))
+        for name in ('a.wav', 'b.wav'): # converted, then from the cache
+            dst = os.path.join(self.dir, name)
+            self.assertTrue(cache.fetch(src, dst, wavconvert.convert))
+            self.assertEqual(len(readPCM(dst)[0]), len(self.x))
+
+    def test_not_a_wav(self):
+        src = os.path.join(self.dir, 'tts.mp3')
+        with open(src, 'wb') as f:
+            f.write(b'ID3' + b'\0' * 100)
+        self.assertEqual(wavconvert.probe(src), None)
+        self.assertFalse(wavconvert.convert(src, os.path.join(self.dir, 'out.wav')))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+'''
+    Content-addressed cache for analysis tiers (pitch, intensity).
+
+    Clients typically /align, then /synthesize (often several times, with
+    different options) on the same source WAV, so the same contours get
+    extracted again and again. Entries are keyed by the SHA-1 of the audio
+    bytes plus the analysis and its parameters, and hold the parsed
+    (X, Y) arrays. An in-memory LRU is bounded by the bytes it holds;
+    an optional directory keeps entries across restarts and evictions.
+'''
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import numpy
+
+# Cache key for an analysis of a WAV file: SHA-1 of its bytes + the analysis + its parameters.
+def tierKey(wavfile, analysis, params=()):
+    h = hashlib.sha1()
+    with open(wavfile, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    h.update(('|' + analysis + '|' + repr(tuple(params))).encode('utf-8'))
+    return h.hexdigest()
+
+class TierCache(object):
+
+    def __init__(self, maxbytes=64 << 20, directory=None):
+        self.maxbytes = maxbytes
+        self.directory = directory
+        self.entries = OrderedDict() # key -> (X, Y), least recently used first
+        self.size = 0
+        self.lock = threading.Lock()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    # Returns the cached (X, Y) for key, or None.
+    def get(self, key):
+        with self.lock:
+            tier = self.entries.pop(key, None)
+            if tier is not None:
+                self.entries[key] = tier # most recently used
+                return tier
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = numpy.load(f)
+                tier = (data['X'], data['Y'])
+        except Exception:
+            return None # a torn or stale file is just a miss
+        self._remember(key, tier)
+        return self.entries.get(key, tier)
+
+    def put(self, key, tier):
+        tier = (numpy.array(tier[0], dtype=numpy.float64), numpy.array(tier[1], dtype=numpy.float64))
+        self._remember(key, tier)
+        if self.directory is not None:
+            (fd, tmppath) = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as f:
+                numpy.savez(f, X=tier[0], Y=tier[1])
+            os.rename(tmppath, self._path(key)) # atomic, so readers never see half a file
+        return tier
+
+    # Returns the tier for key, computing and storing it on a miss.
+    # compute() returns (X, Y), or None on failure (which isn't cached).
+    def fetch(self, key, compute):
+        tier = self.get(key)
+        if tier is None:
+            tier = compute()
+            if tier is not None:
+                tier = self.put(key, tier)
+        return tier
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _remember(self, key, tier):
+        # Cached arrays are shared between requests, so make them read-only.
+        for a in tier:
+            a.flags.writeable = False
+        nbytes = tier[0].nbytes + tier[1].nbytes
+        if nbytes > self.maxbytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[0].nbytes + old[1].nbytes
+            self.entries[key] = tier
+            self.size += nbytes
+            while self.size > self.maxbytes:
+                (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted[0].nbytes + evicted[1].nbytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npz')
@@ -0,0 +1,52 @@
+'''
+    Multipart parts that spool uploads to named files, so a handler can hand
+    an uploaded WAV to Praat or HTK by path instead of copying it.
+
+    CherryPy spools uploads to anonymous TemporaryFiles, so using them meant
+    reading each one into memory and writing it out again. With
+
+        config = {'/': {'request.body.part_class': SpooledPart}}
+
+    uploads land in named files in SpooledPart.spooldir (e.g. on a tmpfs),
+    and claim(part) turns one over to the handler. Spooled files nobody
+    claimed are removed when the request ends; any left by a process that
+    died are named PREFIX*, for workspace.sweep to find.
+'''
+import os
+import tempfile
+import cherrypy
+from cherrypy._cpreqbody import Part
+
+PREFIX = 'upload-'
+
+class SpooledPart(Part):
+
+    spooldir = None # None = the system temp dir
+
+    def make_file(self):
+        # '.wav', as callers (e.g. convertTTS) expect a 4-letter extension.
+        f = tempfile.NamedTemporaryFile(suffix='.wav', prefix=PREFIX, dir=self.spooldir, delete=False)
+        self.spooled = f.name
+        self.spoolfile = f
+        cherrypy.serving.request.hooks.attach('on_end_request', self._discard)
+        return f
+
+    def _discard(self):
+        if getattr(self, 'spooled', None) is None:
+            return
+        self.spoolfile.close()
+        try:
+            os.remove(self.spooled)
+        except OSError:
+            pass
+        self.spooled = None
+
+# Takes over the file a part was spooled to: returns its path, which the
+# caller now owns (and must remove), or None if the part wasn't spooled to a named file.
+def claim(part):
+    path = getattr(part, 'spooled', None)
+    if path is None:
+        return None
+    part.spooled = None
+    part.spoolfile.close() # flushes; the file stays, as it was made with delete=False
+    return path
@@ -0,0 +1,163 @@
+'''
+    Makes uploaded WAVs readable by Praat without running ffmpeg.
+
+    TTS services return WAVs Praat can't always read: WAVE_FORMAT_EXTENSIBLE
+    headers, float samples, or streamed files whose RIFF and data sizes are
+    left as 0 or 0xFFFFFFFF. probe() reads the header, and only files that
+    need it are rewritten (convert) as plain 16-bit PCM, in-process:
+
+        info = wavconvert.probe(path)
+        if info is None or not info.readable:
+            wavconvert.convert(path, newpath) # False if it can't (e.g. not a WAV)
+
+    ConvertCache keeps converted files by the SHA-1 of the original, so the
+    same TTS prompt is only converted once.
+'''
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import numpy
+import analysis
+
+PCM = 1
+FLOAT = 3
+EXTENSIBLE = 0xFFFE
+
+class WAVInfo(object):
+
+    def __init__(self):
+        self.format = None     # format tag (for WAVE_FORMAT_EXTENSIBLE, that of the subformat)
+        self.extensible = False
+        self.channels = 0
+        self.rate = 0
+        self.bits = 0
+        self.blockalign = 0
+        self.dataoffset = None # where the samples start
+        self.datasize = 0      # bytes of samples (as far as the file goes)
+        self.readable = False  # plain PCM with consistent sizes, which Praat reads as is
+
+# Reads the RIFF header and chunk list of a WAV file.
+# < Returns a WAVInfo, or None if it isn't a RIFF/WAVE file.
+def probe(filename):
+    filesize = os.path.getsize(filename)
+    with open(filename, 'rb') as f:
+        head = f.read(12)
+        if len(head) < 12 or head[:4] != b'RIFF' or head[8:12] != b'WAVE':
+            return None
+        riffsize = struct.unpack('<I', head[4:8])[0]
+        info = WAVInfo()
+        sizesok = riffsize + 8 == filesize
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            (cid, size) = struct.unpack('<4sI', chunk)
+            start = f.tell()
+            if cid == b'fmt ':
+                fmt = f.read(min(size, 40))
+                if len(fmt) < 16:
+                    return info
+                (info.format, info.channels, info.rate, _, info.blockalign, info.bits) = struct.unpack('<HHIIHH', fmt[:16])
+                if info.format == EXTENSIBLE and len(fmt) >= 26:
+                    info.extensible = True
+                    info.format = struct.unpack('<H', fmt[24:26])[0] # first two bytes of the subformat GUID
+            elif cid == b'data':
+                info.dataoffset = start
+                info.datasize = size
+                if size == 0 or size == 0xFFFFFFFF or start + size > filesize:
+                    # Streamed WAVs leave the size 0 or 0xFFFFFFFF: the samples run to the end.
+                    info.datasize = filesize - start
+                    sizesok = False
+                break
+            f.seek(start + size + (size & 1))
+    info.readable = (sizesok and not info.extensible and info.format == PCM and info.dataoffset is not None
+                     and info.bits in (8, 16, 24, 32) and info.channels > 0
+                     and info.blockalign == info.channels * info.bits // 8)
+    return info
+
+# Rewrites a WAV of PCM or float samples (plain or extensible, any sizes
+# in the header) as 16-bit PCM with the same rate and channels.
+# < Returns False, without writing anything, if it isn't such a WAV.
+def convert(src, dst, info=None):
+    sound = read(src, info)
+    if sound is None:
+        return False
+    analysis.writeWAV(dst, sound[0], sound[1])
+    return True
+
+# The samples of such a WAV, as floats in [-1, 1], one column per channel.
+# < Returns (samples, rate), or None if it isn't such a WAV.
+def read(filename, info=None):
+    info = info or probe(filename)
+    if info is None or info.dataoffset is None or info.channels <= 0:
+        return None
+    width = info.bits // 8
+    if info.format == PCM and width in (1, 2, 3, 4):
+        decode = lambda data: analysis.decodePCM(data, width, 1)
+    elif info.format == FLOAT and width in (4, 8):
+        decode = lambda data: numpy.frombuffer(data, '<f%d' % width).astype(numpy.float64)
+    else:
+        return None
+    with open(filename, 'rb') as f:
+        f.seek(info.dataoffset)
+        data = f.read(info.datasize)
+    frame = width * info.channels
+    x = decode(data[:len(data) - len(data) % frame])
+    return (x.reshape(-1, info.channels), info.rate)
+
+class ConvertCache(object):
+
+    def __init__(self, directory=None, maxfiles=256):
+        self.directory = directory or os.path.join(tempfile.gettempdir(), 'praatjs-converted')
+        self.maxfiles = maxfiles
+        self.lock = threading.Lock()
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    # Puts the converted version of src at dst: a link to (or copy of) the
+    # cached one, or else convert(src, dst) and keep that. convert returns
+    # False on failure, which isn't cached.
+    def fetch(self, src, dst, convert):
+        h = hashlib.sha1()
+        with open(src, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                h.update(chunk)
+        cached = os.path.join(self.directory, h.hexdigest() + '.wav')
+        if os.path.exists(cached) and self._place(cached, dst):
+            os.utime(cached, None) # most recently used
+            return True
+        if not convert(src, dst):
+            return False
+        (fd, tmppath) = tempfile.mkstemp(dir=self.directory)
+        os.close(fd)
+        shutil.copyfile(dst, tmppath)
+        os.rename(tmppath, cached) # atomic, so readers never see half a file
+        self._prune()
+        return True
+
+    # Hard link if we can (same filesystem), else copy.
+    def _place(self, cached, dst):
+        try:
+            if os.path.exists(dst):
+                os.remove(dst)
+            os.link(cached, dst)
+        except OSError:
+            try:
+                shutil.copyfile(cached, dst)
+            except (IOError, OSError):
+                return False # e.g. evicted meanwhile
+        return True
+
+    # Drops the least recently used files beyond maxfiles.
+    def _prune(self):
+        with self.lock:
+            try:
+                names = [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith('.wav')]
+                names.sort(key=lambda p: os.path.getmtime(p))
+                for path in names[:max(0, len(names) - self.maxfiles)]:
+                    os.remove(path)
+            except OSError:
+                pass # raced with another prune
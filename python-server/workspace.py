@@ -0,0 +1,208 @@
+'''
+    Scratch space for a request: every temp file it makes, in one place.
+
+    Handlers write WAVs, tiers, TextGrids and Praat's output to temp files.
+    Each request (or job) gets a Workspace, a directory of its own under
+    Workspace.root (a tmpfs where there is one), and the module-level
+    mkstemp/write/adopt put files there, with no fds left open:
+
+        path = workspace.mkstemp('.wav')    # closed, empty file for Praat to write
+        path = workspace.write(data, '.txt')
+
+    The directory is removed, with whatever is left in it, when the request
+    ends (requestWorkspace, as a tool) or the job is dropped (see jobs.py), and
+    each workspace is held to a byte quota. Stages run with their request's
+    workspace (see stages.Plan). Directories left behind by processes that
+    died are removed by sweep, run periodically by a Monitor.
+'''
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import cherrypy
+
+PREFIX = 'scratch-'
+
+_local = threading.local()
+_live = set()  # directories and adopted files of open workspaces (in this process)
+_lock = threading.Lock()
+
+class QuotaExceeded(IOError):
+    pass
+
+class Workspace(object):
+
+    root = None  # None = /dev/shm if there is one, else the temp dir
+    quota = None # bytes per workspace (None = no limit)
+
+    def __init__(self, root=None, quota=None):
+        self.dir = None # made on first use
+        self.rootdir = root or rootDir()
+        self.limit = quota if quota is not None else Workspace.quota
+        self.adopted = []
+        self.closed = False
+
+    # Runs the body with this as the current workspace (of this thread).
+    @contextlib.contextmanager
+    def active(self):
+        previous = current()
+        _local.workspace = self
+        try:
+            yield self
+        finally:
+            _local.workspace = previous
+
+    # A new empty file, closed. < Returns its path.
+    def mkstemp(self, suffix=''):
+        self._reserve(0)
+        (fd, path) = tempfile.mkstemp(suffix, dir=self._dir())
+        os.close(fd)
+        return path
+
+    # A new file holding data. < Returns its path.
+    def write(self, data, suffix=''):
+        self._reserve(len(data))
+        (fd, path) = tempfile.mkstemp(suffix, dir=self._dir())
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return path
+
+    # Takes a file made elsewhere (e.g. a spooled upload) to remove with the rest.
+    def adopt(self, path):
+        self._reserve(os.path.getsize(path))
+        self.adopted.append(path)
+        with _lock:
+            _live.add(path)
+        return path
+
+    # Bytes of the files in the workspace, adopted ones included.
+    def usage(self):
+        paths = list(self.adopted)
+        if self.dir is not None:
+            paths += [os.path.join(self.dir, n) for n in os.listdir(self.dir)]
+        total = 0
+        for p in paths:
+            try:
+                total += os.path.getsize(p)
+            except OSError:
+                pass # removed already
+        return total
+
+    # Removes the workspace and everything in it.
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for p in self.adopted:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+            with _lock:
+                _live.discard(p)
+        if self.dir is not None:
+            shutil.rmtree(self.dir, True)
+            with _lock:
+                _live.discard(self.dir)
+
+    def _dir(self):
+        if self.dir is None:
+            self.dir = tempfile.mkdtemp(prefix=PREFIX, dir=self.rootdir)
+            with _lock:
+                _live.add(self.dir)
+        return self.dir
+
+    # Files made by other programs (Praat, ffmpeg) into the workspace count
+    # too, from the next time we make one.
+    def _reserve(self, nbytes):
+        if self.closed:
+            raise IOError('Scratch workspace is closed.')
+        if self.limit is not None and self.usage() + nbytes > self.limit:
+            raise QuotaExceeded('Scratch workspace quota of ' + str(self.limit) + ' bytes exceeded.')
+
+# Where workspaces go: Workspace.root, else a RAM-backed directory where there is one.
+def rootDir():
+    return Workspace.root or ('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+
+# The current thread's workspace, or None.
+def current():
+    return getattr(_local, 'workspace', None)
+
+# fn, to run with the caller's workspace wherever it's called (e.g. another thread).
+def carry(fn):
+    ws = current()
+    if ws is None:
+        return fn
+    def run(*args, **kwargs):
+        with ws.active():
+            return fn(*args, **kwargs)
+    return run
+
+# mkstemp, write and adopt in the current workspace. Without one (outside
+# a request), files go straight into the root; they're still closed, and
+# the caller removes them (or, if it doesn't, sweep does).
+def mkstemp(suffix=''):
+    ws = current()
+    if ws is not None:
+        return ws.mkstemp(suffix)
+    (fd, path) = tempfile.mkstemp(suffix, PREFIX, rootDir())
+    os.close(fd)
+    return path
+
+def write(data, suffix=''):
+    ws = current()
+    if ws is not None:
+        return ws.write(data, suffix)
+    (fd, path) = tempfile.mkstemp(suffix, PREFIX, rootDir())
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+def adopt(path):
+    ws = current()
+    return path if ws is None else ws.adopt(path)
+
+# Where other programs (e.g. HTK) can make their own scratch files: the current
+# workspace's directory, or else the root.
+def directory():
+    ws = current()
+    return rootDir() if ws is None else ws._dir()
+
+# Removes workspaces and loose scratch files in the root older than maxage
+# seconds (since last modified) that no open workspace here owns: those of
+# requests that never finished, or processes that died. With another root and
+# prefix, the same for other files requests leave, e.g. spooled uploads.
+# (Run periodically by a Monitor; must not raise.)
+def sweep(maxage, root=None, prefix=PREFIX):
+    root = root or rootDir()
+    cutoff = time.time() - maxage
+    try:
+        names = [n for n in os.listdir(root) if n.startswith(prefix)]
+    except OSError:
+        return
+    with _lock:
+        live = set(_live)
+    for n in names:
+        path = os.path.join(root, n)
+        try:
+            if path in live or os.path.getmtime(path) > cutoff:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, True)
+            else:
+                os.remove(path)
+        except OSError:
+            pass # removed meanwhile
+
+# For the 'workspace' tool (on_start_resource): gives the request a workspace,
+# removed when the request ends, after its response has been sent.
+def requestWorkspace():
+    ws = Workspace()
+    _local.workspace = ws
+    def end():
+        ws.close()
+        if current() is ws:
+            _local.workspace = None
+    cherrypy.serving.request.hooks.attach('on_end_request', end)